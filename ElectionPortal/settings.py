@@ -10,11 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.9/ref/settings/
 """
 
-import logging.config
 import os
 
-import ldap
-from django_auth_ldap.config import LDAPSearch
+from django.utils.functional import SimpleLazyObject
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -32,7 +30,7 @@ CACHES = {
 }
 
 AUTHENTICATION_BACKENDS = (
-    'django_auth_ldap.backend.LDAPBackend',
+    'account.backends.PooledLDAPBackend',
     'django.contrib.auth.backends.ModelBackend',
 )
 
@@ -40,8 +38,17 @@ AUTH_LDAP_SERVER_URI = 'ldap://ldap.iitb.ac.in'
 
 AUTH_LDAP_BIND_DN = ''
 AUTH_LDAP_BIND_PASSWORD = ''
-AUTH_LDAP_USER_SEARCH = LDAPSearch('ou=People,dc=iitb,dc=ac,dc=in',
-                                   ldap.SCOPE_SUBTREE, '(uid=%(user)s)')
+
+
+def _ldap_user_search():
+    import ldap
+    from django_auth_ldap.config import LDAPSearch
+
+    return LDAPSearch('ou=People,dc=iitb,dc=ac,dc=in', ldap.SCOPE_SUBTREE, '(uid=%(user)s)')
+
+
+# Built on first login, so that importing settings (e.g. for management commands) does not import ldap
+AUTH_LDAP_USER_SEARCH = SimpleLazyObject(_ldap_user_search)
 
 AUTH_LDAP_USER_ATTR_MAP = {
     'first_name': 'givenName',
@@ -49,6 +56,13 @@ AUTH_LDAP_USER_ATTR_MAP = {
     'email': 'mail',
 }
 
+# Per process LDAP connection pool and search result cache of account.backends.PooledLDAPBackend
+AUTH_LDAP_POOL_SIZE = 10
+
+AUTH_LDAP_POOL_TIMEOUT = 5
+
+AUTH_LDAP_DN_CACHE_TIMEOUT = 300
+
 AUTH_PROFILE_MODULE = 'account.UserProfile'
 
 AUTH_LDAP_PROFILE_ATTR_MAP = {
@@ -74,12 +88,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.VoterSessionMiddleware',
+    'core.middleware.SessionDeadlineMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'core.middleware.SessionNonceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'simple_history.middleware.HistoryRequestMiddleware',
@@ -93,8 +110,14 @@ TEMPLATES = [
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates are compiled once per worker. Restart workers after changing a template.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -116,6 +139,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # File backed test database, so that tests can open more than one connection to it
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
@@ -168,11 +195,35 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 MEDIA_URL = '/media/'
 
-SESSION_SERIALIZER = 'django.contrib.sessions.serializers.PickleSerializer'
+# Admin sessions stay in database, so server can revoke them. Sessions of voter pages (VOTER_SESSION_URL_NAMES) live
+# in signed cookies under their own cookie name, so voting requests never read or write session table and any node
+# can serve any voter (see core.middleware.VoterSessionMiddleware). A cookie can not be deleted by server, so voter
+# sessions carry their own deadline (see core.security.set_session_timeout) and logout revokes every voter session of
+# its user (see core.middleware.SessionNonceMiddleware).
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+VOTER_SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
+VOTER_SESSION_COOKIE_NAME = 'voter_sessionid'
+
+# Seconds a voter session is valid after login until election page sets the session timeout of election
+VOTER_LOGIN_TIMEOUT = 5 * 60
+
+VOTER_SESSION_URL_NAMES = [
+    'index',
+    'account:login',
+    'account:logout',
+    'election:index',
+    'election:ballot',
+]
+
+SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
+
+SESSION_COOKIE_HTTPONLY = True
 
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.CachedStaticFilesStorage'
 
-LOGGING_CONFIG = None
+# Applied by django.setup(), after settings_config.py overrides are in place
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -188,6 +239,9 @@ LOGGING = {
         'simple': {
             'format': '%(levelname)s %(message)s',
         },
+        'metrics': {
+            'format': '{"time": "%(asctime)s", "process": %(process)d, "metrics": %(message)s}',
+        },
     },
     'handlers': {
         'console': {
@@ -213,6 +267,12 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'logs/election_view.log'),
             'formatter': 'election_view',
         },
+        'metrics': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs/metrics.log'),
+            'formatter': 'metrics',
+        },
         'mail_admins': {
             'level': 'ERROR',
             'class': 'django.utils.log.AdminEmailHandler'
@@ -228,6 +288,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': False,
         },
+        'metrics': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'requests': {
             'handlers': ['file_application'],
             'level': 'WARNING',
@@ -240,10 +305,43 @@ LOGGING = {
     },
 
 }
-logging.config.dictConfig(LOGGING)
 
 X_FRAME_OPTIONS = 'DENY'
 
 LOGIN_URL = 'account:login'
 
+# Write-ahead vote journal. If set, cast ballots are appended to a journal in this directory and moved to database
+# by `manage.py flush_vote_journal`. Keep it None to insert ballots into database while voting.
+VOTE_JOURNAL_DIR = None
+
+VOTE_JOURNAL_SEGMENT_SIZE = 64 * 1024 * 1024
+
+VOTE_JOURNAL_BATCH_SIZE = 500
+
+# Ballots after which head of ballot chain of an election is checkpointed (see vote/chain.py)
+BALLOT_CHAIN_CHECKPOINT_INTERVAL = 1000
+
+# Voters lists uploaded on Add Voters page are kept in this directory until their import job finishes
+VOTER_IMPORT_DIR = os.path.join(BASE_DIR, 'voter_imports')
+
+# Voter import jobs are run by `manage.py run_import_jobs --loop` (see uwsgi.sample.ini). Set it to True to import
+# within upload request instead, e.g. in development.
+VOTER_IMPORT_IN_REQUEST = False
+
+# A running import job whose worker has not reported progress for this many seconds is marked failed
+VOTER_IMPORT_STALE_AFTER = 10 * 60
+
+# Roll numbers committed per transaction by an import job
+VOTER_IMPORT_BATCH_SIZE = 5000
+
+# Load URLs, templates, ballots and voters of open elections when a worker starts, before it takes traffic
+# (see core/warmup.py)
+WARM_UP_WORKERS = True
+
+# Baselines of `manage.py bench`, one JSON file per data size
+BENCH_BASELINE_DIR = os.path.join(BASE_DIR, 'bench_baselines')
+
+# Seconds after which every worker writes its request metrics to logs/metrics.log (see core/metrics.py)
+METRICS_FLUSH_INTERVAL = 60
+
 from .settings_config import *  # noqa isort:skip
@@ -39,5 +39,8 @@ CSRF_COOKIE_PATH = "/"
 
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# Vote journal directory. Keep it on a local disk of web server and run `manage.py flush_vote_journal --loop`
+# VOTE_JOURNAL_DIR = '/path/to/journal'
+
 # DATABASES
 # Define databases here to override default Databases.
@@ -0,0 +1,272 @@
+"""
+This module contains the LDAP authentication backend used by VoterLoginView.
+
+PooledLDAPBackend is django_auth_ldap's LDAPBackend with
+
+1. A bounded per process pool of LDAP connections, so a login does not pay for a new connection (and TLS handshake).
+2. A short lived cache of AUTH_LDAP_USER_SEARCH results (username -> DN and attributes), so a repeated login (wrong
+   password, session timeout, next election) binds as user directly without the search. Password is still checked
+   by LDAP on every login.
+3. User and profile are saved only if attributes mapped from LDAP have changed.
+
+Settings:
+    AUTH_LDAP_POOL_SIZE: Max connections of a process
+    AUTH_LDAP_POOL_TIMEOUT: Seconds to wait for a free connection before failing login
+    AUTH_LDAP_DN_CACHE_TIMEOUT: Seconds for which a search result is reused, 0 disables the cache
+    AUTH_LDAP_DN_CACHE_SIZE: Max cached search results of a process
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import ldap
+from django.core.exceptions import ObjectDoesNotExist
+from django_auth_ldap.backend import LDAPBackend, _LDAPUser, populate_user, populate_user_profile
+
+from .models import UserProfile
+
+
+def _unbind(connection):
+    try:
+        connection.unbind_s()
+    except ldap.LDAPError:
+        pass
+
+
+def _field_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+class LDAPConnectionPool(object):
+    """
+    Thread safe pool of at most `size` LDAP connections. Connections are created lazily by `factory`.
+    """
+
+    def __init__(self, factory, size, timeout):
+        self.pid = os.getpid()
+        self._factory = factory
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise ldap.SERVER_DOWN({'desc': 'No free connection in LDAP connection pool'})
+
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            try:
+                connection = self._factory()
+            except Exception:
+                self._slots.release()
+                raise
+        return connection
+
+    def replace(self, connection):
+        """
+        Close an acquired connection and create a new one in its place
+        """
+        _unbind(connection)
+        return self._factory()
+
+    def release(self, connection, discard=False):
+        if discard:
+            _unbind(connection)
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        self._slots.release()
+
+
+class DNCache(object):
+    """
+    Thread safe LRU cache of search results with expiry
+    """
+
+    def __init__(self, timeout, size):
+        self._timeout = timeout
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def set(self, username, value):
+        with self._lock:
+            self._entries.pop(username, None)
+            self._entries[username] = (time.monotonic() + self._timeout, value)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+
+# Django creates a new backend instance for every authenticate call, so pool and cache belong to process
+_pool = None
+_dn_cache = None
+_lock = threading.Lock()
+
+
+class _PooledLDAPUser(_LDAPUser):
+
+    _connection_broken = False
+    _retried = False
+
+    def _get_connection(self):
+        if self._connection is None:
+            self._connection = self.backend.pool.acquire()
+        return self._connection
+
+    def release_connection(self):
+        if self._connection is not None:
+            self.backend.pool.release(self._connection, discard=self._connection_broken)
+            # User keeps this object as user.ldap_user, it must not use a connection given back to pool
+            self._connection = None
+            self._connection_bound = False
+
+    def _bind_as(self, bind_dn, bind_password, sticky=False):
+        try:
+            super()._bind_as(bind_dn, bind_password, sticky)
+        except ldap.SERVER_DOWN:
+            self._connection_broken = True
+            if self._retried:
+                raise
+            # Server closes connections which stay idle for long, retry once on a new connection
+            self._retried = True
+            self._connection = self.backend.pool.replace(self._connection)
+            self._connection_broken = False
+            self._bind_as(bind_dn, bind_password, sticky)
+        except ldap.INVALID_CREDENTIALS:
+            raise
+        except ldap.LDAPError:
+            self._connection_broken = True
+            raise
+
+    def _search_for_user_dn(self):
+        dn_cache = self.backend.dn_cache
+        cached = dn_cache.get(self._username) if dn_cache else None
+        if cached is not None:
+            self._user_dn, self._user_attrs = cached
+            return
+
+        super()._search_for_user_dn()
+        if dn_cache and self._user_dn is not None:
+            dn_cache.set(self._username, (self._user_dn, self._user_attrs))
+
+    def _get_or_create_user(self, force_populate=False):
+        username = self.backend.ldap_to_django_username(self._username)
+
+        self._user, created = self.backend.get_or_create_user(username, self)
+        self._user.ldap_user = self
+        self._user.ldap_username = self._username
+
+        should_populate = force_populate or self.settings.ALWAYS_UPDATE_USER or created
+
+        if created:
+            self._user.set_unusable_password()
+
+        old_values = _field_values(self._user)
+        save_user = created
+
+        if should_populate:
+            self._populate_user()
+
+        if self.settings.MIRROR_GROUPS:
+            self._mirror_groups()
+
+        if should_populate:
+            if populate_user.send(self.backend.__class__, user=self._user, ldap_user=self):
+                save_user = True
+
+        if save_user or _field_values(self._user) != old_values:
+            self._user.save()
+
+        if should_populate and self._should_populate_profile():
+            self._populate_and_save_user_profile()
+
+    def _populate_and_save_user_profile(self):
+        try:
+            profile = self._user.user_profile
+        except ObjectDoesNotExist:
+            profile = UserProfile(user=self._user)
+
+        old_values = _field_values(profile) if profile.pk else None
+
+        self._populate_profile_from_attributes(profile)
+        self._populate_profile_flags_from_dn_regex(profile)
+        self._populate_profile_from_group_memberships(profile)
+        save_profile = bool(populate_user_profile.send(self.backend.__class__, profile=profile, ldap_user=self))
+
+        if save_profile or _field_values(profile) != old_values:
+            profile.save()
+
+
+class PooledLDAPBackend(LDAPBackend):
+
+    default_settings = {
+        'POOL_SIZE': 10,
+        'POOL_TIMEOUT': 5,
+        'DN_CACHE_TIMEOUT': 300,
+        'DN_CACHE_SIZE': 10000,
+    }
+
+    def _new_connection(self):
+        uri = self.settings.SERVER_URI
+        if callable(uri):
+            uri = uri()
+
+        connection = self.ldap.initialize(uri)
+        for option, value in self.settings.CONNECTION_OPTIONS.items():
+            connection.set_option(option, value)
+        if self.settings.START_TLS:
+            connection.start_tls_s()
+        return connection
+
+    @property
+    def pool(self):
+        global _pool
+        if _pool is None or _pool.pid != os.getpid():
+            with _lock:
+                # Connections inherited from parent process after a fork are never used
+                if _pool is None or _pool.pid != os.getpid():
+                    _pool = LDAPConnectionPool(self._new_connection, self.settings.POOL_SIZE,
+                                               self.settings.POOL_TIMEOUT)
+        return _pool
+
+    @property
+    def dn_cache(self):
+        global _dn_cache
+        if not self.settings.DN_CACHE_TIMEOUT:
+            return None
+        if _dn_cache is None:
+            with _lock:
+                if _dn_cache is None:
+                    _dn_cache = DNCache(self.settings.DN_CACHE_TIMEOUT, self.settings.DN_CACHE_SIZE)
+        return _dn_cache
+
+    def authenticate(self, username, password, **kwargs):
+        if len(password) == 0 and not self.settings.PERMIT_EMPTY_PASSWORD:
+            return None
+
+        ldap_user = _PooledLDAPUser(self, username=username.strip())
+        try:
+            return ldap_user.authenticate(password)
+        finally:
+            ldap_user.release_connection()
+
+    def get_or_create_user(self, username, ldap_user):
+        # Profile is loaded along with user, it is compared with LDAP attributes on every login
+        user_model = self.get_user_model()
+        return user_model.objects.select_related('user_profile').get_or_create(
+            username__iexact=username, defaults={'username': username.lower()},
+        )
@@ -0,0 +1,139 @@
+"""
+In-process stand-in for the LDAP directory. It is used by tests, load tests and benchmarks and must never be enabled
+in production.
+
+FakeLDAPBackend authenticates against FakeLDAPDirectory and populates User and UserProfile through
+AUTH_LDAP_USER_ATTR_MAP and AUTH_LDAP_PROFILE_ATTR_MAP the way django_auth_ldap does. It needs no python-ldap.
+
+FakeLDAPModule serves FakeLDAPDirectory through the part of python-ldap used by django_auth_ldap, so the real
+backends (see account/backends.py) can run against it. It needs python-ldap for its exceptions.
+"""
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+from .models import UserProfile
+
+FakeLDAPEntry = namedtuple('FakeLDAPEntry', ['password', 'attrs'])
+
+FAKE_BASE_DN = 'ou=People,dc=iitb,dc=ac,dc=in'
+
+_uid_filter_regex = re.compile(r'^\(uid=(?P<uid>[^)]+)\)$', re.IGNORECASE)
+_uid_dn_regex = re.compile(r'^uid=(?P<uid>[^,]+),', re.IGNORECASE)
+
+
+class FakeLDAPDirectory(object):
+
+    def __init__(self):
+        self.entries = {}
+
+    def add_user(self, uid, password, roll_number, employee_type='ug', first_name='', last_name=''):
+        self.entries[uid] = FakeLDAPEntry(password, {
+            'uid': [uid],
+            'givenName': [first_name],
+            'sn': [last_name],
+            'mail': ['%s@iitb.ac.in' % uid],
+            'employeeNumber': [roll_number],
+            'employeeType': [employee_type],
+        })
+
+    def clear(self):
+        self.entries.clear()
+
+    def authenticate(self, uid, password):
+        """
+        Returns:
+            LDAP attributes of user if password is correct, else None
+        """
+        entry = self.entries.get(uid)
+        if entry is None or not password or entry.password != password:
+            return None
+        return entry.attrs
+
+
+directory = FakeLDAPDirectory()
+
+
+class FakeLDAPObject(object):
+    """
+    Connection to FakeLDAPDirectory. Supports simple binds and searches by `(uid=...)` filter or by user DN.
+    """
+
+    def __init__(self, fake_directory):
+        self.directory = fake_directory
+        self.binds = 0
+        self.searches = 0
+
+    def set_option(self, option, value):
+        pass
+
+    def start_tls_s(self):
+        pass
+
+    def simple_bind_s(self, who='', cred=''):
+        import ldap
+
+        self.binds += 1
+        if not who:
+            return
+        match = _uid_dn_regex.match(who)
+        if not match or self.directory.authenticate(match.group('uid'), cred) is None:
+            raise ldap.INVALID_CREDENTIALS({'desc': 'Invalid credentials'})
+
+    def search_s(self, base, scope, filterstr='(objectClass=*)', attrlist=None):
+        self.searches += 1
+        match = _uid_filter_regex.match(filterstr) or _uid_dn_regex.match(base)
+        entry = self.directory.entries.get(match.group('uid')) if match else None
+        if entry is None:
+            return []
+        dn = 'uid=%s,%s' % (entry.attrs['uid'][0], FAKE_BASE_DN)
+        return [(dn, {name: [value.encode('utf-8') for value in values] for name, values in entry.attrs.items()})]
+
+    def unbind_s(self):
+        pass
+
+
+class FakeLDAPModule(object):
+    """
+    Stand-in for python-ldap module whose connections go to FakeLDAPDirectory. Assign it to `_ldap` of a
+    django_auth_ldap backend. Everything except `initialize` comes from python-ldap.
+    """
+
+    def __init__(self, fake_directory=directory):
+        self.directory = fake_directory
+        self.connections = []
+
+    def initialize(self, uri):
+        connection = FakeLDAPObject(self.directory)
+        self.connections.append(connection)
+        return connection
+
+    def __getattr__(self, name):
+        import ldap
+
+        return getattr(ldap, name)
+
+
+class FakeLDAPBackend(ModelBackend):
+
+    def authenticate(self, username=None, password=None, **kwargs):
+        attrs = directory.authenticate(username, password)
+        if attrs is None:
+            return None
+
+        user, created = User.objects.get_or_create(username=username)
+        for field, attr in settings.AUTH_LDAP_USER_ATTR_MAP.items():
+            setattr(user, field, attrs[attr][0])
+        if created:
+            user.set_unusable_password()
+        user.save()
+
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        for field, attr in settings.AUTH_LDAP_PROFILE_ATTR_MAP.items():
+            setattr(profile, field, attrs[attr][0])
+        profile.save()
+
+        return user
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 08:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+
+def backfill_roll_key(apps, schema_editor):
+    UserProfile = apps.get_model('account', 'UserProfile')
+    UserProfile.objects.update(roll_key=Upper('roll_number'))
+
+    # Rare rows with surrounding whitespace
+    for obj in UserProfile.objects.filter(Q(roll_number__startswith=' ') | Q(roll_number__endswith=' ')):
+        obj.roll_key = obj.roll_number.strip().upper()
+        obj.save(update_fields=['roll_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='roll_key',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Normalized roll number used for lookups', max_length=16),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_roll_key, migrations.RunPython.noop),
+    ]
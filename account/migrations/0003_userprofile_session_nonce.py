@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 10:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_roll_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='session_nonce',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped on logout to revoke voter sessions'),
+        ),
+    ]
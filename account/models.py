@@ -1,14 +1,18 @@
 from django.contrib.auth.models import User
 from django.db import models
 
-from core.core import CAN_VOTE, EXTENDED_UG_REGEX, PG_TYPE, UG_TYPE, VoterTypes
+from core.core import CAN_VOTE, EXTENDED_UG_REGEX, PG_TYPE, UG_TYPE, VoterTypes, normalize_roll_number
 
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, related_name='user_profile')
     roll_number = models.CharField(max_length=16)
+    roll_key = models.CharField(max_length=16, db_index=True, editable=False,
+                                help_text='Normalized roll number used for lookups')
     user_type = models.CharField(max_length=16, null=True, blank=True)
     voter_type = models.CharField(max_length=16, null=True)
+    session_nonce = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text='Bumped on logout to revoke voter sessions')
 
     @property
     def can_vote(self):
@@ -22,7 +26,14 @@ class UserProfile(models.Model):
     def is_pg(self):
         return self.voter_type and self.voter_type.upper() in PG_TYPE
 
+    def revoke_sessions(self):
+        """
+        Revoke all voter sessions of user, see core.middleware.SessionNonceMiddleware
+        """
+        UserProfile.objects.filter(pk=self.pk).update(session_nonce=models.F('session_nonce') + 1)
+
     def save(self, **kwargs):
+        self.roll_key = normalize_roll_number(self.roll_number)
         if self.user_type and self.roll_number:
             if self.user_type.upper() in UG_TYPE and EXTENDED_UG_REGEX.match(self.roll_number):
                 self.voter_type = VoterTypes.UG
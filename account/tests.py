@@ -1,3 +1,70 @@
-from django.test import TestCase
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .fake_ldap import FAKE_BASE_DN, FakeLDAPModule, directory
+
+try:
+    import ldap
+    from django_auth_ldap.config import LDAPSearch
+except ImportError:
+    ldap = None
+
+
+@skipIf(ldap is None, 'python-ldap is not installed')
+class PooledLDAPBackendTest(TestCase):
+
+    def setUp(self):
+        from .backends import PooledLDAPBackend
+
+        directory.add_user('voter1', 'secret', '16D070001', first_name='First')
+        self.fake_ldap = FakeLDAPModule()
+        patches = [
+            mock.patch.object(PooledLDAPBackend, '_ldap', self.fake_ldap),
+            mock.patch('account.backends._pool', None),
+            mock.patch('account.backends._dn_cache', None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        settings_override = override_settings(
+            AUTH_LDAP_USER_SEARCH=LDAPSearch(FAKE_BASE_DN, ldap.SCOPE_SUBTREE, '(uid=%(user)s)'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(directory.clear)
+        self.backend = PooledLDAPBackend()
+
+    def test_login_populates_user_and_profile(self):
+        user = self.backend.authenticate('voter1', 'secret')
+        self.assertEqual(user.first_name, 'First')
+        self.assertEqual(user.user_profile.roll_key, '16D070001')
+        self.assertIsNone(self.backend.authenticate('voter1', 'wrong'))
+        self.assertIsNone(self.backend.authenticate('nobody', 'secret'))
+
+    def test_connection_is_reused(self):
+        self.backend.authenticate('voter1', 'secret')
+        self.backend.authenticate('voter1', 'wrong')
+        self.backend.authenticate('voter1', 'secret')
+        self.assertEqual(len(self.fake_ldap.connections), 1)
+
+    def test_search_result_is_cached(self):
+        self.backend.authenticate('voter1', 'secret')
+        self.backend.authenticate('voter1', 'secret')
+        self.assertEqual(self.fake_ldap.connections[0].searches, 1)
+
+    def test_unchanged_user_is_not_saved(self):
+        self.backend.authenticate('voter1', 'secret')
+        with CaptureQueriesContext(connection) as queries:
+            self.backend.authenticate('voter1', 'secret')
+        self.assertEqual([query['sql'] for query in queries if not query['sql'].startswith('SELECT')], [])
+
+        # Attributes changed in LDAP are seen once cached search result expires
+        directory.add_user('voter1', 'secret', '16D070001', employee_type='pg')
+        with mock.patch('account.backends._dn_cache', None):
+            user = self.backend.authenticate('voter1', 'secret')
+        user.user_profile.refresh_from_db()
+        self.assertEqual(user.user_profile.user_type, 'pg')
@@ -1,9 +1,11 @@
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import redirect, render
 from django.views.generic.edit import FormView, View
 
-from core.core import CAN_VOTE, LOGGED_IN_SESSION_KEY
+from core.core import CAN_VOTE, LOGGED_IN_SESSION_KEY, SESSION_NONCE_KEY
+from core.security import set_session_timeout
 from election.models import Voter
 
 from .forms import VoterLoginForm
@@ -37,12 +39,20 @@ class VoterLoginView(FormView):
                     form.add_error(None, 'Only students are allowed to vote')
                     return render(request, self.template_name, {'form': form})
                 is_valid_voter = Voter.objects.all().filter(
-                    roll_no__iexact=user.user_profile.roll_number,
+                    roll_key=user.user_profile.roll_key,
                 )
                 if not is_valid_voter:
                     form.add_error(None, 'User is not a valid voter')
+                # Turnout is counted by voter type of Voter, profile may have been created or changed after import
+                Voter.objects.filter(roll_key=user.user_profile.roll_key).exclude(
+                    voter_type=user.user_profile.voter_type,
+                ).update(voter_type=user.user_profile.voter_type)
                 request.session[LOGGED_IN_SESSION_KEY] = True
                 login(request, user)
+                # Voter session is a signed cookie, it is valid till its deadline unless logout revokes it. Election
+                # page sets the deadline of election once voter lands on it.
+                request.session[SESSION_NONCE_KEY] = user.user_profile.session_nonce
+                set_session_timeout(request.session, settings.VOTER_LOGIN_TIMEOUT)
                 return redirect(next_)
             else:
                 form.add_error(None, "Incorrect username/password. Try again!")
@@ -51,6 +61,9 @@ class VoterLoginView(FormView):
 
 class VoterLogoutView(View):
     def post(self, request, *args, **kwargs):
-        if request.user:
+        if request.user.is_authenticated():
+            profile = getattr(request.user, 'user_profile', None)
+            if profile:
+                profile.revoke_sessions()
             logout(request)
         return redirect('account:login')
@@ -0,0 +1,37 @@
+"""
+This module contains versions of shared cache entries.
+
+A version lives in its own key and is a part of keys of entries built from it, so bumping it makes every worker
+rebuild those entries instead of deleting them one by one. Old entries are never read again and expire.
+"""
+import time
+
+from django.core.cache import cache
+
+from .metrics import record_cache_lookup
+
+
+def new_version():
+    # Version is seeded with current time so that a version lost by cache eviction never comes back with an old
+    # value for which workers might still hold an entry.
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """
+    Returns:
+        Current version, None if shared cache can not be read. Entries must not be cached under a None version.
+    """
+    version = cache.get(key)
+    record_cache_lookup(version is not None)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), timeout=None)
@@ -24,6 +24,13 @@ EXTENDED_UG_REGEX = re.compile(r'^' +
                                )
 
 
+def normalize_roll_number(roll_number):
+    """
+    Canonical form of a roll number used for voter lookups
+    """
+    return roll_number.strip().upper() if roll_number else ''
+
+
 class AlertTags(object):
     DANGER = 'alert alert-danger'
     INFO = 'alert alert-info'
@@ -67,3 +74,9 @@ VOTE_TYPE_DICT = {
 VOTE_TYPE_CHOICES = [(key, value) for key, value in VOTE_TYPE_DICT.items()]
 
 LOGGED_IN_SESSION_KEY = 'LOGGED_IN'
+
+# Unix time after which a voter session is no longer valid
+SESSION_DEADLINE_KEY = 'DEADLINE'
+
+# UserProfile.session_nonce at login, voter session is revoked once it changes
+SESSION_NONCE_KEY = 'NONCE'
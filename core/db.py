@@ -0,0 +1,102 @@
+"""
+This module contains database helpers which are not provided by django ORM
+"""
+import sqlite3
+
+
+def supports_upsert(connection):
+    """
+    Check if database supports INSERT ... ON CONFLICT DO UPDATE ... RETURNING in a single statement
+    """
+    if connection.vendor == 'postgresql':
+        return connection.pg_version >= 90500
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+# SQLite before 3.32 allows at most 999 parameters in a statement
+SQLITE_MAX_VARIABLES = 999
+
+
+def in_batches(connection, values):
+    """
+    Split values of a field__in lookup into lists which fit in one statement. Only SQLite needs more than one, a few
+    parameters are left for rest of the query.
+    """
+    values = list(values)
+    batch_size = SQLITE_MAX_VARIABLES - 9 if connection.vendor == 'sqlite' else len(values) or 1
+    return [values[start:start + batch_size] for start in range(0, len(values), batch_size)]
+
+
+def bulk_insert_values(connection, model, field_names, rows, batch_size=1000):
+    """
+    Insert rows of database values with multi-row INSERT statements. Unlike bulk_create, it builds no model instances
+    and prepares no values, so it is several times faster for large imports. No defaults are applied and no signals
+    are sent.
+
+    Args:
+        connection: Database connection
+        model: Model of table
+        field_names: Names of fields in each row
+        rows: List of tuples of values prepared for database (see Field.get_db_prep_save), in order of field_names
+        batch_size: Max rows in a statement
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    if connection.vendor == 'sqlite':
+        batch_size = min(batch_size, SQLITE_MAX_VARIABLES // len(fields))
+
+    quote_name = connection.ops.quote_name
+    sql = 'INSERT INTO {table} ({columns}) VALUES '.format(
+        table=quote_name(model._meta.db_table),
+        columns=', '.join(quote_name(field.column) for field in fields),
+    )
+    placeholder = '(%s)' % ', '.join(['%s'] * len(fields))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                sql + ', '.join([placeholder] * len(batch)),
+                [value for row in batch for value in row],
+            )
+
+
+def bulk_update_values(connection, model, field_name, values, batch_size=1000):
+    """
+    Set a different value of one field for many rows with one UPDATE statement per batch. PostgreSQL joins rows with a
+    VALUES list, other databases use a CASE expression.
+
+    Args:
+        connection: Database connection
+        model: Model of table
+        field_name: Name of field to update
+        values: List of (primary key, value prepared for database) tuples
+        batch_size: Max rows in a statement
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    column = quote_name(model._meta.get_field(field_name).column)
+    pk_column = quote_name(model._meta.pk.column)
+
+    if connection.vendor == 'postgresql':
+        sql = 'UPDATE {table} SET {column} = new.value FROM (VALUES {{values}}) AS new (pk, value) ' \
+              'WHERE {table}.{pk_column} = new.pk'.format(table=table, column=column, pk_column=pk_column)
+
+        def statement(batch):
+            return (sql.format(values=', '.join(['(%s, %s)'] * len(batch))),
+                    [param for row in batch for param in row])
+    else:
+        if connection.vendor == 'sqlite':
+            # Every row takes three parameters
+            batch_size = min(batch_size, SQLITE_MAX_VARIABLES // 3)
+        sql = 'UPDATE {table} SET {column} = CASE {pk_column} {{whens}} END WHERE {pk_column} IN ({{pks}})'.format(
+            table=table, column=column, pk_column=pk_column)
+
+        def statement(batch):
+            return (sql.format(whens=' '.join(['WHEN %s THEN %s'] * len(batch)), pks=', '.join(['%s'] * len(batch))),
+                    [param for row in batch for param in row] + [pk for pk, _ in batch])
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), batch_size):
+            cursor.execute(*statement(values[start:start + batch_size]))
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILE_SCRIPT = 'from core.startup_profile import profile_startup; profile_startup(warm_up=%r)'
+
+
+class Command(BaseCommand):
+    help = ('Start application in a new interpreter like a web worker does and report time of every startup phase '
+            'and of imported packages and modules')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-warm-up', action='store_false', dest='warm_up',
+                            help='Skip warm up (see core/warmup.py), it needs database and cache')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules to list')
+        parser.add_argument('--json', action='store_true', help='Write profile as JSON')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        started_at = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', PROFILE_SCRIPT % options['warm_up']], cwd=settings.BASE_DIR,
+                                 env=env, stdout=subprocess.PIPE, universal_newlines=True)
+        total = time.perf_counter() - started_at
+        if process.returncode:
+            raise CommandError('Application failed to start')
+
+        profile = json.loads(process.stdout.splitlines()[-1])
+        profile['total'] = total
+        if options['json']:
+            self.stdout.write(json.dumps(profile, indent=2))
+            return
+
+        phases = profile['phases']
+        self.stdout.write('%-28s %8s' % ('Phase', 'Seconds'))
+        for phase, seconds in phases.items():
+            self.stdout.write('%-28s %8.3f' % (phase, seconds))
+        startup = sum(seconds for phase, seconds in phases.items() if ':' not in phase)
+        self.stdout.write('%-28s %8.3f' % ('interpreter', total - startup))
+        self.stdout.write('%-28s %8.3f' % ('total', total))
+
+        modules = profile['modules']
+        packages = defaultdict(lambda: [0.0, 0])
+        for name, (_, exclusive) in modules.items():
+            package = packages[name.partition('.')[0]]
+            package[0] += exclusive
+            package[1] += 1
+
+        import_time = sum(seconds for seconds, _ in packages.values())
+        self.stdout.write('\n%d modules imported in %.3fs' % (len(modules), import_time))
+        self.stdout.write('%-28s %8s %8s' % ('Package', 'Seconds', 'Modules'))
+        for name, (seconds, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write('%-28s %8.3f %8d' % (name, seconds, count))
+
+        self.stdout.write('\n%-48s %8s %8s' % ('Module', 'Self', 'Total'))
+        for name, (inclusive, exclusive) in sorted(modules.items(), key=lambda item: -item[1][1])[:options['top']]:
+            self.stdout.write('%-48s %8.3f %8.3f' % (name, exclusive, inclusive))
@@ -0,0 +1,196 @@
+"""
+This module contains in-process request metrics collected by core.middleware.RequestMetricsMiddleware.
+
+Every worker keeps a rolling window of metrics per URL name: request count, wall time histogram, DB time, query count
+and shared cache hits/misses. A window is written to the `metrics` logger as one JSON line and reset every
+settings.METRICS_FLUSH_INTERVAL seconds.
+
+Queries are counted by a cursor wrapper installed on every database connection (see count_queries). It only adds a
+counter and a timer to each query, unlike debug cursor it keeps no SQL.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+
+logger = logging.getLogger('metrics')
+
+# Upper bounds in milliseconds of wall time histogram buckets, last bucket is unbounded
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_request_state = threading.local()
+
+
+class ViewMetrics(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, wall_ms, db_ms, queries, cache_hits, cache_misses, error):
+        self.requests += 1
+        self.errors += error
+        self.buckets[bisect_left(LATENCY_BUCKETS, wall_ms)] += 1
+        self.total_ms += wall_ms
+        self.max_ms = max(self.max_ms, wall_ms)
+        self.db_ms += db_ms
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.cache_hits += cache_hits
+        self.cache_misses += cache_misses
+
+    def percentile(self, percent):
+        """
+        Upper bound of bucket containing given percentile of wall time, max wall time for the last bucket
+        """
+        rank = percent / 100 * self.requests
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else round(self.max_ms, 1)
+        return 0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.requests, 2),
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'avg_db_ms': round(self.db_ms / self.requests, 2),
+            'avg_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'buckets': self.buckets,
+        }
+
+
+class MetricsRegistry(object):
+    """
+    Metrics of all views in this process for current window
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._window_start = time.time()
+
+    def record(self, view_name, wall_ms, db_ms, queries, cache_hits, cache_misses, error):
+        with self._lock:
+            metrics = self._views.get(view_name)
+            if metrics is None:
+                metrics = self._views[view_name] = ViewMetrics()
+            metrics.add(wall_ms, db_ms, queries, cache_hits, cache_misses, error)
+            due = time.time() - self._window_start >= settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            views, self._views = self._views, {}
+            window_start, self._window_start = self._window_start, time.time()
+        if not views:
+            return
+        logger.info(json.dumps({
+            'window_start': round(window_start, 3),
+            'window_end': round(time.time(), 3),
+            'buckets_ms': LATENCY_BUCKETS,
+            'views': {name: metrics.as_dict() for name, metrics in views.items()},
+        }, sort_keys=True))
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+def start_request():
+    _request_state.cache_hits = 0
+    _request_state.cache_misses = 0
+    _request_state.queries = 0
+    _request_state.db_seconds = 0.0
+
+
+def get_queries():
+    """
+    Returns:
+        (query count, DB time in milliseconds) of current request
+    """
+    return getattr(_request_state, 'queries', 0), getattr(_request_state, 'db_seconds', 0.0) * 1000
+
+
+def get_cache_lookups():
+    """
+    Returns:
+        (cache hits, cache misses) of current request
+    """
+    return getattr(_request_state, 'cache_hits', 0), getattr(_request_state, 'cache_misses', 0)
+
+
+def record_cache_lookup(hit):
+    """
+    Count a shared cache lookup for current request
+    """
+    if hit:
+        _request_state.cache_hits = getattr(_request_state, 'cache_hits', 0) + 1
+    else:
+        _request_state.cache_misses = getattr(_request_state, 'cache_misses', 0) + 1
+
+
+def record_query(seconds):
+    _request_state.queries = getattr(_request_state, 'queries', 0) + 1
+    _request_state.db_seconds = getattr(_request_state, 'db_seconds', 0.0) + seconds
+
+
+class QueryCountingCursorWrapper(CursorWrapper):
+    """
+    Count queries and their time for current request
+    """
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            record_query(time.perf_counter() - start)
+
+
+class QueryCountingCursorDebugWrapper(QueryCountingCursorWrapper, CursorDebugWrapper):
+    """
+    Debug cursor (used with DEBUG or while queries are captured) which also counts queries
+    """
+
+
+def count_queries(connection):
+    """
+    Make cursors of a database connection count queries for request metrics. Connections are per thread and live
+    across requests, so it is done once per connection.
+    """
+    if getattr(connection, 'counts_queries', False):
+        return
+    connection.make_cursor = lambda cursor: QueryCountingCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = lambda cursor: QueryCountingCursorDebugWrapper(cursor, connection)
+    connection.counts_queries = True
@@ -0,0 +1,140 @@
+"""
+This module contains middlewares of the portal
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import logout
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.urlresolvers import Resolver404, resolve
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.http import cookie_date
+
+from . import metrics
+from .core import SESSION_NONCE_KEY
+from .security import get_session_time_left
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Record wall time, DB time, query count and cache lookups of every request per URL name (see core/metrics.py).
+    Queries of all database connections are counted.
+
+    Must be the first middleware so that time spent in other middlewares is included.
+    """
+
+    def process_request(self, request):
+        for connection in connections.all():
+            metrics.count_queries(connection)
+        metrics.start_request()
+        request._metrics_start = time.perf_counter()
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_metrics_start'):
+            return response
+
+        wall_ms = (time.perf_counter() - request._metrics_start) * 1000
+        queries, db_ms = metrics.get_queries()
+        cache_hits, cache_misses = metrics.get_cache_lookups()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match and resolver_match.view_name else UNRESOLVED_VIEW
+
+        metrics.registry.record(view_name, wall_ms, db_ms, queries, cache_hits, cache_misses,
+                                response.status_code >= 500)
+        return response
+
+
+class VoterSessionMiddleware(SessionMiddleware):
+    """
+    Replaces django SessionMiddleware. Sessions of voter pages (settings.VOTER_SESSION_URL_NAMES) are kept in
+    settings.VOTER_SESSION_ENGINE under cookie settings.VOTER_SESSION_COOKIE_NAME, sessions of all other pages
+    (admin) in settings.SESSION_ENGINE under settings.SESSION_COOKIE_NAME. Cookies are separate, so an admin can
+    vote from the same browser.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.VoterSessionStore = import_module(settings.VOTER_SESSION_ENGINE).SessionStore
+
+    def _is_voter_request(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.VOTER_SESSION_URL_NAMES
+
+    def process_request(self, request):
+        if self._is_voter_request(request):
+            request.session_cookie_name = settings.VOTER_SESSION_COOKIE_NAME
+            request.session = self.VoterSessionStore(request.COOKIES.get(request.session_cookie_name))
+        else:
+            request.session_cookie_name = settings.SESSION_COOKIE_NAME
+            request.session = self.SessionStore(request.COOKIES.get(request.session_cookie_name))
+
+    def process_response(self, request, response):
+        """
+        Same as SessionMiddleware.process_response, except for cookie name chosen in process_request
+        """
+        try:
+            accessed = request.session.accessed
+            modified = request.session.modified
+            empty = request.session.is_empty()
+            cookie_name = request.session_cookie_name
+        except AttributeError:
+            return response
+
+        if cookie_name in request.COOKIES and empty:
+            response.delete_cookie(cookie_name, domain=settings.SESSION_COOKIE_DOMAIN)
+            return response
+
+        if accessed:
+            patch_vary_headers(response, ('Cookie',))
+        if (modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty:
+            if request.session.get_expire_at_browser_close():
+                max_age = None
+                expires = None
+            else:
+                max_age = request.session.get_expiry_age()
+                expires = cookie_date(time.time() + max_age)
+            # Skip session save for 500 responses, refs django #3881
+            if response.status_code != 500:
+                request.session.save()
+                response.set_cookie(cookie_name, request.session.session_key, max_age=max_age, expires=expires,
+                                    domain=settings.SESSION_COOKIE_DOMAIN, path=settings.SESSION_COOKIE_PATH,
+                                    secure=settings.SESSION_COOKIE_SECURE or None,
+                                    httponly=settings.SESSION_COOKIE_HTTPONLY or None)
+        return response
+
+
+class SessionDeadlineMiddleware(object):
+    """
+    Flush sessions whose deadline set by core.security.set_session_timeout has passed.
+
+    Must come after VoterSessionMiddleware and before AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        if get_session_time_left(request.session) == 0:
+            request.session.flush()
+
+
+class SessionNonceMiddleware(object):
+    """
+    Log out voter sessions revoked by a logout of their user (see UserProfile.revoke_sessions). A voter session is a
+    signed cookie which server can not delete, a copy taken before logout would be valid till its deadline otherwise.
+
+    Must come after AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        nonce = request.session.get(SESSION_NONCE_KEY)
+        if nonce is None or not request.user.is_authenticated():
+            return
+        profile = getattr(request.user, 'user_profile', None)
+        if profile is None or profile.session_nonce != nonce:
+            logout(request)
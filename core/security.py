@@ -1,6 +1,9 @@
 """
 This module contains information regarding security and logging of requests
 """
+import time
+
+from .core import SESSION_DEADLINE_KEY
 
 
 def get_client_ip(request):
@@ -10,3 +13,24 @@ def get_client_ip(request):
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
+
+
+def set_session_timeout(session, seconds):
+    """
+    Expire session after given seconds.
+
+    Sessions are signed cookies which server can not expire, so deadline is stored in session itself and checked by
+    core.middleware.SessionDeadlineMiddleware.
+    """
+    session.set_expiry(seconds)
+    session[SESSION_DEADLINE_KEY] = int(time.time()) + seconds
+
+
+def get_session_time_left(session):
+    """
+    Seconds left before session expires, None if session has no deadline
+    """
+    deadline = session.get(SESSION_DEADLINE_KEY)
+    if deadline is None:
+        return None
+    return max(0, deadline - int(time.time()))
@@ -0,0 +1,111 @@
+"""
+This module measures startup of a web worker, it is run in a fresh interpreter by `manage.py profile_startup`.
+
+Startup is split in phases (settings, apps, WSGI handler and warm up, see core/warmup.py) and every module imported
+during startup is timed. Time of a module excludes time of modules it imports, so times of all modules add up to
+total import time.
+
+Only standard library is imported at module level, so that modules imported by Django are timed too.
+"""
+import builtins
+import importlib
+import importlib.util
+import json
+import sys
+import time
+from collections import OrderedDict
+
+
+class ImportTimer(object):
+    """
+    Records (inclusive, exclusive) seconds of every module imported while installed
+    """
+
+    def __init__(self):
+        self.modules = OrderedDict()
+        self._stack = []
+        self._import = builtins.__import__
+        self._import_module = importlib.import_module
+
+    def install(self):
+        builtins.__import__ = self._timed_import
+        importlib.import_module = self._timed_import_module
+
+    def uninstall(self):
+        builtins.__import__ = self._import
+        importlib.import_module = self._import_module
+
+    def _timed(self, name, load):
+        if name is None or name in sys.modules:
+            return load()
+
+        self._stack.append(0.0)
+        started_at = time.perf_counter()
+        try:
+            return load()
+        finally:
+            elapsed = time.perf_counter() - started_at
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            if name in sys.modules and name not in self.modules:
+                self.modules[name] = (elapsed, elapsed - children)
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        return self._timed(self._absolute_name(name, globals, level),
+                           lambda: self._import(name, globals, locals, fromlist, level))
+
+    def _timed_import_module(self, name, package=None):
+        return self._timed(self._absolute_name(name, {'__package__': package}, 0) if name.startswith('.') else name,
+                           lambda: self._import_module(name, package))
+
+    @staticmethod
+    def _absolute_name(name, globals, level):
+        if not level and not name.startswith('.'):
+            return name
+        package = (globals or {}).get('__package__')
+        if not package:
+            return None
+        try:
+            return importlib.util.resolve_name('.' * level + name, package)
+        except (ImportError, ValueError):
+            return None
+
+
+class StartupProfile(object):
+
+    def __init__(self):
+        self.timer = ImportTimer()
+        self.phases = OrderedDict()
+
+    def phase(self, name, function):
+        started_at = time.perf_counter()
+        result = function()
+        self.phases[name] = time.perf_counter() - started_at
+        return result
+
+    def as_dict(self):
+        return {
+            'phases': self.phases,
+            'modules': self.timer.modules,
+        }
+
+
+def profile_startup(warm_up=True):
+    """
+    Load application like ElectionPortal/wsgi.py does and print profile as JSON on last line of stdout
+    """
+    profile = StartupProfile()
+    profile.timer.install()
+    try:
+        profile.phase('settings', lambda: getattr(importlib.import_module('django.conf').settings, 'INSTALLED_APPS'))
+        profile.phase('apps', lambda: importlib.import_module('django').setup())
+        profile.phase('wsgi handler', lambda: importlib.import_module('django.core.handlers.wsgi').WSGIHandler())
+        if warm_up:
+            timings = profile.phase('warm up', lambda: importlib.import_module('core.warmup').warm_up())
+            for step, seconds in timings.items():
+                profile.phases['warm up: %s' % step] = seconds
+    finally:
+        profile.timer.uninstall()
+
+    sys.stdout.write('\n' + json.dumps(profile.as_dict()) + '\n')
@@ -1,3 +1,185 @@
-from django.test import TestCase
+import csv
+import time
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from simple_history.models import HistoricalRecords
+
+from account.fake_ldap import directory
+from account.models import UserProfile
+from core.core import PostTypes
+from election.ballot import get_ballot
+from election.models import Election, Voter, generate_random_voter_keys
+from post.models import Post
+from vote.models import VoteSession
+
+from . import metrics
+from .export import EXPORT_CHUNK_SIZE
+from .warmup import warm_up
+
+
+class WarmUpTest(TestCase):
+
+    def test_loads_open_elections(self):
+        creator = User.objects.create_user('creator')
+        election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        Post.objects.create(name='General Secretary', election=election, type=PostTypes.ALL)
+        Post.objects.create(name='UG Secretary', election=election, type=PostTypes.UG)
+        cache.clear()
+
+        # Connection of test case must stay open
+        with mock.patch('core.warmup.connections'):
+            timings = warm_up()
+        self.assertEqual(list(timings), ['urls', 'auth backends', 'templates', 'elections'])
+
+        with self.assertNumQueries(0):
+            ballot = get_ballot(election.id, [PostTypes.ALL, PostTypes.UG])
+        self.assertEqual(sorted(post.name for post in ballot), ['General Secretary', 'UG Secretary'])
+        self.assertEqual(len(ballot._fragments), 1)
+
+
+class RequestMetricsTest(TestCase):
+
+    def test_queries_are_counted_without_debug_cursor(self):
+        user = User.objects.create_user('admin', password='password', is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+
+        with mock.patch.object(metrics.registry, 'record') as record:
+            self.client.get(reverse('admin:index'))
+            self.assertFalse(connection.force_debug_cursor)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('admin:index'))
+
+        view_name, _, _, query_count = record.call_args[0][:4]
+        self.assertEqual(view_name, 'admin:index')
+        self.assertGreater(query_count, 0)
+        self.assertEqual(query_count, len(queries))
+        self.assertEqual(record.call_args_list[0][0][3], query_count)
+
+
+class CSVExportTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator)
+        self.other_election = Election.objects.create(name='Hostel Election', creator=creator)
+
+        # One chunk and one row more, so export crosses a chunk boundary
+        voter_count = EXPORT_CHUNK_SIZE + 1
+        Voter.objects.bulk_create(
+            Voter(election=self.election, roll_no='%09d' % index, roll_key='%09d' % index, key=key)
+            for index, key in enumerate(generate_random_voter_keys(voter_count))
+        )
+        Voter.objects.create(election=self.other_election, roll_no='160050001')
+        # Exactly one chunk, last query of export finds no rows
+        VoteSession.objects.bulk_create(VoteSession(election=self.election) for _ in range(EXPORT_CHUNK_SIZE))
+
+    def _export(self, changelist, action, model):
+        # All rows of changelist are selected
+        response = self.client.post(reverse(changelist), {
+            'action': action,
+            'select_across': 1,
+            'index': 0,
+            '_selected_action': [model.objects.values_list('pk', flat=True)[0]],
+        })
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+
+    def _assert_serial_numbers(self, rows, count):
+        self.assertEqual(len(rows), count + 1)
+        self.assertEqual([row[0] for row in rows[1:]], [str(index) for index in range(1, count + 1)])
+
+    def test_voter_export_crosses_chunk_boundary(self):
+        rows = self._export('admin:election_voter_changelist', 'download_voters_action', Voter)
+
+        self.assertEqual(rows[0], ['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'])
+        self._assert_serial_numbers(rows, EXPORT_CHUNK_SIZE + 2)
+        self.assertEqual(len({row[2] for row in rows[1:]}), EXPORT_CHUNK_SIZE + 2)
+
+    def test_election_voter_export_crosses_chunk_boundary(self):
+        rows = self._export('admin:election_election_changelist', 'download_voters_action', Election)
+
+        self.assertEqual(rows[0], ['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'])
+        self._assert_serial_numbers(rows, EXPORT_CHUNK_SIZE + 2)
+        self.assertEqual(Counter(row[1] for row in rows[1:]),
+                         {'General Election': EXPORT_CHUNK_SIZE + 1, 'Hostel Election': 1})
+
+    def test_vote_session_export_of_one_full_chunk(self):
+        rows = self._export('admin:vote_votesession_changelist', 'download_data', VoteSession)
+
+        self.assertEqual(rows[0], ['S.No.', 'Election Name', 'Timestamp'])
+        self._assert_serial_numbers(rows, EXPORT_CHUNK_SIZE)
+        self.assertEqual({row[1] for row in rows[1:]}, {'General Election'})
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['account.fake_ldap.FakeLDAPBackend',
+                                            'django.contrib.auth.backends.ModelBackend'])
+class VoterSessionTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        Voter.objects.create(roll_no='140050001', election=election)
+        directory.add_user('voter', 'password', '140050001')
+        self.addCleanup(directory.clear)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+
+    def test_voter_session_lives_in_signed_cookie(self):
+        response = self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.VOTER_SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+        # Only user and profile are read, session comes from cookie
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'))
+        self.assertTemplateUsed(response, 'logged_in.html')
+
+    def test_login_sets_voter_type_of_voter(self):
+        self.assertIsNone(Voter.objects.get().voter_type)
+
+        self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+
+        self.assertEqual(Voter.objects.get().voter_type, UserProfile.objects.get().voter_type)
+        self.assertIsNotNone(Voter.objects.get().voter_type)
+
+    def test_login_sets_deadline(self):
+        response = self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+        self.assertEqual(response.cookies[settings.VOTER_SESSION_COOKIE_NAME]['max-age'], settings.VOTER_LOGIN_TIMEOUT)
+
+        with mock.patch('core.security.time.time', return_value=time.time() + settings.VOTER_LOGIN_TIMEOUT + 1):
+            response = self.client.get(reverse('index'))
+        self.assertTemplateNotUsed(response, 'logged_in.html')
+
+    def test_logout_revokes_copied_cookie(self):
+        self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+        cookie = self.client.cookies[settings.VOTER_SESSION_COOKIE_NAME].value
+
+        self.client.post(reverse('account:logout'))
+        self.client.cookies[settings.VOTER_SESSION_COOKIE_NAME] = cookie
+        self.assertTemplateNotUsed(self.client.get(reverse('index')), 'logged_in.html')
+
+        # A new login is not revoked by earlier logout
+        self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+        self.assertTemplateUsed(self.client.get(reverse('index')), 'logged_in.html')
+
+    def test_admin_session_is_kept_apart_from_voter_session(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertEqual(Session.objects.count(), 1)
+        self.client.post(reverse('account:login'), {'username': 'voter', 'password': 'password'})
+
+        self.client.post(reverse('account:logout'))
+        self.assertEqual(self.client.cookies[settings.VOTER_SESSION_COOKIE_NAME].value, '')
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
@@ -0,0 +1,84 @@
+"""
+This module warms up a web worker before it takes traffic, it is called by ElectionPortal/wsgi.py.
+
+Django loads URLconf (and so every view), authentication backends (and so ldap) and templates on first request which
+needs them, and ballots and voter eligibility of an election are loaded on its first voting request. Without warm
+up, first voters served by every new or respawned worker pay for all of it.
+
+uWSGI loads application in master process (unless lazy-apps is set) and forks workers from it, so a respawned worker
+starts warm too. Connections to database and cache are closed after warm up, so that workers never share them.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_backends
+from django.core.cache import cache
+from django.core.urlresolvers import get_resolver
+from django.db import connections
+from django.template.loader import get_template
+
+from election.eligibility import get_open_election_ids
+from election.models import Election
+from election.priming import load_election
+
+logger = logging.getLogger(__name__)
+
+# Templates of voting pages, including templates they extend or include
+WARM_UP_TEMPLATES = (
+    'root.html',
+    'footer.html',
+    'logged_in.html',
+    'account/login.html',
+    'elections/election_view.html',
+    'elections/ballot.html',
+)
+
+
+def _load_urls():
+    resolver = get_resolver()
+    return resolver.url_patterns, resolver.reverse_dict
+
+
+def _load_templates():
+    for template_name in WARM_UP_TEMPLATES:
+        get_template(template_name)
+
+
+def _load_elections():
+    for election in Election.objects.filter(pk__in=get_open_election_ids()):
+        load_election(election)
+
+
+WARM_UP_STEPS = OrderedDict([
+    ('urls', _load_urls),
+    ('auth backends', get_backends),
+    ('templates', _load_templates),
+    ('elections', _load_elections),
+])
+
+
+def warm_up():
+    """
+    Load everything first voting requests need. A failed step is logged and skipped, warm up never stops a worker
+    from starting.
+
+    Returns:
+        OrderedDict of step name to seconds
+    """
+    timings = OrderedDict()
+    try:
+        for step, function in WARM_UP_STEPS.items():
+            started_at = time.perf_counter()
+            try:
+                function()
+            except Exception:
+                logger.exception('Warm up step %s failed', step)
+            timings[step] = time.perf_counter() - started_at
+    finally:
+        connections.close_all()
+        cache.close()
+
+    logger.info('Worker warmed up in %.2fs (%s)', sum(timings.values()),
+                ', '.join('%s %.2fs' % (step, seconds) for step, seconds in timings.items()))
+    return timings
@@ -1,17 +1,20 @@
-import csv
-
 from django import forms
 from django.conf.urls import url
 from django.contrib import admin
-from django.http.response import HttpResponse
+from django.contrib.admin.utils import unquote
+from django.utils.functional import SimpleLazyObject
 from simple_history.admin import SimpleHistoryAdmin
 
 from core.admin import RemoveDeleteSelectedMixin
+from core.export import iterate_values, streaming_csv_response
 from post.models import Post
 from post.utils import PostUtils
 
-from ..models import Election
-from ..views import AddVotersView, ElectionResultView
+from ..analytics import get_turnout_analytics
+from ..eligibility import invalidate_open_elections
+from ..models import Election, Voter
+from ..turnout import SNAPSHOT_INTERVAL
+from ..views import AddVotersView, ElectionResultView, ElectionTurnoutView, VoterImportJobView
 
 
 class NonSuperuserElectionForm(forms.ModelForm):
@@ -60,25 +63,20 @@ class ElectionAdmin(RemoveDeleteSelectedMixin, SimpleHistoryAdmin):
             queryset = queryset.filter(creator=request.user)
 
         queryset.update(is_active=True)
+        # update does not send signals
+        invalidate_open_elections()
 
     activate_all.short_description = 'Activate selected elections'
 
     def download_voters_action(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="voters.csv"'
-        writer = csv.writer(response)
-
-        queryset = queryset.prefetch_related('voters')
-        index = 1
+        elections = list(queryset.values_list('pk', 'name'))
 
-        writer.writerow(['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'])
+        def rows():
+            for election_id, name in elections:
+                for roll_no, key in iterate_values(Voter.objects.filter(election_id=election_id), ['roll_no', 'key']):
+                    yield name, roll_no, key
 
-        for election in queryset:
-            for voter in election.voters.all():
-                writer.writerow([index, election.name, voter.roll_no, voter.key])
-                index += 1
-
-        return response
+        return streaming_csv_response('voters.csv', ['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'], rows())
 
     download_voters_action.short_description = 'Download voters data'
 
@@ -117,11 +115,22 @@ class ElectionAdmin(RemoveDeleteSelectedMixin, SimpleHistoryAdmin):
         my_urls = [
             url(r'^(.+)/add_voters/$',
                 self.admin_site.admin_view(AddVotersView.as_view()), name='election_election_add_voters_url'),
+            url(r'^(.+)/import_jobs/(\d+)/$',
+                self.admin_site.admin_view(VoterImportJobView.as_view()), name='election_election_import_job'),
             url(r'^(.+)/get_result/$',
                 self.admin_site.admin_view(ElectionResultView.as_view()), name='election_election_get_election_result'),
+            url(r'^(.+)/turnout/$',
+                self.admin_site.admin_view(ElectionTurnoutView.as_view()), name='election_election_turnout'),
         ]
         return my_urls + urls
 
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = extra_context or {}
+        # Computed only if change form is rendered, i.e. after permissions are checked
+        extra_context['turnout_analytics'] = SimpleLazyObject(lambda: get_turnout_analytics(unquote(object_id)))
+        extra_context['turnout_poll_interval'] = SNAPSHOT_INTERVAL * 1000
+        return super().change_view(request, object_id, form_url, extra_context)
+
     def save_model(self, request, obj, form, change):
         if not request.user.is_superuser:
             obj.creator = request.user
@@ -1,11 +1,8 @@
-import csv
-
 from django.contrib import admin, messages
-from django.db import transaction
-from django.http.response import HttpResponse
 
 from core.admin import RemoveDeleteSelectedMixin
 from core.admin_filters import ElectionsFilter
+from core.export import iterate_values, streaming_csv_response
 
 from ..models import Election, Voter
 
@@ -24,28 +21,14 @@ class VoterAdmin(RemoveDeleteSelectedMixin, admin.ModelAdmin):
         return super().lookup_allowed(lookup, value)
 
     def download_voters_action(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="voters.csv"'
-        writer = csv.writer(response)
-
-        queryset = queryset.select_related('election')
-        index = 1
-
-        writer.writerow(['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'])
-
-        for voter in queryset:
-            writer.writerow([index, voter.election.name, voter.roll_no, voter.key])
-            index += 1
-
-        return response
+        rows = iterate_values(queryset, ['election__name', 'roll_no', 'key'])
+        return streaming_csv_response('voters.csv', ['S.No.', 'Election Name', 'Voter Roll Number', 'Passkey'], rows)
 
     download_voters_action.short_description = 'Download voters data'
 
     def shuffle_voters_keys(self, request, queryset):
-        with transaction.atomic():
-            for voter in queryset:
-                voter.shuffle_key()
-        messages.add_message(request, messages.SUCCESS, 'Voters keys shuffled successfully')
+        count = queryset.shuffle_keys()
+        messages.add_message(request, messages.SUCCESS, '%d voters keys shuffled successfully' % count)
 
     shuffle_voters_keys.short_description = 'Shuffle voters keys'
 
@@ -0,0 +1,111 @@
+"""
+This module contains turnout of an election broken down by voter tags and voter types (UG, PG, other), shown on the
+election admin page.
+
+Whole breakdown comes from one grouped query (one row per tag, voter type and voted flag) over voters of the election
+only, voter type is read from Voter.voter_type instead of joining profiles on roll number. It is recomputed at most once
+per ANALYTICS_TIMEOUT seconds by whichever admin page finds it stale (guarded by a cache lock as turnout snapshots are),
+other pages meanwhile show the stale copy, so refreshing admin pages during polling does not scan voters again.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Tag, Voter
+from .turnout import TURNOUT_VOTER_TYPES, get_turnout_voter_type
+
+TURNOUT_ANALYTICS_KEY = 'turnout_analytics_{election_id}'
+TURNOUT_ANALYTICS_LOCK_KEY = 'turnout_analytics_lock_{election_id}'
+
+ANALYTICS_TIMEOUT = 30
+
+
+def _count(voters, voted):
+    return {
+        'voters': voters,
+        'voted': voted,
+        'turnout': round(voted * 100 / voters, 1) if voters else 0,
+    }
+
+
+def _empty_counts():
+    return {voter_type: [0, 0] for voter_type in TURNOUT_VOTER_TYPES}
+
+
+def _query_counts(election_id):
+    """
+    {tag: {voter type: [voters, voted]}}, tag None has counts of all voters (tagged or not)
+    """
+    # Tags are joined after grouping, so only grouped rows (not every voter-tag row) look up tag names
+    sql = (
+        'SELECT tag.tag, counts.voter_type, counts.voted, counts.count FROM ('
+        '  SELECT voter_tag.tag_id, voter.voter_type, voter.voted, COUNT(*) AS count '
+        '  FROM {voter} voter '
+        '  INNER JOIN {voter_tag} voter_tag ON voter_tag.voter_id = voter.id '
+        '  WHERE voter.election_id = %s '
+        '  GROUP BY voter_tag.tag_id, voter.voter_type, voter.voted'
+        ') counts '
+        'INNER JOIN {tag} tag ON tag.id = counts.tag_id '
+        'UNION ALL '
+        'SELECT NULL, voter.voter_type, voter.voted, COUNT(*) '
+        'FROM {voter} voter '
+        'WHERE voter.election_id = %s '
+        'GROUP BY voter.voter_type, voter.voted'
+    ).format(
+        voter=Voter._meta.db_table,
+        voter_tag=Voter.tags.through._meta.db_table,
+        tag=Tag._meta.db_table,
+    )
+
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [election_id, election_id])
+        for tag, voter_type, voted, count in cursor.fetchall():
+            type_counts = counts.setdefault(tag, _empty_counts())[get_turnout_voter_type(voter_type)]
+            type_counts[0] += count
+            if voted:
+                type_counts[1] += count
+    return counts
+
+
+def _format_counts(type_counts):
+    return {
+        'total': _count(sum(voters for voters, _ in type_counts.values()),
+                        sum(voted for _, voted in type_counts.values())),
+        'voter_types': [(voter_type, _count(*type_counts[voter_type])) for voter_type in TURNOUT_VOTER_TYPES],
+    }
+
+
+def compute_turnout_analytics(election_id):
+    counts = _query_counts(election_id)
+    analytics = _format_counts(counts.pop(None, _empty_counts()))
+    analytics['tags'] = [dict(tag=tag, **_format_counts(counts[tag])) for tag in sorted(counts)]
+    return analytics
+
+
+def get_turnout_analytics(election_id):
+    """
+    Turnout of an election overall, per voter type and per tag. Recomputed at most once per ANALYTICS_TIMEOUT seconds.
+
+    Returns:
+        dict with
+            time: when it was computed
+            total: {voters, voted, turnout (percentage)}
+            voter_types: list of (voter type, counts) in order of TURNOUT_VOTER_TYPES
+            tags: list of {tag, total, voter_types} in order of tag name
+        None if another request is computing the first one.
+    """
+    key = TURNOUT_ANALYTICS_KEY.format(election_id=election_id)
+    analytics = cache.get(key)
+    now = time.time()
+    if analytics and now - analytics['time'] < ANALYTICS_TIMEOUT:
+        return analytics
+    if not cache.add(TURNOUT_ANALYTICS_LOCK_KEY.format(election_id=election_id), 1, timeout=ANALYTICS_TIMEOUT):
+        return analytics
+
+    analytics = compute_turnout_analytics(election_id)
+    analytics['time'] = now
+    # Kept past ANALYTICS_TIMEOUT, so that it can be shown while it is being recomputed
+    cache.set(key, analytics, timeout=ANALYTICS_TIMEOUT * 10)
+    return analytics
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ElectionConfig(AppConfig):
     name = 'election'
+
+    def ready(self):
+        import election.signals
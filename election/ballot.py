@@ -0,0 +1,234 @@
+"""
+This module contains the ballot structure cache used by the voting views.
+
+A ballot is the ordered list of posts (and their candidates) an election shows to a voter of some post types.
+Posts and candidates are frozen once an election is activated, so ballots are built once and reused:
+
+1. A per worker dict keeps ballots for the lifetime of the process.
+2. The shared django cache keeps ballots for all workers so that only the first worker hits the database.
+
+Every key contains a ballot version for the election which is bumped whenever a post or candidate is saved or
+deleted (see post/signals.py), so a stale ballot is never served. When shared cache can not be read the version is
+None, ballots are then built from database on every call and neither kept in the worker nor in shared cache.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import bump_version, get_version
+from core.core import PostTypes
+from core.metrics import record_cache_lookup
+from post.models import Candidate, Post
+
+from .validation import BallotValidator
+
+BALLOT_VERSION_KEY = 'ballot_version_{election_id}'
+BALLOT_KEY = 'ballot_{election_id}_{post_types}_{version}'
+BALLOT_HTML_KEY = 'ballot_html_{election_id}_{post_types}_{version}_{display_manifesto:d}'
+
+# Post types of every kind of voter, see VoterElectionMixin._get_post_types
+VOTER_POST_TYPES = (
+    (PostTypes.ALL,),
+    (PostTypes.ALL, PostTypes.UG),
+    (PostTypes.ALL, PostTypes.PG),
+    (PostTypes.ALL, PostTypes.UG, PostTypes.PG),
+)
+
+# Old versions of a ballot are never read again, let them expire from shared cache
+BALLOT_CACHE_TIMEOUT = 24 * 60 * 60
+
+BallotCandidate = namedtuple('BallotCandidate', [
+    'id', 'name', 'image_url', 'manifesto_url', 'is_nota', 'is_neutral', 'auto_generated',
+])
+
+BallotPost = namedtuple('BallotPost', [
+    'id', 'name', 'number', 'type', 'human_candidates', 'auto_candidates',
+])
+
+
+class Ballot(object):
+    """
+    Read-only sequence of BallotPost with a lazily built validator and rendered HTML fragments
+    """
+
+    def __init__(self, posts, election_id=None, post_types=(), version=None):
+        self.posts = posts
+        self.election_id = election_id
+        self.post_types = post_types
+        self.version = version
+        self._validator = None
+        self._fragments = {}
+
+    def __iter__(self):
+        return iter(self.posts)
+
+    def __len__(self):
+        return len(self.posts)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_validator'] = None
+        state['_fragments'] = {}
+        return state
+
+    @property
+    def validator(self) -> BallotValidator:
+        if self._validator is None:
+            self._validator = BallotValidator(self.posts)
+        return self._validator
+
+
+EMPTY_BALLOT = Ballot(())
+
+_local_ballots = {}
+
+
+def get_ballot_version(election_id):
+    return get_version(BALLOT_VERSION_KEY.format(election_id=election_id))
+
+
+def bump_ballot_version(election_id):
+    bump_version(BALLOT_VERSION_KEY.format(election_id=election_id))
+
+
+def _ballot_key(election_id, post_types, version):
+    return BALLOT_KEY.format(election_id=election_id, post_types='_'.join(map(str, post_types)), version=version)
+
+
+def _ballot_html_key(ballot, display_manifesto):
+    return BALLOT_HTML_KEY.format(election_id=ballot.election_id, post_types='_'.join(map(str, ballot.post_types)),
+                                  version=ballot.version, display_manifesto=display_manifesto)
+
+
+def get_ballot_cache_keys(ballot, election):
+    """
+    Shared cache keys of a ballot returned by get_ballot and of its HTML fragment
+    """
+    return [_ballot_key(ballot.election_id, ballot.post_types, ballot.version),
+            _ballot_html_key(ballot, election.display_manifesto)]
+
+
+def get_base_post_qs(post_types):
+    return Post.objects.all().filter(
+        type__in=post_types
+    ).order_by('order').prefetch_related(
+        Prefetch('candidates', queryset=Candidate.objects.filter(auto_generated=True).order_by('order'),
+                 to_attr='auto_candidates'),
+        Prefetch('candidates', queryset=Candidate.objects.exclude(auto_generated=True).order_by('order'),
+                 to_attr='human_candidates'),
+    )
+
+
+def _to_ballot_candidate(candidate: Candidate) -> BallotCandidate:
+    return BallotCandidate(
+        id=candidate.id,
+        name=candidate.name,
+        image_url=candidate.image.url if candidate.image else None,
+        manifesto_url=candidate.manifesto.url if candidate.manifesto else None,
+        is_nota=candidate.is_nota,
+        is_neutral=candidate.is_neutral,
+        auto_generated=candidate.auto_generated,
+    )
+
+
+def build_ballot(election_id, post_types):
+    """
+    Build ballot from database.
+
+    Args:
+        election_id: Election for which ballot is required
+        post_types: Post types visible to voter
+
+    Returns:
+        Ballot
+    """
+    posts = get_base_post_qs(post_types).filter(election_id=election_id)
+    return Ballot(post_types=post_types, election_id=election_id, posts=tuple(
+        BallotPost(
+            id=post.id,
+            name=post.name,
+            number=post.number,
+            type=post.type,
+            human_candidates=tuple(_to_ballot_candidate(candidate) for candidate in post.human_candidates),
+            auto_candidates=tuple(_to_ballot_candidate(candidate) for candidate in post.auto_candidates),
+        ) for post in posts
+    ))
+
+
+def get_ballot(election_id, post_types):
+    """
+    Get ballot of an election for given post types from cache, building it if required.
+
+    Args:
+        election_id: Election for which ballot is required
+        post_types: Post types visible to voter
+
+    Returns:
+        Ballot. It is shared between requests and must not be modified.
+    """
+    post_types = tuple(sorted(set(post_types)))
+    version = get_ballot_version(election_id)
+    if version is None:
+        return build_ballot(election_id, post_types)
+
+    local_key = (election_id, post_types)
+
+    local_ballot = _local_ballots.get(local_key)
+    if local_ballot and local_ballot[0] == version:
+        return local_ballot[1]
+
+    key = _ballot_key(election_id, post_types, version)
+    ballot = cache.get(key)
+    record_cache_lookup(ballot is not None)
+    if ballot is None:
+        ballot = build_ballot(election_id, post_types)
+        ballot.version = version
+        cache.set(key, ballot, timeout=BALLOT_CACHE_TIMEOUT)
+
+    _local_ballots[local_key] = (version, ballot)
+    return ballot
+
+
+def render_ballot(ballot: Ballot, election):
+    """
+    Get HTML fragment of ballot, rendering it once per worker and ballot version.
+
+    Args:
+        ballot: Ballot returned by get_ballot
+        election: Election of ballot
+
+    Returns:
+        Safe HTML of posts and candidates. It contains nothing specific to a request or voter.
+    """
+    key = _ballot_html_key(ballot, election.display_manifesto)
+    html = ballot._fragments.get(key)
+    if html is None:
+        # Ballot built without a version is only kept by the ballot itself, see get_ballot
+        html = cache.get(key) if ballot.version is not None else None
+        record_cache_lookup(html is not None)
+        if html is None:
+            html = render_to_string('elections/ballot.html', {'election': election, 'ballot': ballot})
+            if ballot.version is not None:
+                cache.set(key, str(html), timeout=BALLOT_CACHE_TIMEOUT)
+        html = mark_safe(html)
+        ballot._fragments[key] = html
+    return html
+
+
+def load_ballots(election):
+    """
+    Get and render ballots of an election for every kind of voter, so that they are in shared cache and in this
+    worker
+
+    Returns:
+        list of Ballot in order of VOTER_POST_TYPES
+    """
+    ballots = []
+    for post_types in VOTER_POST_TYPES:
+        ballot = get_ballot(election.id, post_types)
+        render_ballot(ballot, election)
+        ballots.append(ballot)
+    return ballots
@@ -0,0 +1,314 @@
+"""
+This module contains benchmarks of hot spots of voting and election admin, run by `manage.py bench`.
+
+Every benchmark runs on deterministic synthetic data (see election/synthetic.py) of a size from SIZES, in a throwaway
+test database. Result of a benchmark is the best and median time of its repeats and median time per operation, and
+results are compared with a stored baseline of same size: a benchmark regresses when its time per operation grows by
+more than a threshold.
+"""
+import csv
+import gc
+import json
+import os
+import random
+import statistics
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from core.core import PostTypes
+from vote.models import VoteSession
+from vote.recorder import JournalBallot, record_ballots
+from vote.results import build_results
+
+from .ballot import get_ballot
+from .import_jobs import get_import_file_path, run_import_job
+from .models import Election, Voter, VoterImportJob
+from .serializers import AddVoteSerializer
+from .synthetic import (
+    build_random_votes, create_synthetic_election, create_synthetic_voters, synthetic_roll_number,
+)
+from .views.election import commit_ballot
+
+BenchSize = namedtuple('BenchSize', [
+    'posts',       # Posts of election
+    'candidates',  # Normal candidates per post
+    'voters',      # Voters of election, also rows of imported list
+    'ballots',     # Ballots recorded in finished election
+    'commits',     # Ballots committed per repeat
+    'requests',    # Ballots parsed and validated per repeat
+])
+
+SIZES = OrderedDict([
+    ('small', BenchSize(posts=5, candidates=3, voters=2000, ballots=1000, commits=100, requests=1000)),
+    ('medium', BenchSize(posts=20, candidates=5, voters=10000, ballots=5000, commits=300, requests=2000)),
+    ('large', BenchSize(posts=50, candidates=8, voters=50000, ballots=20000, commits=1000, requests=5000)),
+])
+
+# Seed of synthetic votes
+SEED = 2016
+
+# Distinct ballots cast by synthetic voters
+DISTINCT_BALLOTS = 100
+
+CLIENT_IP = '10.0.0.1'
+
+
+class BenchData(object):
+    """
+    Synthetic elections shared by benchmarks:
+
+    1. An active election with voters, which is voted in
+    2. A finished election with voters who have all voted, for results and exports of ballots
+    """
+
+    def __init__(self, size: BenchSize):
+        self.size = size
+        self.creator = User.objects.create_user('bench_creator')
+        rng = random.Random(SEED)
+
+        self.election = create_synthetic_election(self.creator, 'Bench Election', size.posts, size.candidates,
+                                                  is_active=True)
+        create_synthetic_voters(self.election, size.voters)
+        self.ballot = get_ballot(self.election.id, [PostTypes.ALL])
+        self.votes = [build_random_votes(self.ballot, rng) for _ in range(DISTINCT_BALLOTS)]
+
+        self.finished_election = create_synthetic_election(self.creator, 'Finished Bench Election', size.posts,
+                                                           size.candidates)
+        create_synthetic_voters(self.finished_election, size.ballots)
+        Voter.objects.filter(election=self.finished_election).update(voted=True, voted_at=timezone.now())
+        ballot = get_ballot(self.finished_election.id, [PostTypes.ALL])
+        finished_votes = [build_random_votes(ballot, rng) for _ in range(DISTINCT_BALLOTS)]
+        timestamp = timezone.now()
+        batch_size = settings.VOTE_JOURNAL_BATCH_SIZE
+        for start in range(0, size.ballots, batch_size):
+            with transaction.atomic():
+                record_ballots([
+                    JournalBallot('bench-%d' % index, self.finished_election.id,
+                                  finished_votes[index % DISTINCT_BALLOTS], timestamp)
+                    for index in range(start, min(start + batch_size, size.ballots))
+                ])
+        self.finished_election.is_finished = True
+        self.finished_election.save()
+
+    def iterate_votes(self, count):
+        for index in range(count):
+            yield self.votes[index % len(self.votes)]
+
+
+class Benchmark(object):
+    """
+    setup is called once and before is called before every repeat. Only run is timed, it returns number of
+    operations.
+    """
+    name = None
+    description = None
+
+    def __init__(self, data: BenchData):
+        self.data = data
+
+    def setup(self):
+        pass
+
+    def before(self):
+        pass
+
+    def run(self) -> int:
+        raise NotImplementedError
+
+
+class SerializerBenchmark(Benchmark):
+    name = 'vote_serializer'
+    description = 'AddVoteSerializer parsing and validation of request bodies'
+
+    def setup(self):
+        self.bodies = [urlencode({'votes': json.dumps(votes), 'key': 'ABCDEF'}).encode()
+                       for votes in self.data.iterate_votes(self.data.size.requests)]
+
+    def run(self):
+        for body in self.bodies:
+            if not AddVoteSerializer(data=body).is_valid():
+                raise AssertionError('Synthetic ballot is invalid')
+        return len(self.bodies)
+
+
+class ValidationBenchmark(Benchmark):
+    name = 'ballot_validation'
+    description = 'Ballot validation of ElectionView.post'
+
+    def setup(self):
+        self.votes = list(self.data.iterate_votes(self.data.size.requests))
+
+    def run(self):
+        validator = self.data.ballot.validator
+        for votes in self.votes:
+            if validator.validate(votes):
+                raise AssertionError('Synthetic ballot is invalid')
+        return len(self.votes)
+
+
+class CommitBenchmark(Benchmark):
+    name = 'commit_ballot'
+    description = 'Transaction of ElectionView.post which marks voter and records ballot'
+
+    def before(self):
+        voters = Voter.objects.filter(election=self.data.election)
+        count = self.data.size.commits
+        if voters.filter(voted=False).count() < count:
+            voters.update(voted=False, voted_at=None)
+        self.voter_ids = list(voters.filter(voted=False).order_by('pk').values_list('pk', flat=True)[:count])
+
+    def run(self):
+        for voter_id, votes in zip(self.voter_ids, self.data.iterate_votes(len(self.voter_ids))):
+            claimed, _ = commit_ballot(self.data.election, voter_id, votes, CLIENT_IP)
+            if not claimed:
+                raise AssertionError('Voter %d has voted' % voter_id)
+        return len(self.voter_ids)
+
+
+class ResultsBenchmark(Benchmark):
+    name = 'election_results'
+    description = 'Results aggregate of ElectionResultView'
+
+    def run(self):
+        build_results(self.data.finished_election)
+        return 1
+
+
+class ImportBenchmark(Benchmark):
+    name = 'voter_import'
+    description = 'Voter import job of AddVotersView, voters are imported into a new election'
+
+    def setup(self):
+        os.makedirs(settings.VOTER_IMPORT_DIR, exist_ok=True)
+        self.roll_numbers = [synthetic_roll_number(index) for index in range(self.data.size.voters)]
+        self.repeat = 0
+
+    def before(self):
+        self.repeat += 1
+        election = Election.objects.create(name='Import Bench %d' % self.repeat, creator=self.data.creator)
+        self.job = VoterImportJob.objects.create(election=election, created_by=self.data.creator,
+                                                 file_name='bench_%d.csv' % self.repeat, skip_one_row=True)
+        with open(get_import_file_path(self.job.file_name), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Roll Number'])
+            writer.writerows([roll_number] for roll_number in self.roll_numbers)
+
+    def run(self):
+        run_import_job(self.job.id)
+        if VoterImportJob.objects.get(pk=self.job.id).status != VoterImportJob.DONE:
+            raise AssertionError('Import job failed')
+        return len(self.roll_numbers)
+
+
+class ExportBenchmark(Benchmark):
+    """
+    Streams CSV of an admin action
+    """
+    model = None
+    action = None
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def run(self):
+        model_admin = admin.site._registry[self.model]
+        response = getattr(model_admin, self.action)(None, self.get_queryset())
+        rows = 0
+        for _ in response.streaming_content:
+            rows += 1
+        # Header is not a row
+        return rows - 1
+
+
+class ElectionVotersExportBenchmark(ExportBenchmark):
+    name = 'export_election_voters'
+    description = 'Download voters data action of elections'
+    model = Election
+    action = 'download_voters_action'
+
+    def get_queryset(self):
+        return Election.objects.filter(pk=self.data.election.pk)
+
+
+class VotersExportBenchmark(ExportBenchmark):
+    name = 'export_voters'
+    description = 'Download voters data action of voters'
+    model = Voter
+    action = 'download_voters_action'
+
+    def get_queryset(self):
+        return Voter.objects.filter(election=self.data.election)
+
+
+class VoteSessionsExportBenchmark(ExportBenchmark):
+    name = 'export_vote_sessions'
+    description = 'Download voting data action of vote sessions'
+    model = VoteSession
+    action = 'download_data'
+
+    def get_queryset(self):
+        return VoteSession.objects.filter(election=self.data.finished_election)
+
+
+BENCHMARKS = [
+    SerializerBenchmark,
+    ValidationBenchmark,
+    CommitBenchmark,
+    ResultsBenchmark,
+    ImportBenchmark,
+    ElectionVotersExportBenchmark,
+    VotersExportBenchmark,
+    VoteSessionsExportBenchmark,
+]
+
+
+def run_benchmark(benchmark: Benchmark, repeat):
+    """
+    Returns:
+        dict of operations, best_s, median_s and per_op_us (median time per operation in microseconds)
+    """
+    benchmark.setup()
+    times = []
+    for _ in range(repeat):
+        benchmark.before()
+        gc.collect()
+        started_at = time.perf_counter()
+        operations = benchmark.run()
+        times.append(time.perf_counter() - started_at)
+
+    median = statistics.median(times)
+    return {
+        'operations': operations,
+        'best_s': min(times),
+        'median_s': median,
+        'per_op_us': median / operations * 1e6,
+    }
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Compare time per operation of benchmarks with baseline
+
+    Args:
+        results: dict of benchmark name to result of run_benchmark
+        baseline: Same for baseline
+        threshold: Allowed growth of time per operation, in percent
+
+    Returns:
+        OrderedDict of benchmark name to (change in percent or None if benchmark is not in baseline, regressed)
+    """
+    changes = OrderedDict()
+    for name, result in results.items():
+        if name not in baseline:
+            changes[name] = (None, False)
+            continue
+        change = (result['per_op_us'] / baseline[name]['per_op_us'] - 1) * 100
+        changes[name] = (change, change > threshold)
+    return changes
@@ -0,0 +1,136 @@
+"""
+This module contains the voter eligibility cache used by the voting views.
+
+1. Ids of open elections (active, not temporarily closed and not finished) are kept in shared django cache.
+2. Roll keys of voters of an election are kept in shared django cache and in a per worker dict.
+
+A voter whose roll key is in no open election has nothing to vote for, so voting views answer without database.
+Elections found here are still loaded from database along with voter rows (see VoterElectionMixin), cache only ever
+saves queries.
+
+When shared cache can not be read (memcached is down, DummyCache), versions are None. An entry keyed by no version would
+never be invalidated, so nothing is cached then and get_eligible_election_ids returns None to make voting views look
+voter up in database.
+
+Keys contain versions (see core/cache.py). Version of open elections is bumped whenever an election is saved or
+deleted, version of an election's roll keys whenever its voters are added, changed or deleted (see election/signals.py
+and election/importer.py). Both are bumped again once transaction commits, so that an entry built from database before
+commit is never used.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.cache import bump_version, get_version
+from core.metrics import record_cache_lookup
+
+from .models import Election, Voter
+
+OPEN_ELECTIONS_VERSION_KEY = 'open_elections_version'
+OPEN_ELECTIONS_KEY = 'open_elections_{version}'
+ELIGIBILITY_VERSION_KEY = 'eligibility_version_{election_id}'
+ELIGIBILITY_KEY = 'eligibility_{election_id}_{version}'
+
+# Old versions are never read again, let them expire from shared cache
+ELIGIBILITY_CACHE_TIMEOUT = 24 * 60 * 60
+
+_local_roll_keys = {}
+
+
+def _bump_now_and_on_commit(key):
+    bump_version(key)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_version(key))
+
+
+def invalidate_open_elections():
+    _bump_now_and_on_commit(OPEN_ELECTIONS_VERSION_KEY)
+
+
+def invalidate_eligibility(election_id):
+    _bump_now_and_on_commit(ELIGIBILITY_VERSION_KEY.format(election_id=election_id))
+
+
+def get_open_elections_key():
+    return OPEN_ELECTIONS_KEY.format(version=get_version(OPEN_ELECTIONS_VERSION_KEY))
+
+
+def get_eligibility_key(election_id):
+    version = get_version(ELIGIBILITY_VERSION_KEY.format(election_id=election_id))
+    return ELIGIBILITY_KEY.format(election_id=election_id, version=version)
+
+
+def _query_open_election_ids():
+    return tuple(Election.objects.filter(
+        is_active=True, is_temporary_closed=False, is_finished=False,
+    ).order_by('id').values_list('id', flat=True))
+
+
+def _query_roll_keys(election_id):
+    return frozenset(Voter.objects.filter(election_id=election_id).values_list('roll_key', flat=True))
+
+
+def _get_open_election_ids(version):
+    key = OPEN_ELECTIONS_KEY.format(version=version)
+    election_ids = cache.get(key)
+    record_cache_lookup(election_ids is not None)
+    if election_ids is None:
+        election_ids = _query_open_election_ids()
+        cache.set(key, election_ids, timeout=ELIGIBILITY_CACHE_TIMEOUT)
+    return election_ids
+
+
+def _get_eligible_roll_keys(election_id, version):
+    key = ELIGIBILITY_KEY.format(election_id=election_id, version=version)
+    local = _local_roll_keys.get(election_id)
+    if local and local[0] == key:
+        return local[1]
+
+    roll_keys = cache.get(key)
+    record_cache_lookup(roll_keys is not None)
+    if roll_keys is None:
+        roll_keys = _query_roll_keys(election_id)
+        cache.set(key, roll_keys, timeout=ELIGIBILITY_CACHE_TIMEOUT)
+
+    _local_roll_keys[election_id] = (key, roll_keys)
+    return roll_keys
+
+
+def get_open_election_ids():
+    """
+    Returns:
+        tuple of ids of open elections in order
+    """
+    version = get_version(OPEN_ELECTIONS_VERSION_KEY)
+    if version is None:
+        return _query_open_election_ids()
+    return _get_open_election_ids(version)
+
+
+def get_eligible_roll_keys(election_id):
+    """
+    Returns:
+        frozenset of roll keys (see core.core.normalize_roll_number) of all voters of an election, voted or not. It
+        is shared between requests.
+    """
+    version = get_version(ELIGIBILITY_VERSION_KEY.format(election_id=election_id))
+    if version is None:
+        return _query_roll_keys(election_id)
+    return _get_eligible_roll_keys(election_id, version)
+
+
+def get_eligible_election_ids(roll_key):
+    """
+    Ids of open elections which have a voter with given roll key, None if shared cache can not be read
+    """
+    version = get_version(OPEN_ELECTIONS_VERSION_KEY)
+    if version is None:
+        return None
+
+    election_ids = []
+    for election_id in _get_open_election_ids(version):
+        roll_keys_version = get_version(ELIGIBILITY_VERSION_KEY.format(election_id=election_id))
+        if roll_keys_version is None:
+            return None
+        if roll_key in _get_eligible_roll_keys(election_id, roll_keys_version):
+            election_ids.append(election_id)
+    return election_ids
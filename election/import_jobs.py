@@ -0,0 +1,174 @@
+"""
+This module runs voters list imports (VoterImportJob) in a dedicated import worker (`manage.py run_import_jobs`), so
+a large list never holds a web worker for the length of its import and a recycled web worker never orphans a job.
+
+An uploaded list is saved in settings.VOTER_IMPORT_DIR and its job is committed as pending. Import worker claims
+pending jobs one by one. A job
+1. Reads and validates whole file row by row. If any row is invalid and skip_errors is not set, nothing is imported.
+2. Adds voters in batches of settings.VOTER_IMPORT_BATCH_SIZE roll numbers, each in its own transaction. Progress of
+   job and its heartbeat are updated in the same transaction, so it always matches the committed voters.
+
+A running job whose heartbeat is older than settings.VOTER_IMPORT_STALE_AFTER lost its worker (killed or out of
+memory) and is marked failed by import worker. Batches committed before are kept, list can be uploaded again. Progress
+and completion of a job are saved only while it is running, so a job which was only slow (not lost) stops at its next
+batch, rolling that batch back, and stays failed.
+
+Admin page polls VoterImportJobView for progress, rows per second and per-line errors.
+"""
+import csv
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .importer import VoterImportResult, add_voters, dedupe_roll_numbers, get_roll_numbers, parse_roll_numbers
+from .models import VoterImportJob
+
+# Election logger needs request details, failures of jobs go to application log
+logger = logging.getLogger('import_jobs')
+
+# Errors stored in a job for display, error_count has the total
+MAX_REPORTED_ERRORS = 100
+
+
+def get_import_file_path(file_name):
+    return os.path.join(settings.VOTER_IMPORT_DIR, file_name)
+
+
+def save_import_file(uploaded_file, file_name):
+    os.makedirs(settings.VOTER_IMPORT_DIR, exist_ok=True)
+    with open(get_import_file_path(file_name), 'wb') as file:
+        for chunk in uploaded_file.chunks():
+            file.write(chunk)
+
+
+def submit_import_job(job_id):
+    """
+    Run a committed job right away if settings.VOTER_IMPORT_IN_REQUEST is set, else leave it pending for import
+    worker
+    """
+    if settings.VOTER_IMPORT_IN_REQUEST:
+        run_import_job(job_id)
+
+
+def claim_import_job():
+    """
+    Mark oldest pending job as running. Out of concurrent import workers only one can claim a job.
+
+    Returns:
+        Id of claimed job, None if no job is pending
+    """
+    pending = VoterImportJob.objects.filter(status=VoterImportJob.PENDING).order_by('created_at', 'pk')
+    for job_id in pending.values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        claimed = VoterImportJob.objects.filter(pk=job_id, status=VoterImportJob.PENDING).update(
+            status=VoterImportJob.RUNNING, started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def fail_stale_import_jobs():
+    """
+    Mark running jobs whose worker stopped reporting progress as failed
+
+    Returns:
+        Number of jobs marked failed
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.VOTER_IMPORT_STALE_AFTER)
+    failed = 0
+    for job in VoterImportJob.objects.filter(status=VoterImportJob.RUNNING, heartbeat_at__lt=stale_before):
+        # Heartbeat is matched, so a job which reported progress meanwhile keeps running
+        marked = VoterImportJob.objects.filter(pk=job.pk, status=VoterImportJob.RUNNING,
+                                               heartbeat_at=job.heartbeat_at).update(
+            status=VoterImportJob.FAILED,
+            message='Import worker stopped after %d rows. Upload the list again to add the rest.' % job.processed_rows,
+            finished_at=timezone.now(),
+        )
+        if marked:
+            logger.error('Voter import job %d lost its worker', job.pk)
+            _remove_import_file(job.file_name)
+            failed += 1
+    return failed
+
+
+def _remove_import_file(file_name):
+    try:
+        os.remove(get_import_file_path(file_name))
+    except OSError:
+        pass
+
+
+def run_import_job(job_id):
+    job = VoterImportJob.objects.select_related('election').get(pk=job_id)
+    try:
+        _run_import_job(job)
+    except Exception:
+        logger.exception('Voter import job %d failed', job_id)
+        VoterImportJob.objects.filter(pk=job_id).update(
+            status=VoterImportJob.FAILED,
+            message='Import failed due to an unexpected error',
+            finished_at=timezone.now(),
+        )
+    finally:
+        _remove_import_file(job.file_name)
+
+
+def _run_import_job(job):
+    job.status = VoterImportJob.RUNNING
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+
+    result = VoterImportResult()
+    errors = []
+
+    with result.timed('parse'):
+        with open(get_import_file_path(job.file_name), encoding='utf-8', errors='ignore', newline='') as file:
+            roll_numbers = [
+                roll_number for _, roll_number in
+                parse_roll_numbers(csv.reader(file, delimiter=','), job.roll_column, job.skip_one_row, errors=errors)
+            ]
+        roll_numbers = dedupe_roll_numbers(roll_numbers)
+
+    job.total_rows = len(roll_numbers)
+    job.error_count = len(errors)
+    job.errors = json.dumps(errors[:MAX_REPORTED_ERRORS])
+
+    if errors and not job.skip_errors:
+        job.status = VoterImportJob.FAILED
+        job.message = '%d invalid rows found. No voter added.' % len(errors)
+        job.finished_at = timezone.now()
+        job.save()
+        return
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['total_rows', 'error_count', 'errors', 'heartbeat_at'])
+
+    tags = list(job.tags.all())
+    with result.timed('existing'):
+        existing_roll_numbers = get_roll_numbers(job.election)
+    batch_size = settings.VOTER_IMPORT_BATCH_SIZE
+    for start in range(0, len(roll_numbers), batch_size):
+        with transaction.atomic():
+            add_voters(job.election, roll_numbers[start:start + batch_size], tags, result, existing_roll_numbers)
+            running = VoterImportJob.objects.filter(pk=job.pk, status=VoterImportJob.RUNNING).update(
+                processed_rows=result.roll_numbers,
+                new_voters=result.new_voters,
+                heartbeat_at=timezone.now(),
+            )
+            if not running:
+                # Job was marked failed meanwhile, voters must match its progress
+                transaction.set_rollback(True)
+        if not running:
+            logger.warning('Voter import job %d was stopped after %d rows', job.pk, start)
+            return
+
+    VoterImportJob.objects.filter(pk=job.pk, status=VoterImportJob.RUNNING).update(
+        status=VoterImportJob.DONE,
+        message='Imported in %.2fs (%s)' % (result.total_time, result.format_timings()),
+        finished_at=timezone.now(),
+    )
@@ -0,0 +1,208 @@
+"""
+This module imports voters lists (CSV) into an election with a fixed number of queries, whatever the size of list.
+
+Import runs in phases
+1. parse: Roll number of every row is read and validated with IITB_ROLL_REGEX
+2. dedupe: Repeated roll numbers are dropped in memory
+3. existing: Roll numbers already added to election are fetched in one query
+4. voters: Voter types of new voters are read from profiles and new voters are inserted with multi-row INSERTs
+5. tags: Ids of listed voters and their voter-tag rows are fetched, missing rows are inserted with multi-row INSERTs
+
+An import job adds a list in batches. Existing roll numbers are fetched once per job, and every other query of a batch
+is limited to roll numbers of the batch, so a batch costs the same whatever the size of election.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from account.models import UserProfile
+from core.core import IITB_ROLL_REGEX, normalize_roll_number
+from core.db import bulk_insert_values, in_batches
+
+from .eligibility import invalidate_eligibility
+from .models import Voter, generate_random_voter_keys
+
+VOTER_FIELDS = ['roll_no', 'roll_key', 'created_at', 'election', 'key', 'voted', 'voter_type']
+
+
+class VoterImportError(ValueError):
+    """
+    Invalid row found in voters list. Nothing is imported.
+    """
+
+
+class VoterImportResult(object):
+
+    def __init__(self):
+        self.roll_numbers = 0
+        self.new_voters = 0
+        self.tagged_voters = 0
+        self.timings = OrderedDict()
+
+    @contextmanager
+    def timed(self, phase):
+        started_at = time.perf_counter()
+        yield
+        self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - started_at
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def format_timings(self):
+        return ', '.join('%s %.2fs' % (phase, seconds) for phase, seconds in self.timings.items())
+
+
+def parse_roll_numbers(rows, roll_column, skip_one_row=False, skip_errors=False, errors=None):
+    """
+    Yield (line number, roll number) for rows of voters list
+
+    Args:
+        errors: If given, (line number, error) of every invalid row is appended to it and row is skipped
+
+    Raises:
+        VoterImportError: A row has no roll number column or an invalid roll number, unless skip_errors is set or
+            errors is given
+    """
+    for index, row in enumerate(rows, 1):
+        if skip_one_row and index == 1:  # First Row
+            continue
+
+        try:
+            roll_number = row[roll_column].strip()  # type: str
+        except IndexError:
+            error = 'Invalid line found in data at line number %d : %s' % (index, ','.join(row))
+        else:
+            if IITB_ROLL_REGEX.match(roll_number):
+                yield index, roll_number.upper()
+                continue
+            error = 'Roll number %s in line %d is not a valid roll number' % (roll_number, index)
+
+        if errors is not None:
+            errors.append((index, error))
+        elif not skip_errors:
+            raise VoterImportError(error)
+
+
+def dedupe_roll_numbers(roll_numbers):
+    """
+    Roll numbers in order of first occurrence
+    """
+    return list(OrderedDict.fromkeys(roll_numbers))
+
+
+def get_voter_types(roll_keys):
+    """
+    {roll key: voter type} of profiles with given roll keys
+    """
+    voter_types = {}
+    for batch in in_batches(connection, roll_keys):
+        voter_types.update(UserProfile.objects.filter(
+            roll_key__in=batch,
+        ).exclude(voter_type=None).values_list('roll_key', 'voter_type'))
+    return voter_types
+
+
+def get_roll_numbers(election):
+    """
+    Set of roll numbers of voters of election
+    """
+    return set(Voter.objects.filter(election=election).values_list('roll_no', flat=True))
+
+
+def add_voters(election, roll_numbers, tags=(), result=None, existing_roll_numbers=None):
+    """
+    Add voters with given (unique, valid) roll numbers to election and tag all of them, new or existing, with tags.
+    Call it in a transaction.
+
+    Args:
+        existing_roll_numbers: Roll numbers of election (see get_roll_numbers), fetched if not given. New roll numbers
+            are added to it, so one set serves all batches of a list.
+
+    Returns:
+        VoterImportResult
+    """
+    result = result or VoterImportResult()
+    result.roll_numbers += len(roll_numbers)
+
+    if existing_roll_numbers is None:
+        with result.timed('existing'):
+            existing_roll_numbers = get_roll_numbers(election)
+
+    with result.timed('voters'):
+        now = Voter._meta.get_field('created_at').get_db_prep_save(timezone.now(), connection)
+        new_roll_keys = OrderedDict(
+            (roll_number, normalize_roll_number(roll_number))
+            for roll_number in roll_numbers if roll_number not in existing_roll_numbers
+        )
+        voter_types = get_voter_types(new_roll_keys.values())
+        new_voters = [
+            (roll_number, roll_key, now, election.id, key, False, voter_types.get(roll_key))
+            for (roll_number, roll_key), key in zip(new_roll_keys.items(),
+                                                    generate_random_voter_keys(len(new_roll_keys)))
+        ]
+        if new_voters:
+            bulk_insert_values(connection, Voter, VOTER_FIELDS, new_voters)
+            # Raw INSERTs do not send signals
+            invalidate_eligibility(election.id)
+            existing_roll_numbers.update(new_roll_keys)
+        result.new_voters += len(new_voters)
+
+    if tags:
+        with result.timed('tags'):
+            # Primary keys of inserted voters are not returned
+            voter_ids = {}
+            for batch in in_batches(connection, roll_numbers):
+                voter_ids.update(Voter.objects.filter(
+                    election=election, roll_no__in=batch,
+                ).values_list('roll_no', 'id'))
+            through = Voter.tags.through
+            existing = set()
+            for batch in in_batches(connection, voter_ids.values()):
+                existing.update(through.objects.filter(
+                    voter_id__in=batch, tag__in=tags,
+                ).values_list('voter_id', 'tag_id'))
+            tag_rows = [
+                (voter_ids[roll_number], tag.id)
+                for roll_number in roll_numbers for tag in tags
+                if (voter_ids[roll_number], tag.id) not in existing
+            ]
+            bulk_insert_values(connection, through, ['voter', 'tag'], tag_rows)
+            result.tagged_voters += len(roll_numbers)
+
+    return result
+
+
+def import_voters(election, rows, roll_column, skip_one_row=False, skip_errors=False, tags=()):
+    """
+    Import a voters list in one transaction
+
+    Args:
+        election: Election to which voters are added
+        rows: Iterable of CSV rows (lists of str)
+        roll_column: Index of column which contains roll number
+        skip_one_row: Skip first (header) row
+        skip_errors: Skip invalid rows instead of failing import
+        tags: Tags of all voters in list
+
+    Returns:
+        VoterImportResult
+
+    Raises:
+        VoterImportError: Nothing is imported
+    """
+    result = VoterImportResult()
+
+    with result.timed('parse'):
+        parsed = parse_roll_numbers(rows, roll_column, skip_one_row, skip_errors)
+        roll_numbers = [roll_number for _, roll_number in parsed]
+    with result.timed('dedupe'):
+        roll_numbers = dedupe_roll_numbers(roll_numbers)
+
+    with transaction.atomic():
+        add_voters(election, roll_numbers, tags, result)
+
+    return result
@@ -0,0 +1,113 @@
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from election.benchmarks import BENCHMARKS, SIZES, BenchData, compare_results, run_benchmark
+
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Run benchmarks of voting and admin hot spots on synthetic data in a throwaway test database and compare '
+            'them with stored baseline. Fails if a benchmark is slower than baseline by more than --threshold.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(SIZES), default='small')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--only', nargs='+', choices=[benchmark.name for benchmark in BENCHMARKS],
+                            help='Benchmarks to run, all if not given')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Baseline JSON file, BENCH_BASELINE_DIR/<size>.json if not given')
+        parser.add_argument('--save-baseline', action='store_true', help='Store results as baseline')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Allowed growth of time per operation over baseline in percent')
+
+    def handle(self, *args, **options):
+        size = SIZES[options['size']]
+        benchmarks = [benchmark for benchmark in BENCHMARKS
+                      if not options['only'] or benchmark.name in options['only']]
+        baseline_path = options['baseline'] or os.path.join(settings.BENCH_BASELINE_DIR, '%s.json' % options['size'])
+
+        import_dir = tempfile.mkdtemp(prefix='bench_imports_')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Shared cache, vote journal and import files of this deployment are never touched
+            with override_settings(DEBUG=False, CACHES=BENCH_CACHES, VOTE_JOURNAL_DIR=None,
+                                   VOTER_IMPORT_DIR=import_dir):
+                self.stdout.write('Creating %s synthetic data' % options['size'])
+                data = BenchData(size)
+                results = {}
+                for benchmark in benchmarks:
+                    self.stdout.write('Running %s' % benchmark.name)
+                    results[benchmark.name] = run_benchmark(benchmark(data), options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(import_dir, ignore_errors=True)
+
+        report = {
+            'size': options['size'],
+            'parameters': size._asdict(),
+            'repeat': options['repeat'],
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created_at': timezone.now().isoformat(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+
+        baseline = self._load_baseline(baseline_path, report)
+        changes = compare_results(results, baseline['results'] if baseline else {}, options['threshold'])
+
+        self.stdout.write('\n%-24s %8s %10s %12s %12s %9s' % (
+            'Benchmark', 'Ops', 'Median ms', 'us/op', 'Baseline', 'Change'))
+        for benchmark in benchmarks:
+            result = results[benchmark.name]
+            change, regressed = changes[benchmark.name]
+            self.stdout.write('%-24s %8d %10.1f %12.1f %12s %9s%s' % (
+                benchmark.name, result['operations'], result['median_s'] * 1000, result['per_op_us'],
+                '%.1f' % baseline['results'][benchmark.name]['per_op_us'] if change is not None else '-',
+                '%+.1f%%' % change if change is not None else '-',
+                '  REGRESSED' if regressed else '',
+            ))
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+            with open(baseline_path, 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+            self.stdout.write('Baseline saved to %s' % baseline_path)
+
+        regressed = [name for name, (_, regressed) in changes.items() if regressed]
+        if regressed:
+            raise CommandError('%s slower than baseline by more than %g%%' % (
+                ', '.join(regressed), options['threshold']))
+
+    def _load_baseline(self, path, report):
+        if not os.path.exists(path):
+            self.stdout.write('No baseline at %s, store one with --save-baseline' % path)
+            return None
+
+        with open(path) as file:
+            baseline = json.load(file)
+        if baseline['parameters'] != report['parameters']:
+            raise CommandError('Baseline %s was measured on different data, store a new one with --save-baseline' %
+                               path)
+        if baseline['database'] != report['database']:
+            self.stderr.write('Baseline was measured on %s database' % baseline['database'])
+        return baseline
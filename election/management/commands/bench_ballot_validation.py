@@ -0,0 +1,30 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from election.synthetic import build_full_votes, build_synthetic_ballot
+from election.validation import BallotValidator
+
+
+class Command(BaseCommand):
+    help = 'Measure validation cost of ballots with many posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, nargs='+', default=[10, 50, 100])
+        parser.add_argument('--candidates', type=int, default=5, help='Normal candidates per post')
+        parser.add_argument('--number', type=int, default=2, help='Seats per post')
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        for posts in options['posts']:
+            ballot = build_synthetic_ballot(posts, options['candidates'], options['number'])
+            votes = build_full_votes(ballot)
+
+            build_time = timeit.timeit(lambda: BallotValidator(ballot), number=100) / 100
+            validator = BallotValidator(ballot)
+            assert validator.validate(votes) is None
+            validate_time = timeit.timeit(lambda: validator.validate(votes), number=repeat) / repeat
+
+            self.stdout.write('posts=%d votes=%d index build=%.1fus validate=%.1fus' % (
+                posts, len(votes), build_time * 1e6, validate_time * 1e6))
@@ -0,0 +1,153 @@
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from account.fake_ldap import directory
+from election.models import Voter
+from election.synthetic import create_synthetic_election, create_synthetic_voters
+from post.models import Post
+
+STEPS = ['login', 'election_get', 'vote_post']
+
+# Status code of every step when it succeeds
+EXPECTED_STATUS = {
+    'login': 302,
+    'election_get': 200,
+    'vote_post': 302,
+}
+
+PASSWORD = 'password'
+
+LOADTEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'loadtest',
+    },
+}
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = ('Create synthetic voters in a throwaway test database and drive login -> election page -> vote '
+            'through django test client at given concurrency. Reports throughput, latency percentiles and queries '
+            'per request of every step. LDAP is replaced by account.fake_ldap.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=10)
+        parser.add_argument('--candidates', type=int, default=4, help='Normal candidates per post')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        if concurrency > 1 and not connection.features.test_db_allows_multiple_connections:
+            self.stderr.write('Test database of %s does not allow multiple connections, using concurrency 1' %
+                              connection.vendor)
+            concurrency = 1
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Shared cache and vote journal of this deployment are never touched
+            with override_settings(AUTHENTICATION_BACKENDS=['account.fake_ldap.FakeLDAPBackend'],
+                                   CACHES=LOADTEST_CACHES, VOTE_JOURNAL_DIR=None):
+                voters = self._setup(options)
+                results, elapsed = self._run(voters, concurrency)
+        finally:
+            directory.clear()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results, elapsed, len(voters), concurrency)
+
+    def _setup(self, options):
+        creator = User.objects.create_user('loadtest_creator')
+        election = create_synthetic_election(creator, 'Load Test Election', options['posts'], options['candidates'],
+                                             is_active=True)
+        roll_numbers = create_synthetic_voters(election, options['voters'])
+        keys = dict(Voter.objects.filter(election=election).values_list('roll_no', 'key'))
+
+        # Every voter votes YES for first candidate of every post
+        votes = {}
+        for post in Post.objects.filter(election=election).prefetch_related('candidates'):
+            candidate = [candidate for candidate in post.candidates.all() if not candidate.auto_generated][0]
+            votes[str(candidate.id)] = 1
+        votes = json.dumps(votes)
+
+        voters = []
+        for index, roll_number in enumerate(roll_numbers):
+            username = 'loadtest%d' % index
+            directory.add_user(username, PASSWORD, roll_number)
+            voters.append((username, urlencode({'votes': votes, 'key': keys[roll_number]})))
+        return voters
+
+    def _request(self, results, step, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = method(*args, **kwargs)
+            latency = time.perf_counter() - start
+        results.append((step, latency, len(queries), response.status_code == EXPECTED_STATUS[step]))
+
+    def _vote(self, username, body, results):
+        client = Client()
+        self._request(results, 'login', client.post, reverse('account:login'),
+                      {'username': username, 'password': PASSWORD})
+        self._request(results, 'election_get', client.get, reverse('election:index'))
+        self._request(results, 'vote_post', client.post, reverse('election:index'), body,
+                      content_type='application/x-www-form-urlencoded')
+
+    def _worker(self, voters, results):
+        try:
+            while True:
+                try:
+                    username, body = voters.get_nowait()
+                except queue.Empty:
+                    return
+                self._vote(username, body, results)
+        finally:
+            connection.close()
+
+    def _run(self, voters, concurrency):
+        voter_queue = queue.Queue()
+        for voter in voters:
+            voter_queue.put(voter)
+
+        results = []
+        threads = [threading.Thread(target=self._worker, args=(voter_queue, results)) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+    def _report(self, results, elapsed, voters, concurrency):
+        self.stdout.write('%d voters, concurrency %d, %.2fs, %.1f voters/s' % (
+            voters, concurrency, elapsed, voters / elapsed))
+        self.stdout.write('%-14s %8s %7s %8s %8s %8s %8s %8s' % (
+            'step', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+
+        for step in STEPS:
+            step_results = [result for result in results if result[0] == step]
+            if not step_results:
+                continue
+            latencies = sorted(result[1] for result in step_results)
+            errors = sum(1 for result in step_results if not result[3])
+            queries = sum(result[2] for result in step_results) / len(step_results)
+            self.stdout.write('%-14s %8d %7d %8.1f %8.1f %8.1f %8.1f %8.1f' % (
+                step, len(step_results), errors, len(step_results) / elapsed,
+                percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000, queries))
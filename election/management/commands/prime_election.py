@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from election.models import Election
+from election.priming import prime_election
+
+
+class Command(BaseCommand):
+    help = ('Load open elections, voter eligibility, ballots and ballot fragments of an election into shared cache '
+            'before voting starts. Run it again after editing the election.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_id', type=int)
+        parser.add_argument('--verbose-keys', action='store_true', help='List every key with its size')
+
+    def handle(self, *args, **options):
+        election = Election.objects.filter(pk=options['election_id']).first()
+        if election is None:
+            raise CommandError('Election %d does not exist' % options['election_id'])
+        if election.is_finished:
+            raise CommandError('%s is finished' % election)
+
+        entries = prime_election(election)
+
+        groups = OrderedDict()
+        for entry in entries:
+            group = groups.setdefault(entry.group, [0, 0])
+            group[0] += 1
+            group[1] += entry.size or 0
+            if options['verbose_keys']:
+                self.stdout.write('%-64s %10s' % (entry.key, entry.size if entry.size is not None else 'missing'))
+
+        self.stdout.write('%-20s %6s %12s' % ('Group', 'Keys', 'Bytes'))
+        for name, (keys, size) in groups.items():
+            self.stdout.write('%-20s %6d %12d' % (name, keys, size))
+        self.stdout.write('%-20s %6d %12d' % ('total', len(entries), sum(entry.size or 0 for entry in entries)))
+
+        missing = [entry.key for entry in entries if entry.size is None]
+        if missing:
+            raise CommandError('Shared cache did not keep %s (value too large or cache full?)' % ', '.join(missing))
+        if not election.is_active or election.is_temporary_closed:
+            self.stdout.write('%s is not open, ids of open elections are loaded again when it opens' % election)
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from election.import_jobs import claim_import_job, fail_stale_import_jobs, run_import_job
+
+
+class Command(BaseCommand):
+    help = 'Run pending voter import jobs one by one. Also marks jobs whose worker stopped as failed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running jobs till interrupted')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            failed = fail_stale_import_jobs()
+            if failed:
+                self.stderr.write('%d stale jobs marked failed' % failed)
+
+            ran = 0
+            job_id = claim_import_job()
+            while job_id is not None:
+                run_import_job(job_id)
+                ran += 1
+                job_id = claim_import_job()
+
+            if ran or not options['loop']:
+                self.stdout.write('%d import jobs run' % ran)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 09:04
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('election', '0007_roll_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file_name', models.CharField(help_text='Uploaded file in VOTER_IMPORT_DIR', max_length=64)),
+                ('roll_column', models.PositiveSmallIntegerField(default=0)),
+                ('skip_one_row', models.BooleanField(default=False)),
+                ('skip_errors', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=8)),
+                ('total_rows', models.PositiveIntegerField(default=0, help_text='Unique valid roll numbers in file')),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('new_voters', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.TextField(default='[]', help_text='JSON list of [line number, error]')),
+                ('message', models.CharField(blank=True, max_length=256)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='election.Election')),
+                ('tags', models.ManyToManyField(blank=True, to='election.Tag')),
+            ],
+        ),
+    ]
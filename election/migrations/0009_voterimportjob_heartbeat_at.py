@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 09:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('election', '0008_voterimportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voterimportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last time import worker reported progress', null=True),
+        ),
+    ]
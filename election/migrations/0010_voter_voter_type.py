@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 12:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_voter_type(apps, schema_editor):
+    Voter = apps.get_model('election', 'Voter')
+    UserProfile = apps.get_model('account', 'UserProfile')
+    # Roll number is not unique in profiles, any one of them is taken
+    schema_editor.execute(
+        'UPDATE {voter} SET voter_type = ('
+        '  SELECT MAX(profile.voter_type) FROM {profile} profile WHERE profile.roll_key = {voter}.roll_key'
+        ')'.format(voter=Voter._meta.db_table, profile=UserProfile._meta.db_table)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_userprofile_session_nonce'),
+        ('election', '0009_voterimportjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='voter_type',
+            field=models.CharField(blank=True, editable=False, help_text='Voter type of user with this roll number, set on import and login', max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_voter_type, migrations.RunPython.noop),
+    ]
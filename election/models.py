@@ -1,12 +1,16 @@
-import random
+import os
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator
-from django.db import models
+from django.db import connections, models, transaction
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
+from account.models import UserProfile
+from core.core import normalize_roll_number
+from core.db import bulk_update_values
+
 
 class Election(models.Model):
     name = models.CharField(max_length=64, db_index=True)
@@ -61,19 +65,56 @@ class Tag(models.Model):
         return self.tag
 
 
+VOTER_KEY_ALPHABET = '123456789ABCDFGH'
+
+# Alphabet has 16 characters, so every character of a key is one random nibble
+_HEX_TO_VOTER_KEY = str.maketrans('0123456789abcdef', VOTER_KEY_ALPHABET)
+
+
+def generate_random_voter_keys(count):
+    """
+    `count` random voter keys minted from a single os.urandom buffer
+    """
+    length = settings.VOTER_KEY_LENGTH
+    characters = os.urandom((count * length + 1) // 2).hex().translate(_HEX_TO_VOTER_KEY)
+    return [characters[start:start + length] for start in range(0, count * length, length)]
+
+
 def generate_random_voter_key():
-    return ''.join(random.choice('123456789ABCDFGH') for _ in range(settings.VOTER_KEY_LENGTH))
+    return generate_random_voter_keys(1)[0]
+
+
+class VoterQuerySet(models.QuerySet):
+
+    def shuffle_keys(self):
+        """
+        Give new random keys to all voters of queryset with batched updates
+
+        Returns:
+            Number of voters
+        """
+        voter_ids = list(self.values_list('pk', flat=True))
+        with transaction.atomic(using=self.db):
+            bulk_update_values(connections[self.db], self.model, 'key',
+                               list(zip(voter_ids, generate_random_voter_keys(len(voter_ids)))))
+        return len(voter_ids)
 
 
 class Voter(models.Model):
     roll_no = models.CharField(max_length=10, db_index=True)
+    roll_key = models.CharField(max_length=10, db_index=True, editable=False,
+                                help_text='Normalized roll number used for lookups')
     created_at = models.DateTimeField(auto_now_add=True)
     election = models.ForeignKey(Election, related_name='voters', db_index=True)
     key = models.CharField(max_length=settings.VOTER_KEY_LENGTH, default=generate_random_voter_key)
     voted = models.BooleanField(default=False, db_index=True)
     voted_at = models.DateTimeField(null=True, blank=True)
+    voter_type = models.CharField(max_length=16, null=True, blank=True, editable=False,
+                                  help_text='Voter type of user with this roll number, set on import and login')
     tags = models.ManyToManyField(Tag, blank=True)
 
+    objects = VoterQuerySet.as_manager()
+
     class Meta:
         unique_together = ['roll_no', 'election']
 
@@ -85,8 +126,62 @@ class Voter(models.Model):
              update_fields=None):
         if not self.voted_at and self.voted:
             self.voted_at = timezone.now()
+        self.roll_key = normalize_roll_number(self.roll_no)
+        if self.pk is None and self.voter_type is None:
+            self.voter_type = UserProfile.objects.filter(roll_key=self.roll_key).values_list(
+                'voter_type', flat=True).first()
         return super().save(force_insert=force_insert, force_update=force_update, using=using,
                             update_fields=update_fields)
 
     def __str__(self):
         return self.roll_no
+
+
+class VoterImportJob(models.Model):
+    """
+    Voters list import which runs in import worker (see election/import_jobs.py)
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    election = models.ForeignKey(Election, related_name='import_jobs')
+    created_by = models.ForeignKey(User)
+    created_at = models.DateTimeField(auto_now_add=True)
+    file_name = models.CharField(max_length=64, help_text='Uploaded file in VOTER_IMPORT_DIR')
+    roll_column = models.PositiveSmallIntegerField(default=0)
+    skip_one_row = models.BooleanField(default=False)
+    skip_errors = models.BooleanField(default=False)
+    tags = models.ManyToManyField(Tag, blank=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    total_rows = models.PositiveIntegerField(default=0, help_text='Unique valid roll numbers in file')
+    processed_rows = models.PositiveIntegerField(default=0)
+    new_voters = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.TextField(default='[]', help_text='JSON list of [line number, error]')
+    message = models.CharField(max_length=256, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text='Last time import worker reported progress')
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in [self.DONE, self.FAILED]
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        seconds = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.processed_rows / seconds, 1) if seconds > 0 else 0
+
+    def __str__(self):
+        return '%s #%d' % (self.election, self.id)
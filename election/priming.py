@@ -0,0 +1,63 @@
+"""
+This module loads everything voting views need for an election into shared cache and into current process:
+
+1. Ids of open elections (see election/eligibility.py)
+2. Roll keys of voters of election (see election/eligibility.py)
+3. Ballot and its rendered HTML fragment for every kind of voter (see election/ballot.py)
+
+Entries are read from cache when present and built otherwise, and every entry is keyed by a version that is bumped
+on admin edits, so loading again after an edit only builds what changed.
+"""
+import pickle
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .ballot import BALLOT_VERSION_KEY, get_ballot_cache_keys, load_ballots
+from .eligibility import (
+    ELIGIBILITY_VERSION_KEY, OPEN_ELECTIONS_VERSION_KEY, get_eligibility_key, get_eligible_roll_keys,
+    get_open_election_ids, get_open_elections_key,
+)
+
+PrimedEntry = namedtuple('PrimedEntry', ['group', 'key', 'size'])
+
+
+def load_election(election):
+    """
+    Load cache entries of an election
+
+    Returns:
+        list of (group, key) of loaded entries
+    """
+    get_open_election_ids()
+    get_eligible_roll_keys(election.id)
+    ballots = load_ballots(election)
+
+    entries = [
+        ('versions', OPEN_ELECTIONS_VERSION_KEY),
+        ('versions', ELIGIBILITY_VERSION_KEY.format(election_id=election.id)),
+        ('versions', BALLOT_VERSION_KEY.format(election_id=election.id)),
+        ('open elections', get_open_elections_key()),
+        ('eligibility', get_eligibility_key(election.id)),
+    ]
+    for ballot in ballots:
+        ballot_key, html_key = get_ballot_cache_keys(ballot, election)
+        entries.append(('ballots', ballot_key))
+        entries.append(('ballot fragments', html_key))
+    return entries
+
+
+def prime_election(election):
+    """
+    Load cache entries of an election and read them back from shared cache
+
+    Returns:
+        list of PrimedEntry. Size is length of pickled value, None if value is not in shared cache (e.g. it is
+        larger than memcached allows).
+    """
+    entries = load_election(election)
+    values = cache.get_many([key for _, key in entries])
+    return [
+        PrimedEntry(group, key, len(pickle.dumps(values[key], pickle.HIGHEST_PROTOCOL)) if key in values else None)
+        for group, key in entries
+    ]
@@ -28,3 +28,55 @@ class AddVoteSerializer(serializers.Serializer):
                 raise serializers.ValidationError('Dict key/value is not integer')
 
         return votes
+
+
+class BallotCandidateSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    image = serializers.CharField(source='image_url')
+    manifesto = serializers.SerializerMethodField()
+
+    def get_manifesto(self, candidate):
+        if self.context['election'].display_manifesto:
+            return candidate.manifesto_url
+        return None
+
+
+class BallotPostSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    number = serializers.IntegerField()
+    type = serializers.IntegerField()
+    no_allowed = serializers.SerializerMethodField()
+    candidates = BallotCandidateSerializer(source='human_candidates', many=True)
+    nota = serializers.SerializerMethodField()
+    neutral = serializers.SerializerMethodField()
+
+    def get_no_allowed(self, post):
+        return len(post.human_candidates) <= post.number
+
+    def get_nota(self, post):
+        # NOTA is offered only if there is a choice between candidates
+        if len(post.human_candidates) < 2:
+            return None
+        return next((candidate.id for candidate in post.auto_candidates if candidate.is_nota), None)
+
+    def get_neutral(self, post):
+        return next((candidate.id for candidate in post.auto_candidates if candidate.is_neutral), None)
+
+
+class BallotSerializer(serializers.Serializer):
+    """
+    Serializes ballot of an election. Context must contain the election.
+    """
+    election = serializers.SerializerMethodField()
+    posts = BallotPostSerializer(many=True)
+
+    def get_election(self, ballot):
+        election = self.context['election']
+        return {
+            'id': election.id,
+            'name': election.name,
+            'is_key_required': election.is_key_required,
+            'session_timeout': election.session_timeout,
+        }
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .eligibility import invalidate_eligibility, invalidate_open_elections
+from .models import Election, Voter
+
+
+@receiver(post_save, sender=Election)
+@receiver(post_delete, sender=Election)
+def invalidate_election_state(sender, instance: Election, created=False, **kwargs) -> None:
+    """
+    Bump open elections version so that cached open elections are rebuilt
+    """
+    invalidate_open_elections()
+    if created:
+        # Ids of deleted elections may be reused by database
+        invalidate_eligibility(instance.id)
+
+
+@receiver(post_save, sender=Voter)
+@receiver(post_delete, sender=Voter)
+def invalidate_voter_eligibility(sender, instance: Voter, **kwargs) -> None:
+    """
+    Bump eligibility version of voter's election so that cached roll keys are rebuilt
+    """
+    invalidate_eligibility(instance.election_id)
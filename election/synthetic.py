@@ -0,0 +1,103 @@
+"""
+This module creates deterministic synthetic elections and voters for load tests and benchmarks
+"""
+from core.core import PostTypes, VoteTypes, normalize_roll_number
+from post.models import Candidate, Post
+
+from .ballot import BallotCandidate, BallotPost, bump_ballot_version
+from .eligibility import invalidate_eligibility
+from .models import Election, Voter, generate_random_voter_keys
+
+_ROLL_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def synthetic_roll_number(index):
+    """
+    Valid IITB roll number for index (0 <= index < 36 ** 4)
+    """
+    sequence = ''
+    for _ in range(4):
+        index, digit = divmod(index, len(_ROLL_DIGITS))
+        sequence = _ROLL_DIGITS[digit] + sequence
+    return '16005' + sequence
+
+
+def create_synthetic_election(creator, name, posts, candidates, **kwargs):
+    """
+    Create an election with given number of posts and normal candidates per post. NOTA and neutral candidates are
+    created for every post by post signals.
+    """
+    election = Election.objects.create(name=name, creator=creator, **kwargs)
+    for post_index in range(posts):
+        post = Post.objects.create(name='Post %d' % post_index, election=election, order=post_index)
+        Candidate.objects.bulk_create([
+            Candidate(name='Candidate %d.%d' % (post_index, candidate_index), post=post, order=candidate_index)
+            for candidate_index in range(candidates)
+        ])
+    # bulk_create does not send signals
+    bump_ballot_version(election.id)
+    return election
+
+
+def create_synthetic_voters(election, count, start=0, batch_size=None):
+    """
+    Add voters with roll numbers synthetic_roll_number(start) ... synthetic_roll_number(start + count - 1)
+
+    Returns:
+        list of roll numbers
+    """
+    roll_numbers = [synthetic_roll_number(index) for index in range(start, start + count)]
+    Voter.objects.bulk_create([
+        Voter(roll_no=roll_number, roll_key=normalize_roll_number(roll_number), election=election, key=key)
+        for roll_number, key in zip(roll_numbers, generate_random_voter_keys(count))
+    ], batch_size=batch_size)
+    invalidate_eligibility(election.id)
+    return roll_numbers
+
+
+def build_synthetic_ballot(posts, candidates, number=1):
+    """
+    Build an in-memory ballot with given number of posts and normal candidates per post. Every post also gets
+    NOTA and neutral candidates like post/signals.py creates for real posts.
+    """
+    ballot = []
+    candidate_id = 0
+    for post_id in range(1, posts + 1):
+        human_candidates = []
+        for _ in range(candidates):
+            candidate_id += 1
+            human_candidates.append(BallotCandidate(candidate_id, 'Candidate %d' % candidate_id, None, None,
+                                                    False, False, False))
+        auto_candidates = (
+            BallotCandidate(candidate_id + 1, 'None of These', None, None, True, False, True),
+            BallotCandidate(candidate_id + 2, 'Neutral', None, None, False, True, True),
+        )
+        candidate_id += 2
+        ballot.append(BallotPost(post_id, 'Post %d' % post_id, number, PostTypes.ALL, tuple(human_candidates),
+                                 auto_candidates))
+    return tuple(ballot)
+
+
+def build_full_votes(ballot):
+    """
+    Votes of a voter who votes YES for as many normal candidates as allowed in every post
+    """
+    votes = {}
+    for post in ballot:
+        for candidate in post.human_candidates[:post.number]:
+            votes[candidate.id] = VoteTypes.YES
+    return votes
+
+
+def build_random_votes(ballot, rng):
+    """
+    Votes of a voter who votes YES for a random choice of as many normal candidates as allowed in every post
+
+    Args:
+        rng: random.Random, seed it for same votes on every run
+    """
+    votes = {}
+    for post in ballot:
+        for candidate in rng.sample(post.human_candidates, min(post.number, len(post.human_candidates))):
+            votes[candidate.id] = VoteTypes.YES
+    return votes
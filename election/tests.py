@@ -1,3 +1,525 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+
+from account.fake_ldap import directory
+from account.models import UserProfile
+from core.core import PostTypes, VoteTypes
+from post.models import Candidate, Post
+from vote.models import Vote, VoteSession
+
+from .analytics import (ANALYTICS_TIMEOUT, TURNOUT_ANALYTICS_KEY, TURNOUT_ANALYTICS_LOCK_KEY, compute_turnout_analytics,
+                        get_turnout_analytics)
+from .ballot import get_ballot
+from .benchmarks import compare_results
+from .eligibility import _local_roll_keys, get_eligible_election_ids, get_eligible_roll_keys
+from .import_jobs import fail_stale_import_jobs
+from .importer import VoterImportError, get_roll_numbers, import_voters
+from .models import VOTER_KEY_ALPHABET, Election, Tag, Voter, VoterImportJob, generate_random_voter_keys
+from .synthetic import build_full_votes, build_synthetic_ballot
+from .turnout import _count_voted, _read_counters, count_vote
+from .validation import BallotError, BallotErrors, BallotValidator
+
+VOTER_PASSWORD = 'password'
+
+
+def _test_db_in_memory():
+    # SQLite reports test_db_allows_multiple_connections = False even for a file backed test database
+    return connection.vendor == 'sqlite' and not connection.settings_dict.get('TEST', {}).get('NAME')
+
+
+def login_voter(client, username, roll_number):
+    """
+    Log in through voter login page against account.fake_ldap, so that session lives in voter session cookie
+    """
+    directory.add_user(username, VOTER_PASSWORD, roll_number)
+    response = client.post(reverse('account:login'), {'username': username, 'password': VOTER_PASSWORD})
+    assert response.status_code == 302, response.status_code
+
+
+@skipIf(_test_db_in_memory(), 'Needs a database which allows multiple connections to test database')
+@override_settings(AUTHENTICATION_BACKENDS=['account.fake_ldap.FakeLDAPBackend'])
+class ConcurrentVoteTest(TransactionTestCase):
+    """
+    Fires parallel submissions of same voter from threads. Each thread uses its own database connection, so it needs
+    a database which allows multiple connections to test database (not in-memory SQLite, see TEST NAME in settings).
+    """
+    submissions = 8
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        election = Election.objects.create(name='General Election', creator=creator, is_active=True,
+                                           is_key_required=False)
+        post = Post.objects.create(name='General Secretary', election=election)
+        self.candidate = Candidate.objects.create(name='Candidate', post=post)
+        Voter.objects.create(roll_no='140050001', election=election)
+
+        self.addCleanup(directory.clear)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        login_voter(self.client, 'voter', '140050001')
+        self.session_cookie = self.client.cookies[settings.VOTER_SESSION_COOKIE_NAME].value
+
+    def _submit(self, barrier):
+        try:
+            client = Client()
+            client.cookies[settings.VOTER_SESSION_COOKIE_NAME] = self.session_cookie
+            body = urlencode({'votes': json.dumps({str(self.candidate.id): 1})})
+            barrier.wait()
+            client.post(reverse('election:index'), body, content_type='application/x-www-form-urlencoded')
+        finally:
+            connection.close()
+
+    def test_parallel_submissions_record_one_ballot(self):
+        barrier = threading.Barrier(self.submissions)
+        threads = [threading.Thread(target=self._submit, args=(barrier,)) for _ in range(self.submissions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(VoteSession.objects.count(), 1)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertTrue(Voter.objects.get().voted)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['account.fake_ldap.FakeLDAPBackend'])
+class BallotAPITest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator, is_active=True,
+                                                is_key_required=False)
+        self.post = Post.objects.create(name='General Secretary', election=self.election)
+        Candidate.objects.create(name='Candidate', post=self.post)
+        Voter.objects.create(roll_no='140050001', election=self.election)
+
+        self.addCleanup(directory.clear)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        login_voter(self.client, 'voter', '140050001')
+        self.url = reverse('election:ballot')
+
+    def test_ballot_is_revalidated_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['election']['name'], 'General Election')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other", %s' % etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_changes_with_election_and_candidates(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.election.name = 'Hostel Election'
+        self.election.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['election']['name'], 'Hostel Election')
+
+        etag = response['ETag']
+        Candidate.objects.create(name='Second Candidate', post=self.post)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['posts'][0]['candidates']), 2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_ballot_follows_candidates_without_cache(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(len(response.json()['posts'][0]['candidates']), 1)
+
+        Candidate.objects.create(name='Second Candidate', post=self.post)
+        self.assertEqual(len(self.client.get(self.url).json()['posts'][0]['candidates']), 2)
+        self.assertEqual(len(get_ballot(self.election.id, [PostTypes.ALL]).posts[0].human_candidates), 2)
+
+
+class VoterImportTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator)
+        self.tag = Tag.objects.create(tag='hostel9', created_by=creator)
+        voter = Voter.objects.create(roll_no='140050001', election=self.election)
+        voter.tags.add(self.tag)
+
+    def test_import_adds_new_voters_and_tags_all(self):
+        rows = [['roll'], ['140050001'], [' 140050002 '], ['140050002'], ['16d070003']]
+        # Savepoint, existing voters, voter types, insert voters, new voter ids, existing tags, insert tags, release
+        with self.assertNumQueries(8):
+            result = import_voters(self.election, rows, 0, skip_one_row=True, tags=[self.tag])
+
+        self.assertEqual(result.new_voters, 2)
+        self.assertEqual(result.roll_numbers, 3)
+        self.assertEqual(sorted(Voter.objects.values_list('roll_no', 'roll_key')),
+                         [('140050001', '140050001'), ('140050002', '140050002'), ('16D070003', '16D070003')])
+        self.assertEqual(self.tag.voter_set.count(), 3)
+
+    def test_invalid_row_aborts_import(self):
+        rows = [['140050002'], ['not a roll'], []]
+        with self.assertRaisesMessage(VoterImportError, 'Roll number not a roll in line 2 is not a valid roll number'):
+            import_voters(self.election, rows, 0)
+        self.assertEqual(Voter.objects.count(), 1)
+
+        result = import_voters(self.election, rows, 0, skip_errors=True)
+        self.assertEqual(result.new_voters, 1)
+
+
+class VoterKeyTest(TestCase):
+
+    def test_keys_are_minted_from_alphabet(self):
+        keys = generate_random_voter_keys(1001)
+        self.assertEqual(len(keys), 1001)
+        self.assertTrue(all(len(key) == settings.VOTER_KEY_LENGTH for key in keys))
+        self.assertLessEqual(set(''.join(keys)), set(VOTER_KEY_ALPHABET))
+
+    def test_shuffle_keys(self):
+        election = Election.objects.create(name='General Election', creator=User.objects.create_user('creator'))
+        old_key = '0' * settings.VOTER_KEY_LENGTH
+        Voter.objects.bulk_create([Voter(roll_no='14005%04d' % index, election=election, key=old_key)
+                                   for index in range(700)])
+
+        self.assertEqual(Voter.objects.filter(roll_no__gte='140050350').shuffle_keys(), 350)
+        self.assertEqual(Voter.objects.filter(key=old_key).count(), 350)
+        self.assertFalse(Voter.objects.filter(roll_no__gte='140050350', key=old_key).exists())
+
+
+class VoterImportJobTest(TestCase):
+
+    def setUp(self):
+        import_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, import_dir)
+        settings_override = override_settings(VOTER_IMPORT_DIR=import_dir, VOTER_IMPORT_BATCH_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        creator = User.objects.create_superuser('creator', 'creator@example.com', 'password')
+        self.election = Election.objects.create(name='General Election', creator=creator)
+        self.tag = Tag.objects.create(tag='hostel9', created_by=creator)
+        self.client.force_login(creator)
+        # HistoryRequestMiddleware keeps last request in a thread local, later tests must not record its user
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+
+    def _upload(self, content, **data):
+        url = reverse('admin:election_election_add_voters_url', args=[self.election.id])
+        data['voters_list'] = SimpleUploadedFile('voters.csv', content.encode('utf-8'))
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        job = VoterImportJob.objects.get()
+        self.assertEqual(job.status, VoterImportJob.PENDING)
+        call_command('run_import_jobs', stdout=StringIO())
+        response = self.client.get(reverse('admin:election_election_import_job', args=[self.election.id, job.id]))
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_job_imports_in_batches(self):
+        job = self._upload('140050001\n140050002\n140050001\n16d070003\n', tags=[self.tag.id])
+        self.assertEqual(job['status'], VoterImportJob.DONE)
+        self.assertEqual((job['total_rows'], job['processed_rows'], job['new_voters']), (3, 3, 3))
+        self.assertEqual(self.tag.voter_set.count(), 3)
+
+    def test_batches_do_not_read_whole_election(self):
+        Voter.objects.create(roll_no='140050001', election=self.election).tags.add(self.tag)
+        with mock.patch('election.import_jobs.get_roll_numbers', wraps=get_roll_numbers) as get_existing, \
+                CaptureQueriesContext(connection) as queries:
+            job = self._upload('140050001\n140050002\n140050003\n140050004\n140050005\n', tags=[self.tag.id])
+
+        self.assertEqual((job['status'], job['new_voters']), (VoterImportJob.DONE, 4))
+        self.assertEqual(self.tag.voter_set.count(), 5)
+        # Once per job, not per batch
+        self.assertEqual(get_existing.call_count, 1)
+        # Voter-tag rows are read by voter ids of batch
+        self.assertFalse([query['sql'] for query in queries.captured_queries
+                          if 'election_voter_tags' in query['sql'] and 'INNER JOIN' in query['sql']])
+
+    def test_job_marked_failed_stops(self):
+        def fail_job_and_get_roll_numbers(election):
+            # As if import worker found job stale while its list was parsed
+            VoterImportJob.objects.update(status=VoterImportJob.FAILED, message='Import worker stopped')
+            return get_roll_numbers(election)
+
+        with mock.patch('election.import_jobs.get_roll_numbers', side_effect=fail_job_and_get_roll_numbers):
+            job = self._upload('140050001\n140050002\n140050003\n')
+
+        self.assertEqual((job['status'], job['processed_rows'], job['message']),
+                         (VoterImportJob.FAILED, 0, 'Import worker stopped'))
+        # Batch which found job failed is rolled back
+        self.assertEqual(Voter.objects.count(), 0)
+
+    def test_invalid_rows_fail_job(self):
+        job = self._upload('140050001\nnot a roll\n')
+        self.assertEqual(job['status'], VoterImportJob.FAILED)
+        self.assertEqual(job['errors'], [[2, 'Roll number not a roll in line 2 is not a valid roll number']])
+        self.assertEqual(Voter.objects.count(), 0)
+
+        VoterImportJob.objects.all().delete()
+        job = self._upload('140050001\nnot a roll\n', skip_errors='on')
+        self.assertEqual((job['status'], job['new_voters'], job['error_count']), (VoterImportJob.DONE, 1, 1))
+
+    def test_stale_job_fails(self):
+        started_at = timezone.now() - timedelta(seconds=settings.VOTER_IMPORT_STALE_AFTER + 1)
+        job_fields = {'election': self.election, 'created_by': self.election.creator, 'status': VoterImportJob.RUNNING,
+                      'started_at': started_at}
+        stale = VoterImportJob.objects.create(file_name='stale.csv', processed_rows=4, heartbeat_at=started_at,
+                                              **job_fields)
+        running = VoterImportJob.objects.create(file_name='running.csv', heartbeat_at=timezone.now(), **job_fields)
+
+        self.assertEqual(fail_stale_import_jobs(), 1)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, VoterImportJob.FAILED)
+        self.assertIn('after 4 rows', stale.message)
+        self.assertEqual(running.status, VoterImportJob.RUNNING)
+        self.assertEqual(fail_stale_import_jobs(), 0)
+
+
+class TurnoutAnalyticsTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create_superuser('creator', 'creator@example.com', 'password')
+        UserProfile.objects.create(user=User.objects.create_user('ug'), roll_number='140050001', user_type='UG')
+        UserProfile.objects.create(user=User.objects.create_user('pg'), roll_number='163050002', user_type='PG')
+        self.election = Election.objects.create(name='General Election', creator=self.creator, is_active=True)
+        cache.clear()
+
+    def test_counts_by_tag_and_voter_type(self):
+        hostel = Tag.objects.create(tag='hostel9', created_by=self.creator)
+        batch = Tag.objects.create(tag='batch14', created_by=self.creator)
+
+        ug_voter = Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+        pg_voter = Voter.objects.create(roll_no='163050002', election=self.election)
+        other_voter = Voter.objects.create(roll_no='150050003', election=self.election, voted=True)
+        ug_voter.tags.add(hostel, batch)
+        pg_voter.tags.add(hostel)
+        other_voter.tags.add(batch)
+
+        with self.assertNumQueries(1):
+            analytics = compute_turnout_analytics(self.election.id)
+
+        self.assertEqual(analytics['total'], {'voters': 3, 'voted': 2, 'turnout': 66.7})
+        self.assertEqual([(voter_type, counts['voted'], counts['voters'])
+                          for voter_type, counts in analytics['voter_types']],
+                         [('UG', 1, 1), ('PG', 0, 1), ('OTHER', 1, 1)])
+        self.assertEqual([(tag['tag'], tag['total']['voted'], tag['total']['voters']) for tag in analytics['tags']],
+                         [('batch14', 2, 2), ('hostel9', 1, 2)])
+
+        self.client.force_login(self.creator)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        response = self.client.get(reverse('admin:election_election_change', args=[self.election.id]))
+        self.assertContains(response, '<th>hostel9</th>', html=True)
+
+    def test_voter_with_repeated_profile_is_counted_once(self):
+        UserProfile.objects.create(user=User.objects.create_user('ug2'), roll_number='140050001', user_type='UG')
+        Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+
+        analytics = compute_turnout_analytics(self.election.id)
+
+        self.assertEqual(analytics['total'], {'voters': 1, 'voted': 1, 'turnout': 100.0})
+        self.assertEqual(analytics['voter_types'][0], ('UG', {'voters': 1, 'voted': 1, 'turnout': 100.0}))
+
+    def test_imported_voters_take_voter_type_of_profile(self):
+        import_voters(self.election, [['140050001'], ['163050002'], ['150050003']], 0)
+
+        self.assertEqual(dict(Voter.objects.values_list('roll_no', 'voter_type')),
+                         {'140050001': 'UG', '163050002': 'PG', '150050003': None})
+
+    def test_another_request_computes_analytics(self):
+        Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+        cache.add(TURNOUT_ANALYTICS_LOCK_KEY.format(election_id=self.election.id), 1)
+
+        self.assertIsNone(get_turnout_analytics(self.election.id))
+
+        self.client.force_login(self.creator)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        response = self.client.get(reverse('admin:election_election_change', args=[self.election.id]))
+        self.assertContains(response, 'Turnout is being counted')
+
+    def test_stale_analytics_are_shown_while_recomputed(self):
+        analytics = get_turnout_analytics(self.election.id)
+        Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+
+        analytics['time'] -= ANALYTICS_TIMEOUT
+        cache.set(TURNOUT_ANALYTICS_KEY.format(election_id=self.election.id), analytics)
+
+        # Lock taken by first computation is still held
+        self.assertEqual(get_turnout_analytics(self.election.id)['total']['voters'], 0)
+        cache.delete(TURNOUT_ANALYTICS_LOCK_KEY.format(election_id=self.election.id))
+        self.assertEqual(get_turnout_analytics(self.election.id)['total']['voters'], 1)
+
+
+class TurnoutTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create_superuser('creator', 'creator@example.com', 'password')
+        UserProfile.objects.create(user=User.objects.create_user('ug'), roll_number='140050001', user_type='UG')
+        UserProfile.objects.create(user=User.objects.create_user('pg'), roll_number='163050002', user_type='PG')
+        self.election = Election.objects.create(name='General Election', creator=self.creator, is_active=True)
+        Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+        self.late_voter = Voter.objects.create(roll_no='163050002', election=self.election)
+        cache.clear()
+
+    def test_counters_are_seeded_and_counted(self):
+        self.assertEqual(_read_counters(self.election.id), {'UG': 1, 'PG': 0, 'OTHER': 0})
+        self.late_voter.voted = True
+        self.late_voter.save()
+        count_vote(self.election.id, 'PG')
+        with self.assertNumQueries(0):
+            self.assertEqual(_read_counters(self.election.id), {'UG': 1, 'PG': 1, 'OTHER': 0})
+
+    def test_vote_committed_while_seeding_is_not_lost(self):
+        def count_then_vote(election_id):
+            counts = _count_voted(election_id)
+            # Vote commits after database is counted and finds its counter missing
+            Voter.objects.filter(pk=self.late_voter.pk).update(voted=True)
+            count_vote(election_id, 'PG')
+            return counts
+
+        with mock.patch('election.turnout._count_voted', count_then_vote):
+            self.assertEqual(_read_counters(self.election.id)['PG'], 0)
+        self.assertEqual(_read_counters(self.election.id), {'UG': 1, 'PG': 1, 'OTHER': 0})
+
+    def test_turnout_is_polled_as_json(self):
+        self.client.force_login(self.creator)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        response = self.client.get(reverse('admin:election_election_turnout', args=[self.election.id]))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(response.json(), {
+            'registered': 2,
+            'voted': 1,
+            'voted_by_type': {'UG': 1, 'PG': 0, 'OTHER': 0},
+            'votes_per_minute': 0,
+        })
+
+
+class EligibilityTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator)
+        Voter.objects.create(roll_no='140050001', election=self.election)
+
+    def test_cached_voters_follow_imports_and_activation(self):
+        self.assertEqual(get_eligible_election_ids('140050001'), [])
+
+        self.election.is_active = True
+        self.election.save()
+        self.assertEqual(get_eligible_election_ids('140050001'), [self.election.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_eligible_election_ids('16D070003'), [])
+
+        import_voters(self.election, [['16d070003']], 0)
+        self.assertEqual(get_eligible_election_ids('16D070003'), [self.election.id])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    @override_settings(AUTHENTICATION_BACKENDS=['account.fake_ldap.FakeLDAPBackend'])
+    def test_voters_are_read_from_database_without_cache(self):
+        _local_roll_keys.clear()
+        self.election.is_active = True
+        self.election.save()
+        self.assertIsNone(get_eligible_election_ids('140050001'))
+        self.assertEqual(get_eligible_roll_keys(self.election.id), {'140050001'})
+
+        Voter.objects.create(roll_no='16d070003', election=self.election)
+        self.assertEqual(get_eligible_roll_keys(self.election.id), {'140050001', '16D070003'})
+        self.assertNotIn(self.election.id, _local_roll_keys)
+
+        self.addCleanup(directory.clear)
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        login_voter(self.client, 'voter', '16d070003')
+        self.assertContains(self.client.get(reverse('election:index')), 'General Election')
+
+    def test_prime_election_is_idempotent(self):
+        Post.objects.create(name='General Secretary', election=self.election)
+
+        output = StringIO()
+        call_command('prime_election', str(self.election.id), stdout=output)
+        # 3 versions, open elections, eligibility, 4 ballots and 4 fragments
+        self.assertRegex(output.getvalue(), r'\ntotal +13 ')
+
+        # Only election is read again
+        with self.assertNumQueries(1):
+            call_command('prime_election', str(self.election.id), stdout=StringIO())
+
+
+class BenchmarkBaselineTest(SimpleTestCase):
+
+    def test_regression_is_growth_of_time_per_operation_over_threshold(self):
+        baseline = {'commit_ballot': {'per_op_us': 100.0}, 'voter_import': {'per_op_us': 10.0}}
+        results = {
+            'commit_ballot': {'per_op_us': 125.0},
+            'voter_import': {'per_op_us': 11.0},
+            'election_results': {'per_op_us': 5.0},
+        }
+        changes = compare_results(results, baseline, threshold=20)
+        self.assertEqual(changes['commit_ballot'], (25.0, True))
+        self.assertFalse(changes['voter_import'][1])
+        self.assertEqual(changes['election_results'], (None, False))
+
+
+class BallotValidatorTest(SimpleTestCase):
+    """
+    Ballot of 2 posts with 3 candidates for 1 seat each. Candidate ids of first post are 1, 2, 3, NOTA 4, neutral 5
+    and of second post are 6, 7, 8, NOTA 9, neutral 10.
+    """
+
+    def setUp(self):
+        self.ballot = build_synthetic_ballot(posts=2, candidates=3, number=1)
+        self.validator = BallotValidator(self.ballot)
+
+    def test_valid_ballot(self):
+        self.assertIsNone(self.validator.validate(build_full_votes(self.ballot)))
+        self.assertIsNone(self.validator.validate({2: VoteTypes.YES, 9: VoteTypes.YES}))
+        self.assertIsNone(self.validator.validate({}))
+
+    def test_no_allowed_when_candidates_do_not_exceed_seats(self):
+        # Human candidate 1, NOTA 2, neutral 3
+        validator = BallotValidator(build_synthetic_ballot(posts=1, candidates=1, number=1))
+        self.assertIsNone(validator.validate({1: VoteTypes.NO}))
+
+    def test_invalid_candidate(self):
+        self.assertEqual(self.validator.validate({1: VoteTypes.YES, 99: VoteTypes.YES}),
+                         BallotError(BallotErrors.INVALID_CANDIDATE, 99))
+
+    def test_multiple_auto_votes(self):
+        self.assertEqual(self.validator.validate({4: VoteTypes.YES, 5: VoteTypes.YES}),
+                         BallotError(BallotErrors.MULTIPLE_AUTO_VOTES, 5))
+
+    def test_auto_with_human_votes(self):
+        self.assertEqual(self.validator.validate({1: VoteTypes.YES, 4: VoteTypes.YES}).code,
+                         BallotErrors.AUTO_WITH_HUMAN_VOTES)
+        self.assertEqual(self.validator.validate({5: VoteTypes.YES, 1: VoteTypes.YES}).code,
+                         BallotErrors.AUTO_WITH_HUMAN_VOTES)
+
+    def test_no_for_auto_candidate(self):
+        self.assertEqual(self.validator.validate({4: VoteTypes.NO}),
+                         BallotError(BallotErrors.NO_FOR_AUTO_CANDIDATE, 4))
+
+    def test_no_not_allowed(self):
+        self.assertEqual(self.validator.validate({1: VoteTypes.NO}),
+                         BallotError(BallotErrors.NO_NOT_ALLOWED, 1))
+
+    def test_too_many_votes(self):
+        self.assertEqual(self.validator.validate({1: VoteTypes.YES, 2: VoteTypes.YES}).code,
+                         BallotErrors.TOO_MANY_VOTES)
+        # Seats are counted per post
+        self.assertIsNone(self.validator.validate({1: VoteTypes.YES, 6: VoteTypes.YES}))
@@ -0,0 +1,167 @@
+"""
+This module contains live turnout of elections for the admin turnout view, which change form polls.
+
+Turnout is counted in shared cache counters which ElectionView increments as votes are recorded, so watching turnout
+never scans Voter table. Counters are seeded from database only when they are missing (first read, eviction or
+expiry).
+
+All polls of an election share one snapshot in cache which is refreshed at most once per SNAPSHOT_INTERVAL by
+whichever poll finds it stale, so any number of watching admins costs the same as one.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from core.cache import bump_version, get_version
+from core.core import PG_TYPE, UG_TYPE, VoterTypes
+
+from .models import Voter
+
+OTHER_VOTER_TYPE = 'OTHER'
+
+TURNOUT_VOTER_TYPES = [VoterTypes.UG, VoterTypes.PG, OTHER_VOTER_TYPE]
+
+TURNOUT_COUNTER_KEY = 'turnout_{election_id}_{voter_type}'
+TURNOUT_REGISTERED_KEY = 'turnout_registered_{election_id}'
+TURNOUT_SNAPSHOT_KEY = 'turnout_snapshot_{election_id}'
+TURNOUT_REFRESH_LOCK_KEY = 'turnout_refresh_{election_id}'
+TURNOUT_SEED_VERSION_KEY = 'turnout_seed_version_{election_id}'
+
+# Seconds for which a snapshot is served before it is refreshed
+SNAPSHOT_INTERVAL = 2
+
+# Seconds over which votes per minute is averaged
+RATE_WINDOW = 60
+
+# Registered voters rarely change during polling, they are recounted after this many seconds
+REGISTERED_TIMEOUT = 5 * 60
+
+# Counters are recounted from database after this many seconds. It bounds the error of a vote counted both by a seed
+# and by its own increment, when it commits while counters are seeded.
+COUNTER_TIMEOUT = 10 * 60
+
+
+def get_turnout_voter_type(voter_type):
+    if voter_type and voter_type.upper() in UG_TYPE:
+        return VoterTypes.UG
+    if voter_type and voter_type.upper() in PG_TYPE:
+        return VoterTypes.PG
+    return OTHER_VOTER_TYPE
+
+
+def _counter_keys(election_id):
+    return {
+        voter_type: TURNOUT_COUNTER_KEY.format(election_id=election_id, voter_type=voter_type)
+        for voter_type in TURNOUT_VOTER_TYPES
+    }
+
+
+def count_vote(election_id, voter_type):
+    """
+    Count a recorded vote. Call it after the vote is committed.
+    """
+    key = TURNOUT_COUNTER_KEY.format(election_id=election_id, voter_type=get_turnout_voter_type(voter_type))
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter is missing. Vote is committed, so it is counted by next seed from database. A seed being counted
+        # right now may have missed it, so tell it to seed again (see _read_counters).
+        bump_version(TURNOUT_SEED_VERSION_KEY.format(election_id=election_id))
+
+
+def _count_voted(election_id):
+    """
+    Voted voters of an election per turnout voter type from database
+    """
+    counts = dict.fromkeys(TURNOUT_VOTER_TYPES, 0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT voter_type, COUNT(*) FROM {voter} '
+            'WHERE election_id = %s AND voted '
+            'GROUP BY voter_type'.format(voter=Voter._meta.db_table),
+            [election_id],
+        )
+        for voter_type, count in cursor.fetchall():
+            counts[get_turnout_voter_type(voter_type)] += count
+    return counts
+
+
+def _read_counters(election_id):
+    keys = _counter_keys(election_id)
+    values = cache.get_many(keys.values())
+    if len(values) == len(keys):
+        return {voter_type: values[key] for voter_type, key in keys.items()}
+
+    version_key = TURNOUT_SEED_VERSION_KEY.format(election_id=election_id)
+    version = get_version(version_key)
+    counts = _count_voted(election_id)
+    for voter_type, key in keys.items():
+        if not cache.add(key, counts[voter_type], timeout=COUNTER_TIMEOUT):
+            counts[voter_type] = cache.get(key, counts[voter_type])
+
+    if get_version(version_key) != version:
+        # A vote found its counter missing while database was counted, it may have committed after it was counted.
+        # Counters are dropped, so that next read seeds them again with the vote.
+        cache.delete_many(keys.values())
+    return counts
+
+
+def _read_registered(election_id):
+    key = TURNOUT_REGISTERED_KEY.format(election_id=election_id)
+    registered = cache.get(key)
+    if registered is None:
+        registered = Voter.objects.filter(election_id=election_id).count()
+        cache.set(key, registered, timeout=REGISTERED_TIMEOUT)
+    return registered
+
+
+def get_turnout(election_id):
+    """
+    Current turnout of an election.
+
+    Returns:
+        dict with time, registered, voted, voted_by_type and votes_per_minute. None if another poll is computing
+        the first snapshot.
+    """
+    snapshot_key = TURNOUT_SNAPSHOT_KEY.format(election_id=election_id)
+    snapshot = cache.get(snapshot_key)
+    now = time.time()
+    if snapshot and now - snapshot['time'] < SNAPSHOT_INTERVAL:
+        return snapshot
+    if not cache.add(TURNOUT_REFRESH_LOCK_KEY.format(election_id=election_id), 1, timeout=SNAPSHOT_INTERVAL):
+        return snapshot
+
+    voted_by_type = _read_counters(election_id)
+    voted = sum(voted_by_type.values())
+
+    # Samples of last RATE_WINDOW seconds give votes per minute
+    samples = [sample for sample in (snapshot['samples'] if snapshot else []) if sample[0] >= now - RATE_WINDOW]
+    samples.append((now, voted))
+    first_time, first_voted = samples[0]
+    votes_per_minute = (voted - first_voted) * 60 / (now - first_time) if now > first_time else 0
+
+    snapshot = {
+        'time': now,
+        'registered': _read_registered(election_id),
+        'voted': voted,
+        'voted_by_type': voted_by_type,
+        'votes_per_minute': round(votes_per_minute, 1),
+        'samples': samples,
+    }
+    cache.set(snapshot_key, snapshot, timeout=RATE_WINDOW * 2)
+    return snapshot
+
+
+def format_turnout(turnout):
+    """
+    Public part of a turnout snapshot, empty if there is none yet
+    """
+    if not turnout:
+        return {}
+    return {
+        'registered': turnout['registered'],
+        'voted': turnout['voted'],
+        'voted_by_type': turnout['voted_by_type'],
+        'votes_per_minute': turnout['votes_per_minute'],
+    }
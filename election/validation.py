@@ -0,0 +1,97 @@
+"""
+This module validates ballots submitted by voters against the ballot shown to them.
+
+BallotValidator precomputes a candidate -> post index once per ballot, so a submission is validated in a single pass
+over its votes.
+"""
+from collections import namedtuple
+
+from core.core import VoteTypes
+
+BallotError = namedtuple('BallotError', ['code', 'candidate_id'])
+
+
+class BallotErrors(object):
+    INVALID_CANDIDATE = 'invalid_candidate'
+    MULTIPLE_AUTO_VOTES = 'multiple_auto_votes'
+    AUTO_WITH_HUMAN_VOTES = 'auto_with_human_votes'
+    NO_FOR_AUTO_CANDIDATE = 'no_for_auto_candidate'
+    NO_NOT_ALLOWED = 'no_not_allowed'
+    TOO_MANY_VOTES = 'too_many_votes'
+
+
+class BallotValidator(object):
+    """
+    Validates votes of a ballot. Rules are:
+
+    1. Every voted candidate must belong to a post of the ballot.
+    2. At most one auto generated candidate (NOTA/neutral) can be voted for a post, and only with YES.
+    3. Auto generated and normal candidates can not be voted together for a post.
+    4. NO can be voted for normal candidates only if candidates of post are not more than post.number.
+    5. Number of votes for normal candidates of a post can not be more than post.number.
+    """
+
+    def __init__(self, posts):
+        # candidate id -> (post position in ballot, is auto generated)
+        self.candidate_index = {}
+        self.capacities = []
+        self.no_allowed = []
+        nota_ids = set()
+        neutral_ids = set()
+
+        for position, post in enumerate(posts):
+            self.capacities.append(post.number)
+            self.no_allowed.append(len(post.human_candidates) <= post.number)
+
+            for candidate in post.auto_candidates:
+                self.candidate_index[candidate.id] = (position, True)
+                if candidate.is_nota:
+                    nota_ids.add(candidate.id)
+                if candidate.is_neutral:
+                    neutral_ids.add(candidate.id)
+
+            for candidate in post.human_candidates:
+                self.candidate_index[candidate.id] = (position, False)
+
+        self.nota_ids = frozenset(nota_ids)
+        self.neutral_ids = frozenset(neutral_ids)
+
+    def validate(self, votes: dict):
+        """
+        Validate votes of a ballot
+
+        Args:
+            votes: dict of candidate id to vote type
+
+        Returns:
+            BallotError for first invalid vote found, None if ballot is valid
+        """
+        auto_voted_posts = set()
+        human_votes = {}
+
+        for candidate_id, vote in votes.items():
+            try:
+                position, is_auto = self.candidate_index[candidate_id]
+            except KeyError:
+                return BallotError(BallotErrors.INVALID_CANDIDATE, candidate_id)
+
+            if is_auto:
+                if position in auto_voted_posts:
+                    return BallotError(BallotErrors.MULTIPLE_AUTO_VOTES, candidate_id)
+                if vote == VoteTypes.NO:
+                    return BallotError(BallotErrors.NO_FOR_AUTO_CANDIDATE, candidate_id)
+                if position in human_votes:
+                    return BallotError(BallotErrors.AUTO_WITH_HUMAN_VOTES, candidate_id)
+                auto_voted_posts.add(position)
+            else:
+                if position in auto_voted_posts:
+                    return BallotError(BallotErrors.AUTO_WITH_HUMAN_VOTES, candidate_id)
+                if vote == VoteTypes.NO and not self.no_allowed[position]:
+                    return BallotError(BallotErrors.NO_NOT_ALLOWED, candidate_id)
+
+                count = human_votes.get(position, 0) + 1
+                if count > self.capacities[position]:
+                    return BallotError(BallotErrors.TOO_MANY_VOTES, candidate_id)
+                human_votes[position] = count
+
+        return None
@@ -1,2 +1,4 @@
 from .election import ElectionView
-from .admin import ElectionPreview, AddVotersView, ElectionResultView, ElectionDocsView
+from .admin import ElectionPreview, AddVotersView, ElectionResultView, ElectionDocsView, ElectionTurnoutView, \
+    VoterImportJobView
+from .api import BallotAPIView
@@ -1,31 +1,38 @@
 """
 This file contains election views which requires admin permission and are related to admin
-1. Add Voters View (AddVotersView)
+1. Add Voters View (AddVotersView) and progress of its import jobs (VoterImportJobView)
 2. Election Results (ElectionResultView)
-3. Election Preview (ElectionPreview)
+3. Live turnout (ElectionTurnoutView)
+4. Election Preview (ElectionPreview)
 """
-import codecs
-import csv
+import json
 import os
+import uuid
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin import site
 from django.contrib.admin.widgets import RelatedFieldWidgetWrapper
 from django.db import transaction
-from django.db.models import Case, Count, IntegerField, Prefetch, Sum, When
 from django.forms.widgets import SelectMultiple
-from django.http.response import Http404
+from django.http.response import Http404, HttpResponseNotModified, HttpResponseRedirect, JsonResponse
 from django.template.loader import get_template
-from django.views.generic.base import TemplateView
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.generic.base import TemplateView, View
 from markdown import Markdown
 
-from core.core import IITB_ROLL_REGEX, POST_TYPE_DICT, AlertTags, PostTypes, VoteTypes
-from post.models import Candidate, Post
+from core.core import POST_TYPE_DICT, AlertTags, PostTypes
+from vote.results import build_results, get_result_snapshot
 
-from ..models import Election, Tag, Voter
+from ..ballot import EMPTY_BALLOT, get_ballot
+from ..import_jobs import save_import_file, submit_import_job
+from ..models import Election, Tag, Voter, VoterImportJob
+from ..turnout import format_turnout, get_turnout
 from .election import ElectionView
 
+# Seconds for which browsers reuse results of a finished election without asking again
+
 
 class AddVotersView(TemplateView):
     template_name = 'elections/add_voters.html'
@@ -68,6 +75,7 @@ class AddVotersView(TemplateView):
             False)
         media = model_admin.media
         kwargs['media'] = media
+        kwargs['import_jobs'] = self.object.import_jobs.all().order_by('-id')[:5]
         kwargs['tags_related'] = admin_tags_list.render('tags', None, attrs={
             'id': 'id_tags',
         })
@@ -97,72 +105,73 @@ class AddVotersView(TemplateView):
             return self.get(self.request, *args, **kwargs)
         try:
             roll_column = int(roll_column)
+            if roll_column < 0:
+                raise ValueError
         except ValueError:
             messages.add_message(self.request, messages.ERROR, 'Roll Columns must be an integer')
             return self.get(self.request, *args, **kwargs)
 
-        reader = csv.reader(codecs.iterdecode(file, 'utf-8', errors='ignore'), delimiter=',')
-        index = 0
-        new_voters_added = 0
-        message = ''
+        file_name = '%s.csv' % uuid.uuid4().hex
+        save_import_file(file, file_name)
+
+        with transaction.atomic():
+            job = VoterImportJob.objects.create(
+                election=self.object,
+                created_by=request.user,
+                file_name=file_name,
+                roll_column=roll_column,
+                skip_one_row=skip_one_row,
+                skip_errors=skip_errors,
+            )
+            job.tags.add(*tags)
+            transaction.on_commit(lambda: submit_import_job(job.id))
 
-        try:
-            with transaction.atomic():
-                voter_list = []
-
-                for row in reader:
-                    index += 1
-                    if skip_one_row and index == 1:  # First Row
-                        continue
-
-                    try:
-                        roll_number = row[roll_column]  # type: str
-                        roll_number = roll_number.strip()
-                    except IndexError:
-                        if not skip_errors:
-                            message = 'Invalid line found in data at line number %d : %s' % (index, ','.join(row))
-                            raise
-                        else:
-                            continue
-
-                    if not IITB_ROLL_REGEX.match(roll_number):
-                        if skip_errors:
-                            continue
-                        else:
-                            message = 'Roll number %s in line %d is not a valid roll number' % (roll_number, index)
-                            raise ValueError
-
-                    roll_number = roll_number.upper()
-
-                    # TODO: This is definitely not the best way. But Checking for uniqueness is a pain
-                    voter, created = Voter.objects.get_or_create(roll_no=roll_number, election=self.object)
-                    if created:
-                        new_voters_added += 1
-                    voter_list.append(voter)
-
-                for tag in tags:
-                    tag.voter_set.add(*voter_list)
-
-        except (IndexError, ValueError):
-            messages.add_message(self.request, messages.ERROR, message)
-        else:
-            total_voters = Voter.objects.all().filter(election=self.object).count()
-            messages.add_message(self.request, messages.SUCCESS,
-                                 '%s new voters added. Total voters for this election = %d' % (new_voters_added,
-                                                                                               total_voters))
+        messages.add_message(self.request, messages.INFO, 'Voters list is being imported. See progress below.')
+        return HttpResponseRedirect(request.path)
 
-        return self.get(self.request, *args, **kwargs)
+
+class VoterImportJobView(View):
+    """
+    Progress of a voter import job as JSON, polled by Add Voters page
+    """
+
+    def get(self, request, *args, **kwargs):
+        if len(args) < 2:
+            raise Http404
+
+        queryset = VoterImportJob.objects.all().filter(pk=args[1], election_id=args[0])
+        if not request.user.is_superuser:
+            queryset = queryset.filter(election__creator=request.user)
+        job = queryset.first()
+        if job is None:
+            raise Http404
+
+        return JsonResponse({
+            'id': job.id,
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'is_finished': job.is_finished,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'new_voters': job.new_voters,
+            'rows_per_second': job.rows_per_second,
+            'error_count': job.error_count,
+            'errors': json.loads(job.errors),
+            'message': job.message,
+        })
 
 
 class ElectionResultView(TemplateView):
+    """
+    Results of finished elections are served from their ResultSnapshot (see vote/results.py) and revalidated by browser
+    with ETag. Superusers can see live results of running elections.
+    """
     template_name = 'elections/display_results.html'
 
     def _validate_args(self, request, *args):
         if len(args) < 1:
             raise Http404
-        queryset = Election.objects.all().annotate(
-            total_voters=Count('voters'),
-        ).filter(pk=args[0])
+        queryset = Election.objects.all().filter(pk=args[0])
 
         if not request.user.is_superuser:
             queryset = queryset.filter(creator=request.user, is_finished=True)
@@ -181,17 +190,41 @@ class ElectionResultView(TemplateView):
     def get(self, request, *args, **kwargs):
         self._validate_args(request, *args)
 
-        posts = Post.objects.all().filter(election=self.object).prefetch_related(
-            Prefetch('candidates',
-                     queryset=Candidate.objects.all().annotate(
-                         yes_votes=Sum(
-                             Case(When(votes__vote=VoteTypes.YES, then=1), default=0, output_field=IntegerField())),
-                         no_votes=Sum(
-                             Case(When(votes__vote=VoteTypes.NO, then=1), default=0, output_field=IntegerField())),
-                     ))
-        )
+        if not self.object.is_finished:
+            return super().get(request, *args, results=build_results(self.object), **kwargs)
 
-        return super().get(request, *args, posts=posts, **kwargs)
+        snapshot = get_result_snapshot(self.object)
+        etag = '"%d-%d"' % (self.object.id, snapshot.id)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = super().get(request, *args, results=json.loads(snapshot.data), **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(snapshot.created_at.timestamp())
+        # Browser keeps results but revalidates them, a snapshot is rebuilt when late ballots are recorded
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ElectionTurnoutView(View):
+    """
+    Turnout of an election as JSON, polled by change form every SNAPSHOT_INTERVAL seconds. Turnout comes from cache
+    counters (see election/turnout.py), so a poll is a few cache reads and never holds a worker.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if len(args) < 1:
+            raise Http404
+
+        queryset = Election.objects.all().filter(pk=args[0])
+        if not request.user.is_superuser:
+            queryset = queryset.filter(creator=request.user)
+        election_id = queryset.values_list('pk', flat=True).first()
+        if election_id is None:
+            raise Http404
+
+        # admin_view marks response as never cached
+        return JsonResponse(format_turnout(get_turnout(election_id)))
 
 
 class ElectionPreview(ElectionView):
@@ -207,12 +240,7 @@ class ElectionPreview(ElectionView):
         if view_as == POST_TYPE_DICT[PostTypes.PG]:
             post_types.append(PostTypes.PG)
 
-        election = Election.objects.all().filter(pk=election_id).prefetch_related(
-            Prefetch(
-                'posts',
-                queryset=self._get_base_post_qs(post_types=post_types)
-            )
-        ).order_by('id')
+        election = Election.objects.all().filter(pk=election_id).select_related('creator').order_by('id')
 
         if not self.request.user.is_superuser:
             election = election.filter(creator=self.request.user)
@@ -222,6 +250,7 @@ class ElectionPreview(ElectionView):
         messages.add_message(self.request, messages.INFO, 'Election Preview', AlertTags.INFO)
 
         self.election = election
+        self.ballot = get_ballot(election.id, post_types) if election else EMPTY_BALLOT
         return election
 
     def post(self, request, *args, **kwargs):
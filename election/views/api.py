@@ -0,0 +1,52 @@
+"""
+This file contains JSON APIs for voters
+1. Ballot of next election (BallotAPIView)
+"""
+import hashlib
+
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..serializers import BallotSerializer
+from .election import VoterElectionMixin
+
+
+class BallotAPIView(VoterElectionMixin, APIView):
+    """
+    Returns ballot of the next election of voter. Response carries a strong ETag derived from ballot version and
+    modification time of election, so clients revalidating with If-None-Match get an empty 304 while response is
+    unchanged.
+    """
+    authentication_classes = (SessionAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (JSONRenderer,)
+
+    def _get_etag(self, election):
+        # Ballot version changes with posts and candidates, modified_at with every saved field of election (name,
+        # session timeout, key and manifesto settings) shown in response
+        ballot = self.ballot
+        state = '{}-{}-{}-{}'.format(
+            election.id, '_'.join(map(str, ballot.post_types)), ballot.version, election.modified_at.isoformat(),
+        )
+        return '"{}"'.format(hashlib.sha1(state.encode('utf-8')).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        election = self._get_next_election()
+        if not election:
+            return Response({'detail': 'No election available for you now'}, status=status.HTTP_404_NOT_FOUND)
+
+        headers = {'Cache-Control': 'private, no-cache'}
+        # ETag of a ballot built without version (shared cache can not be read) would not change with its candidates
+        if self.ballot.version is not None:
+            etag = self._get_etag(election)
+            headers['ETag'] = etag
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+            if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        serializer = BallotSerializer(self.ballot, context={'election': election})
+        return Response(serializer.data, headers=headers)
@@ -1,40 +1,114 @@
 import logging
-from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
 from django.db.models import Prefetch
+from django.utils import timezone
 from django.views.generic.base import TemplateView
 
 from account.views import VoterLogoutView
-from core.core import LOGGED_IN_SESSION_KEY, AlertTags, PostTypes, VoteTypes
-from core.security import get_client_ip
-from post.models import Candidate, Post
-from vote.models import Vote, VoteSession, VoteIPMap
-
+from core.core import LOGGED_IN_SESSION_KEY, AlertTags, PostTypes
+from core.security import get_client_ip, get_session_time_left, set_session_timeout
+from vote.journal import get_vote_journal
+from vote.models import VoteIPMap
+from vote.recorder import record_ballot
+
+from ..ballot import EMPTY_BALLOT, get_ballot, render_ballot
+from ..eligibility import get_eligible_election_ids
 from ..models import Election, Voter
 from ..serializers import AddVoteSerializer
+from ..turnout import count_vote
+from ..validation import BallotErrors
 
 logger = logging.getLogger(__name__)
 
+INVALID_DATA_MESSAGE = 'Found invalid data. Attempt is logged'
+
+# Ballot error code -> (log message, message for user)
+BALLOT_ERROR_MESSAGES = {
+    BallotErrors.INVALID_CANDIDATE: ('User has entered a candidate id %s which is not a valid value',
+                                     'Found corrupted data. Incident will be reported'),
+    BallotErrors.MULTIPLE_AUTO_VOTES: ('Multiple entries for non auto candidates (candidate %s)',
+                                       INVALID_DATA_MESSAGE),
+    BallotErrors.NO_FOR_AUTO_CANDIDATE: ('User voted for NO for auto accounts (candidate %s)',
+                                         INVALID_DATA_MESSAGE),
+    BallotErrors.AUTO_WITH_HUMAN_VOTES: ('Entries for normal candidates is present when with auto candidates '
+                                         '(candidate %s)', INVALID_DATA_MESSAGE),
+    BallotErrors.NO_NOT_ALLOWED: ('Voted NO for a post where candidates > post (candidate %s)',
+                                  INVALID_DATA_MESSAGE),
+    BallotErrors.TOO_MANY_VOTES: ('Number of non-neutral votes are greater than number of posts (candidate %s)',
+                                  INVALID_DATA_MESSAGE),
+}
+
+
+def commit_ballot(election, voter_id, votes, client_ip):
+    """
+    Mark voter as voted and record ballot in one transaction. With vote journal enabled, ballot is appended to
+    journal before the transaction commits (see vote/journal.py).
+
+    Returns:
+        (claimed, ip_limit_exceeded). Ballot is stored only if voter is claimed and IP limit is not exceeded.
+    """
+    with transaction.atomic():
+        # Claim voter with a conditional update. Out of concurrent requests of a voter only one can flip
+        # voted from False to True, others find no row to update and create nothing.
+        voted_at = timezone.now()
+        claimed = Voter.objects.filter(pk=voter_id, voted=False).update(voted=True, voted_at=voted_at)
+
+        ip_limit_exceeded = False
+        if claimed:
+            # Count this vote for client IP and check limit with the incremented value, so concurrent votes
+            # from an IP can not read a stale count
+            votes_for_this_ip = VoteIPMap.objects.increment(election.id, client_ip)
+            ip_limit_exceeded = 0 < election.votes_per_ip < votes_for_this_ip
+
+        if ip_limit_exceeded:
+            transaction.set_rollback(True)
+        elif claimed:
+            vote_journal = get_vote_journal()
+            if vote_journal:
+                # Ballot is durable before claim commits, a failed append rolls claim back and voter can vote again.
+                # Record of a claim which does not commit is dropped by flush_vote_journal.
+                vote_journal.append(election.id, votes, voter_id, voted_at)
+            else:
+                record_ballot(election.id, votes, election_finished=election.is_finished)
+
+    return claimed, ip_limit_exceeded
+
+
+class ElectionContext(object):
+    """
+    Next election of a voter along with its voter rows, ballot and votes cast from client IPs
+    """
+
+    def __init__(self, election, ballot):
+        self.election = election
+        self.ballot = ballot
+        self.voters = getattr(election, 'voter', [])
+        self._ip_votes = {}
 
-class ElectionView(LoginRequiredMixin, TemplateView):
-    template_name = 'elections/election_view.html'
+    def get_ip_votes(self, ip):
+        if ip not in self._ip_votes:
+            self._ip_votes[ip] = self.election.vote_ips.filter(ip=ip).values_list('votes', flat=True).first() or 0
+        return self._ip_votes[ip]
 
-    def _get_base_post_qs(self, post_types):
-        return Post.objects.all().filter(
-            type__in=post_types
-        ).order_by('order').prefetch_related(
-            Prefetch('candidates', queryset=Candidate.objects.filter(auto_generated=True).order_by('order'),
-                     to_attr='auto_candidates'),
-            Prefetch('candidates', queryset=Candidate.objects.exclude(auto_generated=True).order_by('order'),
-                     to_attr='human_candidates'),
-        )
 
-    def _get_next_election(self):
-        user = self.request.user
-        profile = user.user_profile
+class VoterElectionMixin(object):
+    """
+    Finds the next election in which current user can vote along with its ballot.
+
+    It is loaded once per request, so POST handlers can hand over to GET without repeating queries.
+    """
+
+    _election_context = None
+    _post_types = None
+
+    def _get_post_types(self):
+        if self._post_types is not None:
+            return self._post_types
+
+        profile = self.request.user.user_profile
 
         # TODO: This is kinda hack-y. Try to clean it up to make it more scalable
         post_types = [PostTypes.ALL]
@@ -42,24 +116,59 @@ class ElectionView(LoginRequiredMixin, TemplateView):
             post_types.append(PostTypes.UG)
         if profile.is_pg:
             post_types.append(PostTypes.PG)
+        self._post_types = post_types
+        return post_types
 
-        election = Election.objects.all().filter(
-            is_active=True, is_temporary_closed=False, is_finished=False,
-            voters__roll_no__iexact=profile.roll_number, voters__voted=False
-        ).prefetch_related(
-            Prefetch(
-                'posts',
-                queryset=self._get_base_post_qs(post_types=post_types),
-            ),
-            Prefetch('voters', queryset=Voter.objects.all().filter(roll_no__iexact=profile.roll_number),
-                     to_attr='voter'),
-        ).order_by('id').first()
+    def _get_next_election(self):
+        user = self.request.user
+        profile = user.user_profile
+
+        # Voters of no open election are answered from cache. Without readable cache voter is looked up in database.
+        election_ids = get_eligible_election_ids(profile.roll_key)
+        election = None
+        if election_ids is None or election_ids:
+            elections = Election.objects.all()
+            if election_ids is not None:
+                elections = elections.filter(pk__in=election_ids)
+            election = elections.filter(
+                is_active=True, is_temporary_closed=False, is_finished=False,
+                voters__roll_key=profile.roll_key, voters__voted=False
+            ).select_related('creator').prefetch_related(
+                Prefetch('voters', queryset=Voter.objects.all().filter(roll_key=profile.roll_key),
+                         to_attr='voter'),
+            ).order_by('id').first()
 
         self.election = election
+        self.ballot = get_ballot(election.id, self._get_post_types()) if election else EMPTY_BALLOT
         return election
 
+    def get_election_context(self) -> ElectionContext:
+        if self._election_context is None:
+            election = self._get_next_election()
+            self._election_context = ElectionContext(election, self.ballot)
+        return self._election_context
+
+    def invalidate_election_context(self):
+        """
+        Forget next election once voter has voted in it. Voter profile and post types are kept.
+        """
+        self._election_context = None
+
+
+class ElectionView(LoginRequiredMixin, VoterElectionMixin, TemplateView):
+    template_name = 'elections/election_view.html'
+
+    def _reject_extra_ip_vote(self, request, election, logging_dict):
+        logger.error('User is voting for extra votes', extra=logging_dict)
+        messages.add_message(request, messages.ERROR,
+                             'Only {} vote(s) are allowed per IP'.format(election.votes_per_ip),
+                             AlertTags.DANGER)
+        request.method = 'POST'
+        return VoterLogoutView.as_view()(request)
+
     def get(self, request, *args, **kwargs):
-        election = self._get_next_election()
+        context = self.get_election_context()
+        election = context.election
 
         # Checked if it is landing page after logging in
         logged_in = LOGGED_IN_SESSION_KEY in request.session
@@ -81,23 +190,17 @@ class ElectionView(LoginRequiredMixin, TemplateView):
         }
 
         if election.votes_per_ip > 0:
-            votes_for_this_ip = election.vote_ips.filter(ip=logging_dict['client_ip']).first()
-            if votes_for_this_ip:
-                if votes_for_this_ip.votes >= election.votes_per_ip:
-                    logger.error('User is voting for extra votes', extra=logging_dict)
-                    messages.add_message(request, messages.ERROR,
-                                         'Only {} vote(s) are allowed per IP'.format(election.votes_per_ip),
-                                         AlertTags.DANGER)
-                    request.method = 'POST'
-                    return VoterLogoutView.as_view()(request)
+            if context.get_ip_votes(logging_dict['client_ip']) >= election.votes_per_ip:
+                return self._reject_extra_ip_vote(request, election, logging_dict)
 
         new_session = kwargs.pop('new_session', False)
         if new_session or logged_in:
-            request.session.set_expiry(timedelta(seconds=election.session_timeout))
-            pass
+            set_session_timeout(request.session, election.session_timeout)
 
         kwargs['election'] = election
-        kwargs['session_timeout'] = request.session.get_expiry_age()
+        kwargs['ballot_html'] = render_ballot(self.ballot, election)
+        time_left = get_session_time_left(request.session)
+        kwargs['session_timeout'] = request.session.get_expiry_age() if time_left is None else time_left
 
         return super().get(request, *args, **kwargs)
 
@@ -113,7 +216,8 @@ class ElectionView(LoginRequiredMixin, TemplateView):
         serialized_data = AddVoteSerializer(data=request.body)
 
         if serialized_data.is_valid():
-            election = self._get_next_election()
+            context = self.get_election_context()
+            election = context.election
 
             if not election:
                 logger.error('User has no valid election left', extra=logging_dict)
@@ -124,21 +228,8 @@ class ElectionView(LoginRequiredMixin, TemplateView):
 
             logging_dict['election'] = election.id
 
-            votes_for_this_ip = None
-
-            if election.votes_per_ip > 0:
-                votes_for_this_ip = election.vote_ips.filter(ip=logging_dict['client_ip']).first()
-                if votes_for_this_ip:
-                    if votes_for_this_ip.votes >= election.votes_per_ip:
-                        logger.error('User is voting for extra votes', extra=logging_dict)
-                        messages.add_message(request, messages.ERROR,
-                                             'Only {} vote(s) are allowed per IP'.format(election.votes_per_ip),
-                                             AlertTags.DANGER)
-                        request.method = 'POST'
-                        return VoterLogoutView.as_view()(request)
-
             # Validate is valid voter
-            voters = election.voter
+            voters = context.voters
             voter = voters[0]
             if len(voters) != 1:
                 logger.error('User is not a valid voter', extra=logging_dict)
@@ -158,114 +249,33 @@ class ElectionView(LoginRequiredMixin, TemplateView):
                     return self.get(request)
 
             # Validate votes
+            # Checks that every vote is for a candidate visible to voter (UG/PG posts) and that votes of every
+            # post follow the rules of BallotValidator
             votes = serialized_data.validated_data['votes']
-            keys = dict()
-            for key, value in votes.items():
-                keys[key] = (False, value)
-
-            # Checks that there is a vote for all candidate in election that are visible to voter
-            # Like it checks for posts for which voter should be allowed to vote (UG/PG)
-            # It also checks if number of non-neutral votes for a post are less then total posts.
-            for post in election.posts.all():
-                non_neutral_nota_votes = 0
-
-                candidate_count = len(post.human_candidates)
-
-                post_processed = False
-
-                for candidate in post.auto_candidates:
-                    if candidate.id in keys:
-                        if post_processed:
-                            logger.error('Multiple entries for non auto candidates', extra=logging_dict)
-                            messages.add_message(request, messages.ERROR,
-                                                 'Found invalid data. Attempt is logged',
-                                                 AlertTags.DANGER)
-                            return self.get(request)
-
-                        keys[candidate.id] = (True, keys[candidate.id][1])
-
-                        # Checking if NO is voted for neutral and NOTA
-                        if keys[candidate.id][1] == VoteTypes.NO:
-                            logger.log('User voted for NO for auto accounts. User is stupid',
-                                       extra=logging_dict)
-                            messages.add_message(request, messages.ERROR,
-                                                 'Found invalid data. Attempt is logged',
-                                                 AlertTags.DANGER)
-                            return self.get(request)
-
-                        post_processed = True
-
-                for candidate in post.human_candidates:
-                    if candidate.id in keys:
-                        if post_processed:
-                            logger.error('Entries for normal candidates is present when with auto candidates',
-                                         extra=logging_dict)
-
-                            messages.add_message(request, messages.ERROR,
-                                                 'Found invalid data. Attempt is logged',
-                                                 AlertTags.DANGER)
-                            return self.get(request)
-
-                        keys[candidate.id] = (True, keys[candidate.id][1])
-
-                        if keys[candidate.id][1] == VoteTypes.NO:
-                            """
-                            Checking if NO vote is casted for a post where candidates > post
-                            """
-                            if candidate_count > post.number:
-                                logger.error('Voted NO for a post where candidates > post', extra=logging_dict)
-                                messages.add_message(request, messages.ERROR,
-                                                     'Found invalid data. Attempt is logged',
-                                                     AlertTags.DANGER)
-                                return self.get(request)
-
-                        non_neutral_nota_votes += 1
-
-                if non_neutral_nota_votes > post.number:
-                    logger.error('Number of non-neutral votes are greater than number of posts', extra=logging_dict)
-                    messages.add_message(request, messages.ERROR,
-                                         'Found invalid data. Attempt is logged',
-                                         AlertTags.DANGER)
-                    return self.get(request)
-
-            # Check if there is an entry present which are not pk for candidates in election available
-            # To person
-            for key, value in keys.items():
-                if not value[0]:
-                    logger.error('User has entered a candidate id %s which is not a valid value', key,
-                                 extra=logging_dict)
-                    messages.add_message(request, messages.ERROR,
-                                         'Found corrupted data. Incident will be reported',
-                                         AlertTags.DANGER)
-                    return self.get(request)
+            error = self.ballot.validator.validate(votes)
+            if error:
+                log_message, user_message = BALLOT_ERROR_MESSAGES[error.code]
+                logger.error(log_message, error.candidate_id, extra=logging_dict)
+                messages.add_message(request, messages.ERROR, user_message, AlertTags.DANGER)
+                return self.get(request)
 
             # create votes
+            claimed, ip_limit_exceeded = commit_ballot(election, voter.pk, votes, logging_dict['client_ip'])
+
+            # Voter has voted in this election now or before, next GET needs the next election
+            self.invalidate_election_context()
+
+            if not claimed:
+                logger.error('User has already voted', extra=logging_dict)
+                messages.add_message(request, messages.ERROR,
+                                     'Your vote has already been recorded. This incident is logged',
+                                     AlertTags.DANGER)
+                return self.get(request)
+
+            if ip_limit_exceeded:
+                return self._reject_extra_ip_vote(request, election, logging_dict)
 
-            with transaction.atomic():
-                # Create Session. Each vote will be associated with a session
-                vote_session = VoteSession.objects.create(election=election)
-
-                if not votes_for_this_ip:
-                    votes_for_this_ip = VoteIPMap(
-                        election=election,
-                        votes=1,
-                        ip=logging_dict['client_ip'],
-                    )
-                else:
-                    votes_for_this_ip.votes += 1
-
-                votes_for_this_ip.save()
-
-                vote_list = []
-                for key, value in keys.items():
-                    vote = Vote(candidate_id=key, session=vote_session)
-                    vote.vote = value[1]
-                    vote_list.append(vote)
-
-                # Add votes to server
-                Vote.objects.bulk_create(vote_list)
-                voter.voted = True
-                voter.save()
+            count_vote(election.id, request.user.user_profile.voter_type)
 
             messages.add_message(request, messages.INFO, 'Your vote has been recorded', AlertTags.SUCCESS)
             return self.get(request, new_session=True)
@@ -4,6 +4,7 @@ from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.templatetags.static import static
 
+from election.ballot import bump_ballot_version
 from post.models import Candidate, Post
 
 
@@ -84,3 +85,25 @@ def auto_delete_file_on_change(sender, instance: Candidate, **kwargs):
                 os.remove(old_manifesto.path)
         except:
             pass
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_ballot(sender, instance: Post, **kwargs) -> None:
+    """
+    Bump ballot version of election so that cached ballots are rebuilt
+    """
+    bump_ballot_version(instance.election_id)
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def invalidate_candidate_ballot(sender, instance: Candidate, **kwargs) -> None:
+    """
+    Bump ballot version of candidate's election so that cached ballots are rebuilt
+    """
+    try:
+        election_id = instance.post.election_id
+    except Post.DoesNotExist:
+        return
+    bump_ballot_version(election_id)
@@ -1,9 +1,7 @@
-import csv
-
 from django.contrib import admin
-from django.http import HttpResponse
 
 from core.admin import RemoveDeleteSelectedMixin
+from core.export import iterate_values, streaming_csv_response
 
 from .models import Vote, VoteSession
 
@@ -29,20 +27,8 @@ class VoteSessionAdmin(RemoveDeleteSelectedMixin, admin.ModelAdmin):
     actions = ['download_data']
 
     def download_data(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="votes_data.csv"'
-        writer = csv.writer(response)
-
-        queryset = queryset.select_related('election')
-        index = 1
-
-        writer.writerow(['S.No.', 'Election Name', 'Timestamp', ])
-
-        for session in queryset:
-            writer.writerow([index, session.election.name, session.timestamp])
-            index += 1
-
-        return response
+        rows = iterate_values(queryset, ['election__name', 'timestamp'])
+        return streaming_csv_response('votes_data.csv', ['S.No.', 'Election Name', 'Timestamp'], rows)
 
     download_data.short_description = 'Download voting data'
 
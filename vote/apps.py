@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class VoteConfig(AppConfig):
     name = 'vote'
+
+    def ready(self):
+        import vote.signals
@@ -0,0 +1,166 @@
+"""
+This module contains the ballot chain, a per election hash chain over committed ballots.
+
+Every ballot recorded by vote.recorder takes next position (VoteSession.chain_index) in chain of its election and
+extends its head in the same transaction:
+
+    head(n) = sha256(head(n - 1) + canonical record of ballot n)
+
+Head is also stored in a BallotChainCheckpoint after every settings.BALLOT_CHAIN_CHECKPOINT_INTERVAL ballots.
+
+Ballots of an election wait for each other on BallotChain row (SELECT FOR UPDATE) until their transaction commits, so
+positions follow commit order. vote.recorder locks the chain as the last step of a ballot, once its session, votes
+and tallies are written, so the part of recording which is serialized per election is one locking read and two
+updates (position of session and chain head) followed by commit. Vote journal flusher (see vote/journal.py) locks a
+chain once per batch, set VOTE_JOURNAL_DIR where an election needs more ballots per second than that allows.
+
+`manage.py verify_ballot_chain` rehashes ballots in chunks and compares heads with checkpoints and chain. Checkpoints
+it passes are marked verified, and next run resumes from last verified checkpoint unless --full is given. Any change,
+removal or reordering of a ballot after a checkpoint changes every later head.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import BallotChain, BallotChainCheckpoint, Vote, VoteSession
+
+GENESIS_HEAD = '0' * 64
+
+_EPOCH = datetime(1970, 1, 1)
+_AWARE_EPOCH = timezone.make_aware(_EPOCH, timezone.utc)
+
+
+class BallotChainError(Exception):
+    pass
+
+
+def _timestamp_us(timestamp):
+    epoch = _AWARE_EPOCH if timezone.is_aware(timestamp) else _EPOCH
+    return (timestamp - epoch) // timedelta(microseconds=1)
+
+
+def hash_ballot(previous_head, election_id, chain_index, session_id, timestamp, votes):
+    """
+    Next head of chain
+
+    Args:
+        votes: dict of candidate id to vote type
+    """
+    record = json.dumps([
+        election_id,
+        chain_index,
+        session_id,
+        _timestamp_us(timestamp),
+        sorted((int(candidate_id), vote) for candidate_id, vote in votes.items()),
+    ], separators=(',', ':'))
+    return hashlib.sha256((previous_head + record).encode('ascii')).hexdigest()
+
+
+def lock_chain(election_id):
+    """
+    Lock chain of an election until end of transaction, creating it if required
+    """
+    chain = BallotChain.objects.select_for_update().filter(election_id=election_id).first()
+    if chain is None:
+        try:
+            with transaction.atomic():
+                chain = BallotChain.objects.create(election_id=election_id, head=GENESIS_HEAD)
+        except IntegrityError:
+            # Created by a concurrent ballot
+            chain = BallotChain.objects.select_for_update().get(election_id=election_id)
+    return chain
+
+
+def extend_chain(chain, ballots):
+    """
+    Add ballots to a chain locked by lock_chain, in order. Sessions of ballots must have been created with
+    chain_index chain.length + 1, chain.length + 2, ...
+
+    Args:
+        chain: BallotChain
+        ballots: list of (session id, timestamp, votes)
+    """
+    interval = settings.BALLOT_CHAIN_CHECKPOINT_INTERVAL
+    checkpoints = []
+    for session_id, timestamp, votes in ballots:
+        chain.length += 1
+        chain.head = hash_ballot(chain.head, chain.election_id, chain.length, session_id, timestamp, votes)
+        if chain.length % interval == 0:
+            checkpoints.append(BallotChainCheckpoint(election_id=chain.election_id, length=chain.length,
+                                                     head=chain.head))
+    chain.save(update_fields=['length', 'head', 'modified_at'])
+    BallotChainCheckpoint.objects.bulk_create(checkpoints)
+
+
+def _iterate_ballots(election_id, start, end, chunk_size):
+    """
+    Yield (chain index, session id, timestamp, votes) of chain positions start + 1 ... end, reading chunk_size
+    ballots at a time
+    """
+    while start < end:
+        stop = min(start + chunk_size, end)
+        sessions = list(VoteSession.objects.filter(
+            election_id=election_id, chain_index__gt=start, chain_index__lte=stop,
+        ).order_by('chain_index').values_list('chain_index', 'id', 'timestamp'))
+
+        votes = defaultdict(dict)
+        for session_id, candidate_id, vote in Vote.objects.filter(
+                session__election_id=election_id, session__chain_index__gt=start, session__chain_index__lte=stop,
+        ).values_list('session_id', 'candidate_id', 'vote'):
+            votes[session_id][candidate_id] = vote
+
+        for chain_index, session_id, timestamp in sessions:
+            yield chain_index, session_id, timestamp, votes[session_id]
+        start = stop
+
+
+def verify_chain(election_id, full=False, chunk_size=1000):
+    """
+    Rehash ballots of an election and compare heads with its checkpoints and chain
+
+    Args:
+        election_id: Election to verify
+        full: Verify from first ballot instead of last verified checkpoint
+        chunk_size: Ballots read per query
+
+    Returns:
+        (first verified position, chain length)
+
+    Raises:
+        BallotChainError: Chain does not match ballots
+    """
+    chain = BallotChain.objects.filter(election_id=election_id).first()
+    if chain is None:
+        return 0, 0
+
+    checkpoints = BallotChainCheckpoint.objects.filter(election_id=election_id, length__lte=chain.length)
+    start = None if full else checkpoints.filter(verified_at__isnull=False).order_by('-length').first()
+    position, head = (start.length, start.head) if start else (0, GENESIS_HEAD)
+    first_position = position
+
+    pending = checkpoints.filter(length__gt=position).order_by('length').values_list('id', 'length', 'head').iterator()
+    checkpoint = next(pending, None)
+
+    ballots = _iterate_ballots(election_id, position, chain.length, chunk_size)
+    for chain_index, session_id, timestamp, votes in ballots:
+        if chain_index != position + 1:
+            raise BallotChainError('Ballot %d of chain is missing' % (position + 1))
+        head = hash_ballot(head, election_id, chain_index, session_id, timestamp, votes)
+        position = chain_index
+
+        if checkpoint and checkpoint[1] == position:
+            if checkpoint[2] != head:
+                raise BallotChainError('Ballots up to %d do not match checkpoint' % position)
+            BallotChainCheckpoint.objects.filter(pk=checkpoint[0]).update(verified_at=timezone.now())
+            checkpoint = next(pending, None)
+
+    if position != chain.length:
+        raise BallotChainError('Ballot %d of chain is missing' % (position + 1))
+    if head != chain.head:
+        raise BallotChainError('Ballots up to %d do not match chain head' % position)
+    return first_position, chain.length
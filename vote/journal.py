@@ -0,0 +1,307 @@
+"""
+This module contains the write-ahead vote journal.
+
+When settings.VOTE_JOURNAL_DIR is set, ElectionView appends every validated ballot to a local append-only journal
+instead of inserting its VoteSession and Votes. A ballot is appended and fsynced inside the transaction which marks its
+voter as voted, before it commits, so a committed claim always has its ballot in journal. Appends of concurrent
+requests in a worker share a single fsync (group commit).
+
+A record carries voter id and voted_at of its claim. A claim which rolls back after its append (commit failed, worker
+died) leaves a record whose voter is not voted, or voted by a later claim with another voted_at. Flusher locks voters
+of a batch and drops such records, so every voter has exactly one ballot in database. Journal links voters to their
+ballots, segments (and *.done segments) must be removed once election results are declared.
+
+Each worker process writes its own segment file. A segment is sealed with a final record once it grows beyond
+settings.VOTE_JOURNAL_SEGMENT_SIZE and a new one is started.
+
+`manage.py flush_vote_journal` moves journal records into database in batches. The flushed offset of every segment is
+stored in JournalCheckpoint in the same transaction as the ballots, so a flusher or worker crash never loses or
+duplicates a ballot: the next flush resumes from the checkpoint. Records whose key is already in database are skipped,
+so flushing a segment again from an older offset is harmless. Fully flushed sealed segments are renamed to
+*.done.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from election.models import Voter
+
+from .models import JournalCheckpoint
+from .recorder import JournalBallot, record_ballots
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.journal'
+DONE_SUFFIX = '.done'
+
+
+class CorruptRecord(Exception):
+    pass
+
+
+def encode_record(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return b'%08x ' % zlib.crc32(payload) + payload + b'\n'
+
+
+def decode_record(line: bytes) -> dict:
+    try:
+        checksum, payload = line.rstrip(b'\n').split(b' ', 1)
+        if int(checksum, 16) != zlib.crc32(payload):
+            raise CorruptRecord(line)
+        return json.loads(payload.decode('utf-8'))
+    except ValueError:
+        raise CorruptRecord(line)
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class VoteJournal(object):
+    """
+    Journal writer of a worker process. It is thread safe and reopens its segment after a fork.
+    """
+
+    def __init__(self, directory, segment_size):
+        self.directory = directory
+        self.segment_size = segment_size
+        # Lock order is always _sync_condition -> _write_lock
+        self._write_lock = threading.Lock()
+        self._sync_condition = threading.Condition()
+        self._file = None
+        self._pid = None
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._sequence = 0
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Sequence keeps names of segments rotated within a millisecond apart
+        self._sequence += 1
+        name = '%s-%d-%d-%d%s' % (socket.gethostname(), os.getpid(), int(time.time() * 1000), self._sequence,
+                                  SEGMENT_SUFFIX)
+        self._file = open(os.path.join(self.directory, name), 'ab')
+        self._pid = os.getpid()
+        _fsync_directory(self.directory)
+
+    def _seal_segment(self):
+        self._file.write(encode_record({'sealed': True}))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._synced = self._written
+
+    def _needs_new_segment(self):
+        return self._file is None or self._pid != os.getpid() or self._file.tell() >= self.segment_size
+
+    def _rotate(self):
+        with self._sync_condition:
+            # A segment can not be closed while its fsync is running
+            while self._syncing:
+                self._sync_condition.wait()
+            with self._write_lock:
+                if not self._needs_new_segment():
+                    return
+                if self._file is not None and self._pid == os.getpid():
+                    self._seal_segment()
+                else:
+                    # Segment is inherited from parent process, it belongs to parent
+                    self._file = None
+                    self._written = self._synced = 0
+                self._open_segment()
+
+    def _sync(self, sequence):
+        with self._sync_condition:
+            while self._synced < sequence:
+                if self._syncing:
+                    self._sync_condition.wait()
+                    continue
+
+                # This thread becomes leader and fsyncs records of all threads written till now
+                self._syncing = True
+                with self._write_lock:
+                    target = self._written
+                    fd = self._file.fileno()
+                self._sync_condition.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._sync_condition.acquire()
+                    self._syncing = False
+                    self._sync_condition.notify_all()
+                self._synced = max(self._synced, target)
+
+    def append(self, election_id, votes: dict, voter_id, voted_at) -> str:
+        """
+        Append a ballot to journal and wait till it is durable
+
+        Args:
+            voter_id: Voter claimed for ballot
+            voted_at: voted_at set by claim
+
+        Returns:
+            Key of journal record
+        """
+        key = uuid.uuid4().hex
+        line = encode_record({
+            'key': key,
+            'election': election_id,
+            'votes': votes,
+            'timestamp': time.time(),
+            'voter': voter_id,
+            'voted_at': voted_at.isoformat(),
+        })
+
+        with self._write_lock:
+            needs_new_segment = self._needs_new_segment()
+        if needs_new_segment:
+            self._rotate()
+
+        with self._write_lock:
+            self._file.write(line)
+            self._file.flush()
+            self._written += 1
+            sequence = self._written
+
+        self._sync(sequence)
+        return key
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_vote_journal():
+    """
+    Get journal writer of this process, None if vote journal is disabled
+    """
+    global _journal
+    if not settings.VOTE_JOURNAL_DIR:
+        return None
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = VoteJournal(settings.VOTE_JOURNAL_DIR, settings.VOTE_JOURNAL_SEGMENT_SIZE)
+    return _journal
+
+
+def read_records(path, offset):
+    """
+    Yield (record, offset after record) for complete records of a segment starting at offset. A partially written
+    last record is left for next read.
+    """
+    with open(path, 'rb') as segment:
+        segment.seek(offset)
+        for line in segment:
+            if not line.endswith(b'\n'):
+                return
+            offset += len(line)
+            yield decode_record(line), offset
+
+
+def _to_ballot(record):
+    return JournalBallot(
+        key=record['key'],
+        election_id=record['election'],
+        votes={int(candidate_id): vote for candidate_id, vote in record['votes'].items()},
+        timestamp=datetime.fromtimestamp(record['timestamp'], tz=timezone.utc),
+    )
+
+
+def _claimed_ballots(records):
+    """
+    Ballots of records whose claim committed. Voters are locked, so a claim still committing is waited for.
+    """
+    voted_at = dict(Voter.objects.select_for_update().filter(
+        pk__in={record['voter'] for record in records}, voted=True,
+    ).order_by('pk').values_list('pk', 'voted_at'))
+
+    ballots = [_to_ballot(record) for record in records
+               if voted_at.get(record['voter']) == parse_datetime(record['voted_at'])]
+    if len(ballots) < len(records):
+        logger.warning('%d journal records of claims which did not commit dropped', len(records) - len(ballots))
+    return ballots
+
+
+def _flush_batch(checkpoint, records, offset):
+    with transaction.atomic():
+        # Checkpoint is written first, so SQLite, which has no row locks, waits here for claims being committed
+        JournalCheckpoint.objects.filter(pk=checkpoint.pk).update(offset=offset)
+        if records:
+            record_ballots(_claimed_ballots(records))
+    checkpoint.offset = offset
+
+
+def flush_segment(path, batch_size):
+    """
+    Flush unflushed records of a segment to database
+
+    Returns:
+        Number of ballots flushed
+    """
+    checkpoint, _ = JournalCheckpoint.objects.get_or_create(segment=os.path.basename(path))
+    flushed = 0
+    sealed = False
+    batch = []
+    offset = checkpoint.offset
+
+    try:
+        for record, offset in read_records(path, checkpoint.offset):
+            if record.get('sealed'):
+                sealed = True
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _flush_batch(checkpoint, batch, offset)
+                flushed += len(batch)
+                batch = []
+    finally:
+        # Records read before a corrupt record are still flushed
+        if batch or offset != checkpoint.offset:
+            _flush_batch(checkpoint, batch, offset)
+            flushed += len(batch)
+
+    if sealed:
+        os.rename(path, path + DONE_SUFFIX)
+
+    return flushed
+
+
+def flush_journal(directory, batch_size):
+    """
+    Flush all segments of a journal directory to database
+
+    Returns:
+        Number of ballots flushed
+    """
+    if not os.path.isdir(directory):
+        return 0
+
+    flushed = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SEGMENT_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            flushed += flush_segment(path, batch_size)
+        except CorruptRecord:
+            logger.exception('Corrupt record found in vote journal segment %s', path)
+    return flushed
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vote.journal import flush_journal
+
+
+class Command(BaseCommand):
+    help = 'Move ballots from vote journal to database. Also replays unflushed ballots after a crash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.VOTE_JOURNAL_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep flushing till interrupted')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between flushes with --loop')
+
+    def handle(self, *args, **options):
+        if not settings.VOTE_JOURNAL_DIR:
+            raise CommandError('VOTE_JOURNAL_DIR is not set')
+
+        while True:
+            flushed = flush_journal(settings.VOTE_JOURNAL_DIR, options['batch_size'])
+            if flushed or not options['loop']:
+                self.stdout.write('%d ballots flushed' % flushed)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from election.models import Election
+from post.models import Candidate
+from vote.models import CandidateTally
+from vote.results import delete_result_snapshots
+
+
+class Command(BaseCommand):
+    help = ('Recompute candidate tallies from recorded votes. Run it when no votes are being recorded for given '
+            'elections, e.g. after flushing vote journal of a finished election.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_ids', nargs='*', type=int, help='Elections to rebuild, all if not given')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if an election is accepting votes')
+
+    def handle(self, *args, **options):
+        elections = Election.objects.all()
+        if options['election_ids']:
+            elections = elections.filter(pk__in=options['election_ids'])
+
+        accepting_votes = elections.filter(is_active=True, is_finished=False, is_temporary_closed=False)
+        if accepting_votes.exists() and not options['force']:
+            raise CommandError('Elections %s are accepting votes, use --force to rebuild anyway' %
+                               ', '.join(str(pk) for pk in accepting_votes.values_list('pk', flat=True)))
+
+        for election in elections:
+            candidate_ids = Candidate.objects.filter(post__election=election).values_list('pk', flat=True)
+            rebuilt = CandidateTally.objects.rebuild(candidate_ids)
+            delete_result_snapshots([election.id])
+            self.stdout.write('%s: %d tallies rebuilt' % (election, rebuilt))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from election.models import Election
+from vote.chain import BallotChainError, verify_chain
+from vote.models import VoteSession
+
+
+class Command(BaseCommand):
+    help = ('Verify ballot chains of elections against recorded ballots. Verification resumes from last verified '
+            'checkpoint of each election unless --full is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_ids', nargs='*', type=int, help='Elections to verify, all if not given')
+        parser.add_argument('--full', action='store_true', help='Verify every chain from its first ballot')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Ballots read per query')
+
+    def handle(self, *args, **options):
+        elections = Election.objects.all().order_by('pk')
+        if options['election_ids']:
+            elections = elections.filter(pk__in=options['election_ids'])
+
+        failed = []
+        for election in elections:
+            try:
+                start, length = verify_chain(election.id, full=options['full'], chunk_size=options['chunk_size'])
+            except BallotChainError as error:
+                failed.append(election)
+                self.stderr.write('%s: %s' % (election, error))
+                continue
+
+            self.stdout.write('%s: ballots %d to %d verified' % (election, start + 1, length) if length > start else
+                              '%s: no new ballots to verify' % election)
+            unchained = VoteSession.objects.filter(election=election, chain_index__isnull=True).count()
+            if unchained:
+                self.stdout.write('%s: %d ballots were recorded before ballot chain and are not verified' %
+                                  (election, unchained))
+
+        if failed:
+            raise CommandError('Ballot chains of %s do not match their ballots' %
+                               ', '.join(str(election) for election in failed))
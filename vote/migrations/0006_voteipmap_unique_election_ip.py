@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 08:34
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_ips(apps, schema_editor):
+    """
+    Merge rows of same (election, ip) into one before adding unique constraint
+    """
+    VoteIPMap = apps.get_model('vote', 'VoteIPMap')
+    duplicates = VoteIPMap.objects.values('election_id', 'ip').annotate(
+        rows=Count('id'), total_votes=Sum('votes'),
+    ).filter(rows__gt=1)
+
+    for duplicate in duplicates:
+        rows = VoteIPMap.objects.filter(election_id=duplicate['election_id'], ip=duplicate['ip']).order_by('id')
+        first = rows.first()
+        rows.exclude(pk=first.pk).delete()
+        rows.filter(pk=first.pk).update(votes=duplicate['total_votes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0005_auto_20160312_0341'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ips, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='voteipmap',
+            unique_together=set([('election', 'ip')]),
+        ),
+    ]
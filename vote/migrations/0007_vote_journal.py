@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 08:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vote', '0006_voteipmap_unique_election_ip'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=255, unique=True)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='votesession',
+            name='journal_key',
+            field=models.CharField(editable=False, help_text='Key of vote journal entry this session is flushed from', max_length=32, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='votesession',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 08:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Case, Count, When
+import django.db.models.deletion
+
+
+def backfill_tallies(apps, schema_editor):
+    Vote = apps.get_model('vote', 'Vote')
+    CandidateTally = apps.get_model('vote', 'CandidateTally')
+
+    counts = Vote.objects.order_by().values('candidate_id').annotate(
+        yes_votes=Count(Case(When(vote=1, then=1))),
+        no_votes=Count(Case(When(vote=-1, then=1))),
+        total_votes=Count('id'),
+    )
+    CandidateTally.objects.bulk_create([CandidateTally(**count) for count in counts], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_candidate_manifesto'),
+        ('vote', '0007_vote_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateTally',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('yes_votes', models.PositiveIntegerField(default=0)),
+                ('no_votes', models.PositiveIntegerField(default=0)),
+                ('total_votes', models.PositiveIntegerField(default=0)),
+                ('candidate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='post.Candidate')),
+            ],
+        ),
+        migrations.RunPython(backfill_tallies, migrations.RunPython.noop),
+    ]
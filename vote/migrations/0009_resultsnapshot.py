@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 09:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('election', '0008_voterimportjob'),
+        ('vote', '0008_candidatetally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.TextField(help_text='JSON results built by vote.results.build_results')),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result_snapshot', to='election.Election')),
+            ],
+        ),
+    ]
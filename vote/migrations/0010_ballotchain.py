@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.3 on 2026-10-18 09:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('election', '0008_voterimportjob'),
+        ('vote', '0009_resultsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BallotChain',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.PositiveIntegerField(default=0)),
+                ('head', models.CharField(max_length=64)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ballot_chain', to='election.Election')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BallotChainCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.PositiveIntegerField()),
+                ('head', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('verified_at', models.DateTimeField(blank=True, help_text='Last time chain up to this checkpoint was verified', null=True)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ballot_chain_checkpoints', to='election.Election')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='votesession',
+            name='chain_index',
+            field=models.PositiveIntegerField(editable=False, help_text='Position of this ballot in ballot chain of election', null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='votesession',
+            unique_together=set([('election', 'chain_index')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ballotchaincheckpoint',
+            unique_together=set([('election', 'length')]),
+        ),
+    ]
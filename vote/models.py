@@ -1,27 +1,225 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, When
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
-from core.core import VOTE_TYPE_CHOICES
+from core.core import VOTE_TYPE_CHOICES, VoteTypes
+from core.db import supports_upsert
 from election.models import Election
 from post.models import Candidate
 
 
 class VoteSession(models.Model):
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     election = models.ForeignKey(Election, related_name='vote_sessions', null=True)
+    journal_key = models.CharField(max_length=32, unique=True, null=True, editable=False,
+                                   help_text='Key of vote journal entry this session is flushed from')
+    chain_index = models.PositiveIntegerField(null=True, editable=False,
+                                              help_text='Position of this ballot in ballot chain of election')
+
+    class Meta:
+        unique_together = ['election', 'chain_index']
 
     def __str__(self):
         return str(self.timestamp)
 
 
+class VoteIPMapManager(models.Manager):
+
+    def increment(self, election_id, ip):
+        """
+        Increment votes of an IP for an election, creating the row if required.
+
+        It is done with a single upsert statement where database supports it, so concurrent votes from same IP
+        never lose an increment. Rows written this way do not create history records.
+
+        Returns:
+            Votes of IP including this one
+        """
+        connection = connections[self.db]
+        if supports_upsert(connection):
+            table = self.model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO {table} (election_id, ip, votes) VALUES (%s, %s, 1) '
+                    'ON CONFLICT (election_id, ip) DO UPDATE SET votes = {table}.votes + 1 '
+                    'RETURNING votes'.format(table=table),
+                    [election_id, ip],
+                )
+                return cursor.fetchone()[0]
+
+        queryset = self.filter(election_id=election_id, ip=ip)
+        if not queryset.update(votes=F('votes') + 1):
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(election_id=election_id, ip=ip, votes=1)
+                return 1
+            except IntegrityError:
+                queryset.update(votes=F('votes') + 1)
+        return queryset.values_list('votes', flat=True).get()
+
+
 class VoteIPMap(models.Model):
     election = models.ForeignKey(Election, related_name='vote_ips')
     ip = models.GenericIPAddressField()
     votes = models.PositiveIntegerField(default=1)
     history = HistoricalRecords()
 
+    objects = VoteIPMapManager()
+
+    class Meta:
+        unique_together = ['election', 'ip']
+
 
 class Vote(models.Model):
     session = models.ForeignKey(VoteSession, related_name='votes')
     candidate = models.ForeignKey(Candidate, related_name='votes')
     vote = models.SmallIntegerField(choices=VOTE_TYPE_CHOICES, null=True, blank=True)
+
+
+class CandidateTallyManager(models.Manager):
+
+    def add_votes(self, votes):
+        """
+        Add votes to tallies of their candidates. Must be called in the transaction which creates the votes.
+
+        Tallies are upserted with a single statement where database supports it. Rows are written in candidate order,
+        so concurrent ballots of an election wait for each other instead of deadlocking.
+
+        Args:
+            votes: iterable of Vote
+        """
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for vote in votes:
+            delta = deltas[vote.candidate_id]
+            delta[0] += vote.vote == VoteTypes.YES
+            delta[1] += vote.vote == VoteTypes.NO
+            delta[2] += 1
+        rows = sorted(deltas.items())
+        if not rows:
+            return
+
+        connection = connections[self.db]
+        if supports_upsert(connection):
+            table = self.model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO {table} (candidate_id, yes_votes, no_votes, total_votes) VALUES {values} '
+                    'ON CONFLICT (candidate_id) DO UPDATE SET '
+                    'yes_votes = {table}.yes_votes + EXCLUDED.yes_votes, '
+                    'no_votes = {table}.no_votes + EXCLUDED.no_votes, '
+                    'total_votes = {table}.total_votes + EXCLUDED.total_votes'.format(
+                        table=table, values=', '.join(['(%s, %s, %s, %s)'] * len(rows))),
+                    [value for candidate_id, delta in rows for value in [candidate_id] + delta],
+                )
+            return
+
+        for candidate_id, (yes_votes, no_votes, total_votes) in rows:
+            queryset = self.filter(candidate_id=candidate_id)
+            increments = {
+                'yes_votes': F('yes_votes') + yes_votes,
+                'no_votes': F('no_votes') + no_votes,
+                'total_votes': F('total_votes') + total_votes,
+            }
+            if queryset.update(**increments):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(candidate_id=candidate_id, yes_votes=yes_votes, no_votes=no_votes,
+                                total_votes=total_votes)
+            except IntegrityError:
+                queryset.update(**increments)
+
+    def rebuild(self, candidate_ids):
+        """
+        Recompute tallies of candidates from their votes. Votes cast while it runs may be missed, so run it when no
+        votes are being recorded for these candidates.
+
+        Returns:
+            Number of tallies written
+        """
+        candidate_ids = list(candidate_ids)
+        votes = Vote.objects.using(self.db).filter(candidate_id__in=candidate_ids)
+        counts = votes.order_by().values('candidate_id').annotate(
+            yes_votes=Count(Case(When(vote=VoteTypes.YES, then=1))),
+            no_votes=Count(Case(When(vote=VoteTypes.NO, then=1))),
+            total_votes=Count('id'),
+        )
+        tallies = [self.model(**count) for count in counts]
+
+        with transaction.atomic(using=self.db):
+            self.filter(candidate_id__in=candidate_ids).delete()
+            self.bulk_create(tallies)
+        return len(tallies)
+
+
+class CandidateTally(models.Model):
+    """
+    Vote counts of a candidate, kept up to date by vote.recorder as ballots are recorded
+    """
+    candidate = models.OneToOneField(Candidate, related_name='tally')
+    yes_votes = models.PositiveIntegerField(default=0)
+    no_votes = models.PositiveIntegerField(default=0)
+    total_votes = models.PositiveIntegerField(default=0)
+
+    objects = CandidateTallyManager()
+
+    def __str__(self):
+        return '%s: %d yes, %d no' % (self.candidate_id, self.yes_votes, self.no_votes)
+
+
+class JournalCheckpoint(models.Model):
+    """
+    Offset up to which a vote journal segment has been flushed to database
+    """
+    segment = models.CharField(max_length=255, unique=True)
+    offset = models.BigIntegerField(default=0)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '%s:%d' % (self.segment, self.offset)
+
+
+class ResultSnapshot(models.Model):
+    """
+    Results of a finished election, stored once it finishes (see vote/results.py)
+    """
+    election = models.OneToOneField(Election, related_name='result_snapshot')
+    created_at = models.DateTimeField(auto_now_add=True)
+    data = models.TextField(help_text='JSON results built by vote.results.build_results')
+
+    def __str__(self):
+        return str(self.election_id)
+
+
+class BallotChain(models.Model):
+    """
+    Head of hash chain over committed ballots of an election (see vote/chain.py)
+    """
+    election = models.OneToOneField(Election, related_name='ballot_chain')
+    length = models.PositiveIntegerField(default=0)
+    head = models.CharField(max_length=64)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '%s:%d' % (self.election_id, self.length)
+
+
+class BallotChainCheckpoint(models.Model):
+    """
+    Head of ballot chain of an election after every settings.BALLOT_CHAIN_CHECKPOINT_INTERVAL ballots
+    """
+    election = models.ForeignKey(Election, related_name='ballot_chain_checkpoints')
+    length = models.PositiveIntegerField()
+    head = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    verified_at = models.DateTimeField(null=True, blank=True,
+                                       help_text='Last time chain up to this checkpoint was verified')
+
+    class Meta:
+        unique_together = ['election', 'length']
+
+    def __str__(self):
+        return '%s:%d' % (self.election_id, self.length)
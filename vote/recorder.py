@@ -0,0 +1,101 @@
+"""
+This module stores cast ballots into database. Every ballot becomes a VoteSession and one Vote per voted candidate,
+and its votes are added to CandidateTally of the candidates and to ballot chain of its election (see vote/chain.py)
+in the same transaction.
+
+It is used both by ElectionView, which records a ballot as soon as it is cast, and by the vote journal flusher,
+which records batches of ballots written ahead to the journal (see vote/journal.py).
+
+Ballot chain of an election is locked last, once sessions, votes and tallies are written, so ballots of an election
+wait for each other only while their chain positions are assigned and the chain is extended.
+"""
+from collections import namedtuple
+
+from django.db import connection
+
+from core.db import bulk_update_values
+
+from .chain import extend_chain, lock_chain
+from .models import CandidateTally, Vote, VoteSession
+from .results import delete_result_snapshots
+
+JournalBallot = namedtuple('JournalBallot', ['key', 'election_id', 'votes', 'timestamp'])
+
+
+def _build_votes(session_id, votes):
+    return [Vote(session_id=session_id, candidate_id=candidate_id, vote=vote) for candidate_id, vote in votes.items()]
+
+
+def record_ballot(election_id, votes: dict, election_finished=False) -> VoteSession:
+    """
+    Record a single ballot. Must be called inside a transaction.
+
+    Args:
+        election_id: Election of ballot
+        votes: dict of candidate id to vote type
+        election_finished: Election is finished, so its result snapshot must be dropped. Only finished elections have
+            a snapshot, see vote/results.py.
+    """
+    session = VoteSession.objects.create(election_id=election_id)
+    vote_list = _build_votes(session.id, votes)
+    Vote.objects.bulk_create(vote_list)
+    CandidateTally.objects.add_votes(vote_list)
+    if election_finished:
+        delete_result_snapshots([election_id])
+
+    chain = lock_chain(election_id)
+    session.chain_index = chain.length + 1
+    VoteSession.objects.filter(pk=session.pk).update(chain_index=session.chain_index)
+    extend_chain(chain, [(session.id, session.timestamp, votes)])
+    return session
+
+
+def record_ballots(ballots) -> None:
+    """
+    Record a batch of journal ballots with multi-row inserts. Must be called inside a transaction.
+
+    Sessions are inserted first and their ids are read back by journal key, as bulk_create does not return ids.
+    Ballots whose journal key is already recorded are skipped, so replaying journal records is idempotent.
+
+    Args:
+        ballots: list of JournalBallot
+    """
+    recorded_keys = set(VoteSession.objects.filter(
+        journal_key__in=[ballot.key for ballot in ballots]
+    ).values_list('journal_key', flat=True))
+    unique_ballots = []
+    for ballot in ballots:
+        if ballot.key not in recorded_keys:
+            recorded_keys.add(ballot.key)
+            unique_ballots.append(ballot)
+    ballots = unique_ballots
+    if not ballots:
+        return
+
+    VoteSession.objects.bulk_create([
+        VoteSession(election_id=ballot.election_id, journal_key=ballot.key, timestamp=ballot.timestamp)
+        for ballot in ballots
+    ])
+    session_ids = dict(VoteSession.objects.filter(
+        journal_key__in=[ballot.key for ballot in ballots]
+    ).values_list('journal_key', 'id'))
+
+    vote_list = []
+    for ballot in ballots:
+        vote_list.extend(_build_votes(session_ids[ballot.key], ballot.votes))
+    Vote.objects.bulk_create(vote_list)
+    CandidateTally.objects.add_votes(vote_list)
+
+    # Ballots flushed after an election finished change its results
+    delete_result_snapshots({ballot.election_id for ballot in ballots})
+
+    # Chains are locked in election order, so concurrent flushers can not deadlock
+    chain_indexes = []
+    for election_id in sorted({ballot.election_id for ballot in ballots}):
+        chain = lock_chain(election_id)
+        chain_ballots = [(session_ids[ballot.key], ballot.timestamp, ballot.votes)
+                         for ballot in ballots if ballot.election_id == election_id]
+        chain_indexes.extend((session_id, chain.length + position)
+                             for position, (session_id, _, _) in enumerate(chain_ballots, 1))
+        extend_chain(chain, chain_ballots)
+    bulk_update_values(connection, VoteSession, 'chain_index', chain_indexes)
@@ -0,0 +1,98 @@
+"""
+This module contains results of elections.
+
+Results of a finished election can no longer change, so they are built once into a ResultSnapshot when election is
+finished (see vote/signals.py) and ElectionResultView serves the stored snapshot without aggregate queries. A snapshot
+is deleted if its election is reopened or receives ballots afterwards (flushed from vote journal, or tallies rebuilt),
+and is built again when results are next viewed.
+"""
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Coalesce
+
+from election.models import Voter
+from post.models import Candidate, Post
+
+from .models import ResultSnapshot
+
+
+def _get_winners(candidates, number):
+    """
+    Top `number` candidates by yes votes. NOTA and neutral candidates never win.
+
+    Returns:
+        (winner ids, True if last winner is tied with next candidate)
+    """
+    ranked = sorted((candidate for candidate in candidates if not candidate['is_nota'] and not candidate['is_neutral']),
+                    key=lambda candidate: (-candidate['yes_votes'], candidate['no_votes']))
+    winners = ranked[:number]
+    tie = 0 < len(winners) < len(ranked) and ranked[len(winners)]['yes_votes'] == winners[-1]['yes_votes']
+    return [candidate['id'] for candidate in winners], tie
+
+
+def build_results(election):
+    """
+    Results of an election from candidate tallies
+
+    Returns:
+        dict with total_voters, voted, turnout (percentage) and posts. Each post has id, name, number, type,
+        candidates (id, name, yes_votes, no_votes, is_nota, is_neutral, is_winner), nota_votes, neutral_votes and
+        tie (True if last winner is tied with a losing candidate).
+    """
+    total_voters = Voter.objects.filter(election=election).count()
+    voted = Voter.objects.filter(election=election, voted=True).count()
+
+    candidates_by_post = {}
+    candidates = Candidate.objects.filter(post__election=election).annotate(
+        yes_votes=Coalesce('tally__yes_votes', 0),
+        no_votes=Coalesce('tally__no_votes', 0),
+    ).order_by('order', 'id').values('id', 'name', 'post_id', 'is_nota', 'is_neutral', 'yes_votes', 'no_votes')
+    for candidate in candidates:
+        candidates_by_post.setdefault(candidate.pop('post_id'), []).append(candidate)
+
+    posts = []
+    for post in Post.objects.filter(election=election).order_by('order', 'id').values('id', 'name', 'number', 'type'):
+        post_candidates = candidates_by_post.get(post['id'], [])
+        winner_ids, post['tie'] = _get_winners(post_candidates, post['number'])
+        for candidate in post_candidates:
+            candidate['is_winner'] = candidate['id'] in winner_ids
+        post['candidates'] = post_candidates
+        post['nota_votes'] = sum(candidate['yes_votes'] for candidate in post_candidates if candidate['is_nota'])
+        post['neutral_votes'] = sum(candidate['yes_votes'] for candidate in post_candidates if candidate['is_neutral'])
+        posts.append(post)
+
+    return {
+        'total_voters': total_voters,
+        'voted': voted,
+        'turnout': round(voted * 100 / total_voters, 1) if total_voters else 0,
+        'posts': posts,
+    }
+
+
+def create_result_snapshot(election):
+    """
+    Store results of a finished election, replacing its existing snapshot
+    """
+    data = json.dumps(build_results(election), separators=(',', ':'))
+    with transaction.atomic():
+        ResultSnapshot.objects.filter(election=election).delete()
+        return ResultSnapshot.objects.create(election=election, data=data)
+
+
+def get_result_snapshot(election):
+    """
+    Stored results of a finished election, built now if missing
+    """
+    snapshot = ResultSnapshot.objects.filter(election=election).first()
+    if snapshot is None:
+        try:
+            snapshot = create_result_snapshot(election)
+        except IntegrityError:
+            # Built by a concurrent request
+            snapshot = ResultSnapshot.objects.get(election=election)
+    return snapshot
+
+
+def delete_result_snapshots(election_ids):
+    ResultSnapshot.objects.filter(election_id__in=election_ids).delete()
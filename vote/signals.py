@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from election.models import Election
+
+from .results import delete_result_snapshots, get_result_snapshot
+
+
+@receiver(post_save, sender=Election)
+def snapshot_finished_election_results(sender, instance: Election, **kwargs) -> None:
+    """
+    Store results once election is finished (after its transaction commits), drop them if it is reopened
+    """
+    if instance.is_finished:
+        transaction.on_commit(lambda: get_result_snapshot(instance))
+    else:
+        delete_result_snapshots([instance.id])
@@ -1,3 +1,458 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+
+from core.core import VoteTypes
+from election.models import Election, Voter
+from election.views.election import commit_ballot
+from post.models import Candidate, Post
+
+from .chain import BallotChainError, verify_chain
+from .journal import DONE_SUFFIX, SEGMENT_SUFFIX, VoteJournal, encode_record, flush_journal, read_records
+from .models import BallotChain, CandidateTally, JournalCheckpoint, ResultSnapshot, Vote, VoteIPMap, VoteSession
+from .recorder import JournalBallot, record_ballot, record_ballots
+
+
+class VoteIPMapTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator)
+        self.other_election = Election.objects.create(name='Hostel Election', creator=creator)
+
+    def _assert_increments(self):
+        self.assertEqual(VoteIPMap.objects.increment(self.election.id, '10.0.0.1'), 1)
+        self.assertEqual(VoteIPMap.objects.increment(self.election.id, '10.0.0.1'), 2)
+        self.assertEqual(VoteIPMap.objects.increment(self.election.id, '10.0.0.1'), 3)
+        self.assertEqual(VoteIPMap.objects.increment(self.election.id, '10.0.0.2'), 1)
+        self.assertEqual(VoteIPMap.objects.increment(self.other_election.id, '10.0.0.1'), 1)
+
+        self.assertEqual(sorted(VoteIPMap.objects.values_list('election_id', 'ip', 'votes')), [
+            (self.election.id, '10.0.0.1', 3),
+            (self.election.id, '10.0.0.2', 1),
+            (self.other_election.id, '10.0.0.1', 1),
+        ])
+
+    def test_increment(self):
+        self._assert_increments()
+
+    @mock.patch('vote.models.supports_upsert', return_value=False)
+    def test_increment_without_upsert(self, _):
+        self._assert_increments()
+
+    @mock.patch('vote.models.supports_upsert', return_value=False)
+    def test_increment_without_upsert_after_concurrent_insert(self, _):
+        VoteIPMap.objects.create(election=self.election, ip='10.0.0.1', votes=1)
+        update = QuerySet.update
+        calls = []
+
+        def update_missing_row_once(queryset, **kwargs):
+            # First update runs before the other request inserts the row, so the row is not found
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update_missing_row_once):
+            self.assertEqual(VoteIPMap.objects.increment(self.election.id, '10.0.0.1'), 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(VoteIPMap.objects.get().votes, 2)
+
+
+class VoteJournalTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='vote_journal_')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=self.election)
+        self.candidate = Candidate.objects.create(name='Candidate', post=post)
+        self.votes = {str(self.candidate.id): VoteTypes.YES}
+
+    def _claim_voter(self):
+        voter = Voter.objects.create(roll_no='1400500%02d' % Voter.objects.count(), election=self.election,
+                                     voted=True, voted_at=timezone.now())
+        return voter.pk, voter.voted_at
+
+    def _append(self, journal):
+        return journal.append(self.election.id, self.votes, *self._claim_voter())
+
+    def _segments(self, suffix=SEGMENT_SUFFIX):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(suffix))
+
+    def _read_keys(self):
+        return [record['key'] for name in self._segments() + self._segments(DONE_SUFFIX)
+                for record, _ in read_records(os.path.join(self.directory, name), 0) if 'key' in record]
+
+    def _assert_recorded(self, count):
+        self.assertEqual(VoteSession.objects.count(), count)
+        self.assertEqual(CandidateTally.objects.get(candidate=self.candidate).yes_votes, count)
+
+    def test_concurrent_appends_share_fsync(self):
+        journal = VoteJournal(self.directory, segment_size=1024 * 1024)
+        self._append(journal)
+        appends = 8
+        barrier = threading.Barrier(appends)
+        fsync = os.fsync
+        fsyncs = []
+
+        def slow_fsync(fd):
+            fsyncs.append(fd)
+            # Appends of other threads are written while leader syncs
+            time.sleep(0.05)
+            fsync(fd)
+
+        def append():
+            barrier.wait()
+            keys.append(journal.append(self.election.id, self.votes, *claims.pop()))
+
+        keys = []
+        claims = [self._claim_voter() for _ in range(appends)]
+        threads = [threading.Thread(target=append) for _ in range(appends)]
+        with mock.patch('vote.journal.os.fsync', slow_fsync):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(keys), appends)
+        self.assertLess(len(fsyncs), appends)
+        self.assertEqual(len(self._read_keys()), appends + 1)
+
+    def test_segments_are_sealed_and_rotated(self):
+        # Every record fills a segment
+        journal = VoteJournal(self.directory, segment_size=1)
+        keys = [self._append(journal) for _ in range(3)]
+        self.assertEqual(len(self._segments()), 3)
+        self.assertEqual(self._read_keys(), keys)
+
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 3)
+        self._assert_recorded(3)
+        # Sealed segments are done, segment being written stays
+        self.assertEqual(len(self._segments(DONE_SUFFIX)), 2)
+        self.assertEqual(len(self._segments()), 1)
+        self.assertEqual(sorted(VoteSession.objects.values_list('journal_key', flat=True)), sorted(keys))
+
+    def test_partial_record_is_replayed_once_complete(self):
+        journal = VoteJournal(self.directory, segment_size=1024 * 1024)
+        for _ in range(2):
+            self._append(journal)
+        path = os.path.join(self.directory, self._segments()[0])
+        voter_id, voted_at = self._claim_voter()
+        record = encode_record({'key': uuid.uuid4().hex, 'election': self.election.id, 'votes': self.votes,
+                                'timestamp': time.time(), 'voter': voter_id, 'voted_at': voted_at.isoformat()})
+
+        # Worker crashed while writing a record
+        with open(path, 'ab') as segment:
+            segment.write(record[:10])
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 2)
+        self._assert_recorded(2)
+
+        with open(path, 'ab') as segment:
+            segment.write(record[10:])
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 1)
+        self._assert_recorded(3)
+        self.assertEqual(JournalCheckpoint.objects.get().offset, os.path.getsize(path))
+
+    def test_flush_resumes_from_checkpoint_after_crash(self):
+        journal = VoteJournal(self.directory, segment_size=1024 * 1024)
+        for _ in range(3):
+            self._append(journal)
+        path = os.path.join(self.directory, self._segments()[0])
+        with open(path, 'rb') as segment:
+            first_offset = len(segment.readline())
+
+        calls = []
+
+        def crash_after_first_batch(ballots):
+            calls.append(ballots)
+            if len(calls) > 1:
+                raise RuntimeError('Flusher crashed')
+            record_ballots(ballots)
+
+        with mock.patch('vote.journal.record_ballots', crash_after_first_batch):
+            with self.assertRaises(RuntimeError):
+                flush_journal(self.directory, batch_size=1)
+        self._assert_recorded(1)
+        self.assertEqual(JournalCheckpoint.objects.get().offset, first_offset)
+
+        self.assertEqual(flush_journal(self.directory, batch_size=1), 2)
+        self._assert_recorded(3)
+        self.assertEqual(flush_journal(self.directory, batch_size=1), 0)
+
+        # Replaying whole segment, e.g. after checkpoint is lost, records nothing again
+        JournalCheckpoint.objects.update(offset=0)
+        self.assertEqual(flush_journal(self.directory, batch_size=1), 3)
+        self._assert_recorded(3)
+
+    def test_records_of_uncommitted_claims_are_dropped(self):
+        journal = VoteJournal(self.directory, segment_size=1024 * 1024)
+        self._append(journal)
+        # Claim rolled back after append
+        unvoted = Voter.objects.create(roll_no='140050098', election=self.election)
+        journal.append(self.election.id, self.votes, unvoted.pk, timezone.now())
+        # Claim rolled back after append and voter voted again
+        voter_id, voted_at = self._claim_voter()
+        journal.append(self.election.id, self.votes, voter_id, voted_at - timedelta(seconds=1))
+        journal.append(self.election.id, self.votes, voter_id, voted_at)
+
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 4)
+        self._assert_recorded(2)
+
+
+class CommitBallotJournalTest(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='vote_journal_')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=self.election)
+        self.candidate = Candidate.objects.create(name='Candidate', post=post)
+        self.votes = {self.candidate.id: VoteTypes.YES}
+        self.voter = Voter.objects.create(roll_no='140050001', election=self.election)
+
+        self.journal = VoteJournal(self.directory, segment_size=1024 * 1024)
+        patcher = mock.patch('election.views.election.get_vote_journal', return_value=self.journal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _journal_records(self):
+        return [record for name in os.listdir(self.directory)
+                for record, _ in read_records(os.path.join(self.directory, name), 0)]
+
+    def test_ballot_is_journaled_with_claim(self):
+        self.assertEqual(commit_ballot(self.election, self.voter.pk, self.votes, '10.0.0.1'), (1, False))
+        voter = Voter.objects.get()
+        self.assertTrue(voter.voted)
+        self.assertEqual([(record['votes'], record['voter'], record['voted_at'])
+                          for record in self._journal_records()],
+                         [({str(self.candidate.id): VoteTypes.YES}, voter.pk, voter.voted_at.isoformat())])
+        self.assertFalse(VoteSession.objects.exists())
+
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 1)
+        self.assertEqual(VoteSession.objects.count(), 1)
+
+    def test_ballot_of_rolled_back_claim_is_dropped(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                commit_ballot(self.election, self.voter.pk, self.votes, '10.0.0.1')
+                raise RuntimeError('Commit failed')
+        self.assertFalse(Voter.objects.get().voted)
+        self.assertEqual(len(self._journal_records()), 1)
+
+        # Voter can vote again, only ballot of committed claim is recorded
+        self.assertEqual(commit_ballot(self.election, self.voter.pk, {self.candidate.id: VoteTypes.NO}, '10.0.0.1'),
+                         (1, False))
+        self.assertEqual(flush_journal(self.directory, batch_size=10), 2)
+        self.assertEqual(list(Vote.objects.values_list('vote', flat=True)), [VoteTypes.NO])
+
+    def test_failed_append_rolls_claim_back(self):
+        with mock.patch.object(self.journal, 'append', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                commit_ballot(self.election, self.voter.pk, self.votes, '10.0.0.1')
+        self.assertFalse(Voter.objects.get().voted)
+        self.assertFalse(VoteIPMap.objects.exists())
+
+
+class CandidateTallyTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=self.election, number=2)
+        self.first = Candidate.objects.create(name='First', post=post)
+        self.second = Candidate.objects.create(name='Second', post=post)
+        self.neutral = Candidate.objects.get(post=post, is_neutral=True)
+        self.ballots = [
+            {self.first.id: VoteTypes.YES, self.second.id: VoteTypes.NO},
+            {self.first.id: VoteTypes.YES, self.second.id: VoteTypes.YES},
+            {self.neutral.id: VoteTypes.YES},
+            {self.first.id: VoteTypes.NO},
+        ]
+
+    def _record(self):
+        for votes in self.ballots[:2]:
+            record_ballot(self.election.id, votes)
+        record_ballots([JournalBallot(uuid.uuid4().hex, self.election.id, votes, timezone.now())
+                        for votes in self.ballots[2:]])
+
+    def test_ballot_of_running_election_deletes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            record_ballot(self.election.id, self.ballots[0])
+        self.assertEqual([query['sql'] for query in queries if query['sql'].startswith('DELETE')], [])
+
+    def _assert_tallies_match_votes(self):
+        expected = {}
+        for candidate_id, vote in Vote.objects.values_list('candidate_id', 'vote'):
+            yes_votes, no_votes, total_votes = expected.get(candidate_id, (0, 0, 0))
+            expected[candidate_id] = (yes_votes + (vote == VoteTypes.YES), no_votes + (vote == VoteTypes.NO),
+                                      total_votes + 1)
+        tallies = {tally.candidate_id: (tally.yes_votes, tally.no_votes, tally.total_votes)
+                   for tally in CandidateTally.objects.all()}
+        self.assertEqual(tallies, expected)
+        self.assertEqual(tallies[self.first.id], (2, 1, 3))
+
+    def test_tallies_match_votes_after_recording(self):
+        self._record()
+        self._assert_tallies_match_votes()
+
+    @mock.patch('vote.models.supports_upsert', return_value=False)
+    def test_tallies_match_votes_after_recording_without_upsert(self, _):
+        self._record()
+        self._assert_tallies_match_votes()
+
+    def test_tallies_match_votes_after_rebuild(self):
+        self._record()
+        CandidateTally.objects.filter(candidate=self.first).update(yes_votes=100, total_votes=101)
+        CandidateTally.objects.filter(candidate=self.second).delete()
+        self.election.is_finished = True
+        self.election.save()
+
+        output = StringIO()
+        call_command('rebuild_tallies', str(self.election.id), stdout=output)
+        self.assertIn('3 tallies rebuilt', output.getvalue())
+        self._assert_tallies_match_votes()
+
+
+class ResultSnapshotTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create_user('creator', password='password', is_staff=True)
+        self.election = Election.objects.create(name='General Election', creator=self.creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=self.election, number=1)
+        self.first = Candidate.objects.create(name='First', post=post)
+        self.second = Candidate.objects.create(name='Second', post=post)
+        self.nota = Candidate.objects.get(post=post, is_nota=True)
+        Voter.objects.create(roll_no='140050001', election=self.election, voted=True)
+        Voter.objects.create(roll_no='140050002', election=self.election, voted=True)
+        Voter.objects.create(roll_no='140050003', election=self.election)
+
+        record_ballot(self.election.id, {self.first.id: VoteTypes.YES, self.second.id: VoteTypes.NO})
+        record_ballot(self.election.id, {self.nota.id: VoteTypes.YES})
+
+        self.election.is_finished = True
+        self.election.save()
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.addCleanup(HistoricalRecords.thread.__dict__.pop, 'request', None)
+        self.url = reverse('admin:election_election_get_election_result', args=[self.election.id])
+
+    def test_results_are_served_from_snapshot(self):
+        # Snapshot of test election is built on first view, as test transaction never commits
+        response = self.client.get(self.url)
+        snapshot = ResultSnapshot.objects.get(election=self.election)
+        results = json.loads(snapshot.data)
+        self.assertEqual((results['total_voters'], results['voted'], results['turnout']), (3, 2, 66.7))
+        post = results['posts'][0]
+        self.assertEqual((post['nota_votes'], post['neutral_votes'], post['tie']), (1, 0, False))
+        self.assertEqual([(candidate['name'], candidate['yes_votes'], candidate['no_votes'], candidate['is_winner'])
+                          for candidate in post['candidates'] if not candidate['is_nota']],
+                         [('Neutral', 0, 0, False), ('First', 1, 0, True), ('Second', 0, 1, False)])
+        self.assertContains(response, 'First (Winner)')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        # Admin session, user, election and snapshot are read, nothing is counted
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_snapshot_is_dropped_when_election_is_reopened(self):
+        self.client.get(self.url)
+        self.election.is_finished = False
+        self.election.save()
+        self.assertFalse(ResultSnapshot.objects.filter(election=self.election).exists())
+
+    def test_snapshot_is_dropped_when_ballot_is_recorded(self):
+        etag = self.client.get(self.url)['ETag']
+        record_ballot(self.election.id, {self.first.id: VoteTypes.YES}, election_finished=True)
+        self.assertFalse(ResultSnapshot.objects.filter(election=self.election).exists())
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'First (Winner)')
+
+
+@override_settings(BALLOT_CHAIN_CHECKPOINT_INTERVAL=2)
+class BallotChainTest(TestCase):
+
+    def setUp(self):
+        creator = User.objects.create_user('creator')
+        self.election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=self.election)
+        self.candidate = Candidate.objects.create(name='Candidate', post=post)
+
+        for _ in range(3):
+            record_ballot(self.election.id, {self.candidate.id: VoteTypes.YES})
+        record_ballots([
+            JournalBallot(uuid.uuid4().hex, self.election.id, {self.candidate.id: VoteTypes.NO}, timezone.now())
+            for _ in range(2)
+        ])
+
+    def test_chain_is_verified_from_last_checkpoint(self):
+        self.assertEqual(BallotChain.objects.get(election=self.election).length, 5)
+        self.assertEqual(list(VoteSession.objects.order_by('chain_index').values_list('chain_index', flat=True)),
+                         [1, 2, 3, 4, 5])
+        self.assertEqual(verify_chain(self.election.id), (0, 5))
+        self.assertEqual(verify_chain(self.election.id), (4, 5))
+
+    def test_changed_ballots_are_detected(self):
+        verify_chain(self.election.id)
+        Vote.objects.filter(session__chain_index=1).update(vote=VoteTypes.NO)
+        # Ballots before last verified checkpoint are checked only by full verification
+        self.assertEqual(verify_chain(self.election.id), (4, 5))
+        with self.assertRaisesMessage(BallotChainError, 'Ballots up to 2 do not match checkpoint'):
+            verify_chain(self.election.id, full=True)
+
+        VoteSession.objects.filter(chain_index=5).delete()
+        with self.assertRaisesMessage(BallotChainError, 'Ballot 5 of chain is missing'):
+            verify_chain(self.election.id)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentBallotChainTest(TransactionTestCase):
+
+    def test_parallel_ballots_get_distinct_positions(self):
+        creator = User.objects.create_user('creator')
+        election = Election.objects.create(name='General Election', creator=creator, is_active=True)
+        post = Post.objects.create(name='General Secretary', election=election)
+        candidate = Candidate.objects.create(name='Candidate', post=post)
+        barrier = threading.Barrier(8)
+
+        def record():
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    with transaction.atomic():
+                        record_ballot(election.id, {candidate.id: VoteTypes.YES})
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(VoteSession.objects.values_list('chain_index', flat=True)), list(range(1, 41)))
+        self.assertEqual(verify_chain(election.id), (0, 40))